@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from clients import AzureClientFactory
+from config import Settings
+from discovery import make_discovery
+from executor import JobResult
+from reconcile import plan, plan_jobs
+from snapshot import TopologySnapshot
+
+
+class AsyncReconciler:
+    """
+    Tag driven peering and UDR reconciliation on one asyncio event loop
+    The pinned Azure SDK only has blocking clients, so every SDK call is handed to a bounded thread pool and awaited.
+    Listing, route table reads and mutations for different VNETs are all in flight at the same time,
+    jobs for the same participant VNET still run in order
+    """
+    def __init__(self, factory, settings, snapshot=None, max_workers=None, dry_run=False, discovery=None):
+        self.factory = factory
+        self.discovery = discovery or make_discovery(settings, factory)
+        self.settings = settings
+        self.snapshot = snapshot
+        self.max_workers = max_workers or settings.poller_max_workers
+        self.dry_run = dry_run
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.cycle = 0
+
+    async def call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    async def run_job(self, key, description, fn, args):
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        try:
+            await self.call(fn, *args)
+            logger.info(description)
+            return JobResult(key, description, True, elapsed=time.monotonic() - start)
+        except Exception as e:
+            logger.warning("Unable to {}{}".format(description[0].lower(), description[1:]))
+            logger.error("{}".format(e))
+            return JobResult(key, description, False, error=e, elapsed=time.monotonic() - start)
+
+    async def run_chain(self, key, chain):
+        results = list()
+        for description, fn, args in chain:
+            results.append(await self.run_job(key, description, fn, args))
+        return results
+
+    async def list_vnets(self):
+        return await self.call(self.discovery.vnets)
+
+    async def reconcile(self):
+        """
+        Runs one reconcile cycle and returns the list of JobResult, None when Azure could not be listed
+        """
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        self.cycle += 1
+        try:
+            result_all = await self.list_vnets()
+        except Exception as e:
+            logger.warning("Unable to access Azure")
+            logger.error("{}".format(e))
+            return None
+
+        delta = bool(self.cycle % self.settings.poller_full_reconcile_cycles)
+        reconcile_plan = plan(result_all, self.settings, self.snapshot, delta)
+        logger.info("Cycle {} plan: {}".format(self.cycle, reconcile_plan.summary()))
+
+        chains = dict()
+        for key, description, fn, args in plan_jobs(reconcile_plan, self.factory):
+            chains.setdefault(key, list()).append((description, fn, args))
+        if self.dry_run:
+            for line in reconcile_plan.describe():
+                logger.info("Dry run: {}".format(line))
+            chains = dict()
+
+        results = list()
+        for chain_results in await asyncio.gather(*[self.run_chain(k, c) for k, c in chains.items()]):
+            results.extend(chain_results)
+        failed_ids = set(r.key for r in results if not r.ok)
+
+        # failed VNETs are left dirty in the snapshot so the next cycle retries them
+        if self.snapshot and not self.dry_run:
+            self.snapshot.update(result_all, failed_ids)
+        logger.info("Cycle {} reconciled {} VNETs in {:.1f}s, {} failed".format(
+            self.cycle, len(result_all), time.monotonic() - start, len(failed_ids)))
+        return results
+
+    async def run_forever(self, interval):
+        """
+        Starts a cycle every interval seconds, a cycle that overruns starts the next one straight away
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            next_run = loop.time() + interval
+            await self.reconcile()
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    """
+    Runs next to poller.py so both engines can be compared. Use a different snapshot file from the sync poller
+    python async_poller.py --once --dry-run
+    """
+    parser = argparse.ArgumentParser(description='Asyncio peering and UDR reconciler')
+    parser.add_argument('--once', action='store_true', help='run a single cycle and exit')
+    parser.add_argument('--dry-run', action='store_true', help='log the planned changes without applying them')
+    parser.add_argument('--max-workers', type=int, default=None, help='concurrent Azure calls')
+    parser.add_argument('--snapshot', default='azure_async_poller_snapshot.db', help='delta mode snapshot file')
+    args = parser.parse_args()
+
+    # logging info
+    FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(handlers=[
+        logging.FileHandler("{0}/{1}.log".format('./', 'azure_async_poller')),
+        logging.StreamHandler()], format=FORMAT, level=logging.INFO)
+
+    settings = Settings()
+    factory = AzureClientFactory(throttle_settings=settings)
+    snapshot = None
+    if settings.poller_delta_mode:
+        snapshot = TopologySnapshot(args.snapshot, settings.tvpc_program_key)
+
+    reconciler = AsyncReconciler(factory, settings, snapshot, args.max_workers, args.dry_run)
+    try:
+        if args.once:
+            asyncio.run(reconciler.reconcile())
+        else:
+            asyncio.run(reconciler.run_forever(settings.poller_interval))
+    finally:
+        reconciler.close()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from benchmarks.topology import PROGRAM_KEY, generate_topology
+from config import Settings
+from discovery import ListAllDiscovery
+from executor import OrderedExecutor
+from fake_network import FakeNetworkFactory, FakeNetworkManagementClient
+from reconcile import apply, plan
+from snapshot import TopologySnapshot
+
+# runs are kept out of the source tree, benchmarks/results is ignored by git
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def build_network(size, settings, latency=0.0, jitter=0.0, failure_rate=0.0, fail_operations=None, seed=0):
+    """
+    Returns a fake network client holding a synthetic topology of size VNETs
+    Every VNET gets a private route table, participants already peered to their SILB also get their default route
+    """
+    vnets = generate_topology(size, seed=seed)
+    client = FakeNetworkManagementClient(vnets, latency=latency, jitter=jitter, failure_rate=failure_rate,
+                                         fail_operations=fail_operations, seed=seed)
+    silb_ids = set(v.id for v in vnets if v.tags.get('tvpc_silb_vnet') == 'True')
+    for v in vnets:
+        routes = list()
+        if v.tags.get(PROGRAM_KEY) and any(x.remote_virtual_network.id in silb_ids
+                                           for x in v.virtual_network_peerings):
+            routes.append((settings.default_route_name, '0.0.0.0/0', '10.0.0.4'))
+        client.add_route_table(v.id.split('/')[4], settings.private_route_table_name, routes)
+    return client
+
+
+def run_cycle(factory, settings, snapshot=None, delta=False, max_workers=16):
+    """
+    Runs one poller cycle against the fake and returns its measurements
+    Peak memory is the tracemalloc peak of the cycle, allocations made before it (the fake's own state) are excluded
+    """
+    client = factory.network()
+    calls_before = Counter(client.calls)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        vnets = ListAllDiscovery(factory, settings.tvpc_program_key).vnets()
+    except Exception as e:
+        # like the poller, a cycle without a complete listing is skipped
+        tracemalloc.stop()
+        return {'wall_seconds': round(time.perf_counter() - start, 4), 'error': '{}'.format(e),
+                'api_calls': sum((client.calls - calls_before).values())}
+    listed = time.perf_counter()
+    reconcile_plan = plan(vnets, settings, snapshot, delta)
+    planned = time.perf_counter()
+    results = apply(reconcile_plan, factory, OrderedExecutor(max_workers))
+    applied = time.perf_counter()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    failed_ids = set(r.key for r in results if not r.ok)
+    if snapshot:
+        snapshot.update(vnets, failed_ids)
+    calls = client.calls - calls_before
+    return {'list_seconds': round(listed - start, 4),
+            'plan_seconds': round(planned - listed, 4),
+            'apply_seconds': round(applied - planned, 4),
+            'wall_seconds': round(applied - start, 4),
+            'peak_mb': round(peak / 2.0 ** 20, 2),
+            'api_calls': sum(calls.values()),
+            'calls': dict(sorted(calls.items())),
+            'plan': {'peerings_to_create': len(reconcile_plan.peerings_to_create),
+                     'peerings_to_delete': len(reconcile_plan.peerings_to_delete),
+                     'udrs_to_add': len(reconcile_plan.udrs_to_add),
+                     'udrs_to_remove': len(reconcile_plan.udrs_to_remove)},
+            'jobs': len(results),
+            'failed_jobs': len(failed_ids)}
+
+
+if __name__ == '__main__':
+    """
+    Runs full poller cycles (list, plan, apply) against an in memory fake of the network client
+    python -m benchmarks.bench_poller_cycle --sizes 10000 50000 100000 --latency 0.005
+    The first cycle converges the synthetic topology, the following cycles measure the steady state.
+    Results are written to --output as JSON so runs can be compared over time, by default under benchmarks/results
+    """
+    parser = argparse.ArgumentParser(description='Benchmark poller cycles against a fake network client')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--cycles', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every fake API call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds per call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of fake API calls that fail')
+    parser.add_argument('--fail-operations', nargs='+', default=None,
+                        help='only fail these calls, e.g. virtual_network_peerings.create_or_update')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--delta', action='store_true', help='reconcile in delta mode with a topology snapshot')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'bench_poller_cycle.json'))
+    parser.add_argument('--verbose', action='store_true', help='log every job like the poller does')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    settings = Settings()
+    report = {'time': time.time(), 'args': vars(args), 'runs': list()}
+    print('{:>8} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+        'vnets', 'cycle', 'wall s', 'list s', 'plan s', 'apply s', 'api calls', 'peak MB', 'failed'))
+    for size in args.sizes:
+        factory = FakeNetworkFactory(build_network(size, settings, args.latency, args.jitter, args.failure_rate,
+                                                   args.fail_operations))
+        snapshot_dir = tempfile.mkdtemp()
+        snapshot = None
+        try:
+            if args.delta:
+                snapshot = TopologySnapshot(os.path.join(snapshot_dir, 'snapshot.db'), settings.tvpc_program_key)
+            for cycle in range(1, args.cycles + 1):
+                result = run_cycle(factory, settings, snapshot, args.delta, args.workers)
+                result.update({'vnets': size, 'cycle': cycle})
+                report['runs'].append(result)
+                if 'error' in result:
+                    print('{:>8} {:>6} {:>9.2f} listing failed: {}'.format(size, cycle, result['wall_seconds'],
+                                                                             result['error']))
+                    continue
+                print('{:>8} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9} {:>9.1f} {:>7}'.format(
+                    size, cycle, result['wall_seconds'], result['list_seconds'], result['plan_seconds'],
+                    result['apply_seconds'], result['api_calls'], result['peak_mb'], result['failed_jobs']))
+        finally:
+            if snapshot:
+                snapshot.close()
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {}'.format(args.output))
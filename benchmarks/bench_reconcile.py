@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import time
+from benchmarks.topology import generate_topology
+from config import Settings
+from reconcile import plan
+
+
+def time_plan(vnets, settings):
+    start = time.perf_counter()
+    reconcile_plan = plan(vnets, settings)
+    return time.perf_counter() - start, reconcile_plan
+
+
+if __name__ == '__main__':
+    """
+    Times reconcile planning over synthetic topologies, no Azure calls are made
+    python -m benchmarks.bench_reconcile --sizes 1000 10000 50000
+    Time per VNET should stay flat as the topology grows
+    """
+    parser = argparse.ArgumentParser(description='Benchmark peering reconciliation planning')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 25000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    settings = Settings()
+    print('{:>8} {:>10} {:>12} {:>10} {:>10} {:>8} {:>8}'.format('vnets', 'plan ms', 'us per vnet', 'peer add',
+                                                                 'peer del', 'udr add', 'udr del'))
+    for size in args.sizes:
+        vnets = generate_topology(size)
+        best = None
+        for _ in range(args.repeat):
+            elapsed, reconcile_plan = time_plan(vnets, settings)
+            best = elapsed if best is None else min(best, elapsed)
+        print('{:>8} {:>10.2f} {:>12.3f} {:>10} {:>10} {:>8} {:>8}'.format(
+            size, best * 1000, best * 1e6 / size, len(reconcile_plan.peerings_to_create),
+            len(reconcile_plan.peerings_to_delete), len(reconcile_plan.udrs_to_add),
+            len(reconcile_plan.udrs_to_remove)))
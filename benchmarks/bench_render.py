@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+
+import argparse
+import shutil
+import tempfile
+import time
+from jinja2 import Template
+from config import Settings
+from rendering import TemplateRenderer
+
+TEMPLATES = ['templates/baseline.j2', 'templates/dmvpn_hub.j2', 'templates/dmvpn_spoke.j2',
+             'templates/dmvpn_spoke_silb.j2', 'templates/app_vnet.j2']
+
+
+def router_variables(n):
+    """
+    Returns the variables of the n-th router shaped like the demo's, router attributes and VNET settings
+    """
+    return {'public_ip': '20.{}.{}.{}'.format(n // 65536 % 256, n // 256 % 256, n % 256), 'username': 'azureuser',
+            'password': 'secret', 'region': 'westus2', 'instance_type': 'Standard_DS2_v2', 'max_bandwidth': 1000,
+            'transport': 'ssh', 'hostname': 'csr{}'.format(n), 'asn': 64512, 'dmvpn_password': 'dmvpn',
+            'dmvpn_address_router': '192.168.{}.{}'.format(n // 250 % 250, n % 250 + 1),
+            'dmvpn_netmask': '255.255.0.0', 'dmvpn_address_space': '192.168.0.0/16', 'hub_1_private': '192.168.0.1',
+            'hub_1_public': '20.0.0.1', 'g2_default_gateway': '10.0.1.1',
+            'settings': {'dmvpn_password': Settings.dmvpn_password}}
+
+
+def per_line(template_name, variables):
+    """
+    The old Router.render_config_from_template, the file is read and every line compiled on each call
+    """
+    with open(template_name, 'r') as t:
+        template_data = t.readlines()
+    return [Template(line.rstrip('\n')).render(variables) for line in template_data]
+
+
+def run(mode, template_name, routers, bytecode_cache_dir=None):
+    start = time.perf_counter()
+    if mode == 'per-line':
+        configs = [per_line(template_name, variables) for variables in routers]
+    elif mode == 'render':
+        renderer = TemplateRenderer(bytecode_cache_dir=bytecode_cache_dir)
+        configs = [renderer.render(template_name, variables) for variables in routers]
+    else:
+        renderer = TemplateRenderer(bytecode_cache_dir=bytecode_cache_dir)
+        configs = renderer.render_many(template_name, routers)
+    return time.perf_counter() - start, configs
+
+
+if __name__ == '__main__':
+    """
+    Renders the router templates for many routers, line by line as before and with the shared compiled templates
+    python -m benchmarks.bench_render --routers 1000
+    """
+    parser = argparse.ArgumentParser(description='Benchmark rendering router configuration templates')
+    parser.add_argument('--routers', type=int, default=1000)
+    parser.add_argument('--templates', nargs='+', default=TEMPLATES)
+    parser.add_argument('--bytecode-cache', action='store_true',
+                        help='keep compiled templates in a temporary directory')
+    args = parser.parse_args()
+
+    routers = [router_variables(n) for n in range(args.routers)]
+    cache_dir = tempfile.mkdtemp() if args.bytecode_cache else None
+    try:
+        print('{:>30} {:>12} {:>10} {:>12} {:>8}'.format('template', 'mode', 'seconds', 'per router', 'same'))
+        for template_name in args.templates:
+            baseline, expected = run('per-line', template_name, routers)
+            print('{:>30} {:>12} {:>10.3f} {:>12.6f} {:>8}'.format(template_name, 'per-line', baseline,
+                                                                   baseline / len(routers), 'yes'))
+            for mode in ('render', 'render_many'):
+                elapsed, configs = run(mode, template_name, routers, cache_dir)
+                print('{:>30} {:>12} {:>10.3f} {:>12.6f} {:>8}'.format(template_name, mode, elapsed,
+                                                                       elapsed / len(routers),
+                                                                       'yes' if configs == expected else 'NO'))
+    finally:
+        if cache_dir:
+            shutil.rmtree(cache_dir)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fake_arm import FakeArm, FakeArmClient
+from throttle import RequestScheduler
+
+
+def run(scheduler, arm, writes, workers):
+    client = FakeArmClient(arm.url, hook=scheduler.response_hook if scheduler else None)
+
+    def put(n):
+        path = '/subscriptions/bench/resourceGroups/rg/providers/Microsoft.Network/virtualNetworks/v{}'.format(n)
+        try:
+            if scheduler:
+                scheduler.write(client.create_or_update, path, {'n': n})
+            else:
+                client.create_or_update(path, {'n': n})
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ok = sum(pool.map(put, range(writes)))
+    return ok, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    """
+    Pushes a burst of writes at a throttling fake ARM endpoint with and without the request scheduler
+    python -m benchmarks.bench_throttle --writes 300 --limit 40 --window 2
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the ARM request scheduler against a fake ARM endpoint')
+    parser.add_argument('--writes', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=40, help='write bucket size, refilled once per window')
+    parser.add_argument('--window', type=float, default=2.0, help='seconds to refill the write bucket')
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('{:>10} {:>8} {:>8} {:>10} {:>10}'.format('mode', 'ok', '429s', 'seconds', 'writes/s'))
+    for mode in ('raw', 'scheduled'):
+        arm = FakeArm(write_limit=args.limit, window=args.window).start()
+        scheduler = None
+        if mode == 'scheduled':
+            scheduler = RequestScheduler(write_rate=args.limit / args.window, write_burst=args.limit,
+                                         base_delay=0.1, max_delay=args.window, reserve=1)
+        ok, elapsed = run(scheduler, arm, args.writes, args.workers)
+        arm.stop()
+        print('{:>10} {:>8} {:>8} {:>10.2f} {:>10.1f}'.format(mode, ok, arm.stats['throttled'], elapsed,
+                                                              ok / elapsed))
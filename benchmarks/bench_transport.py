@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import argparse
+import logging
+import time
+from cli_engine import CLIEngine
+from fake_router import FakeRouter, FakeShell, RestconfStandin
+from restconf import RestconfTransport
+
+
+def synthetic_config(size):
+    """
+    Returns size configuration lines shaped like the DMVPN templates, interface and routing blocks
+    """
+    lines = list()
+    n = 0
+    while len(lines) < size:
+        lines.extend(['interface Tunnel{}'.format(n), ' description dmvpn {}'.format(n),
+                      ' ip address 192.168.{}.1 255.255.255.0'.format(n % 250), ' ip nhrp network-id {}'.format(n),
+                      ' tunnel source GigabitEthernet1', '!'])
+        n += 1
+    return lines[:size]
+
+
+def per_line(shell, lines):
+    """
+    The old Router.configure_router loop, one round trip per line
+    """
+    def prompt():
+        buff = ''
+        while not buff.endswith('#'):
+            buff += shell.recv(9999).decode('utf-8')
+        return buff
+    for line in ['config t'] + lines + ['end', 'wr mem']:
+        shell.send(line + '\n')
+        prompt()
+
+
+def run(mode, lines, rtt):
+    router = FakeRouter()
+    start = time.perf_counter()
+    if mode == 'ssh-per-line':
+        shell = FakeShell(router, rtt)
+        shell.recv(9999)
+        per_line(shell, lines)
+    elif mode == 'ssh':
+        shell = FakeShell(router, rtt)
+        shell.recv(9999)
+        cli = CLIEngine(shell)
+        cli.configure(lines)
+        cli.run('wr mem')
+    else:
+        standin = RestconfStandin(router, rtt).start()
+        transport = RestconfTransport('127.0.0.1', router.username, router.password, port=standin.port,
+                                      scheme='http')
+        start = time.perf_counter()
+        transport.configure(lines)
+        transport.save()
+        elapsed = time.perf_counter() - start
+        transport.close()
+        standin.stop()
+        return elapsed, len(router.saved)
+    return time.perf_counter() - start, len(router.saved)
+
+
+if __name__ == '__main__':
+    """
+    Pushes a configuration to a simulated router over the SSH shell, line by line and chunked, and over RESTCONF
+    python -m benchmarks.bench_transport --lines 100 300 --rtt 0.02 0.08
+    """
+    parser = argparse.ArgumentParser(description='Benchmark router configuration transports against fake routers')
+    parser.add_argument('--lines', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--rtt', type=float, nargs='+', default=[0.02, 0.08], help='round trip time in seconds')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('{:>6} {:>6} {:>14} {:>10} {:>8}'.format('lines', 'rtt', 'transport', 'seconds', 'saved'))
+    for size in args.lines:
+        lines = synthetic_config(size)
+        for rtt in args.rtt:
+            for mode in ('ssh-per-line', 'ssh', 'restconf'):
+                elapsed, saved = run(mode, lines, rtt)
+                print('{:>6} {:>6} {:>14} {:>10.3f} {:>8}'.format(size, rtt, mode, elapsed, saved))
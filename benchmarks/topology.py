@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import random
+from types import SimpleNamespace
+
+PROGRAM_KEY = 'auto_tvpc_cluster_member'
+
+
+def vnet_id(subscription_id, resource_group_name, vnet_name):
+    return ('/subscriptions/{}'
+            '/resourceGroups/{}'
+            '/providers/Microsoft.Network'
+            '/virtualNetworks/{}').format(subscription_id, resource_group_name, vnet_name)
+
+
+def make_peering(name, remote_id, peering_state='Connected'):
+    return SimpleNamespace(name=name, peering_state=peering_state,
+                           remote_virtual_network=SimpleNamespace(id=remote_id))
+
+
+def make_vnet(subscription_id, resource_group_name, vnet_name, location, tags):
+    return SimpleNamespace(id=vnet_id(subscription_id, resource_group_name, vnet_name), name=vnet_name,
+                           location=location, tags=tags, etag='W/"0"', virtual_network_peerings=[])
+
+
+def generate_topology(num_vnets, clusters=('dev', 'test', 'prod'), locations=('eastus', 'westus'),
+                      peered_fraction=0.9, untagged_fraction=0.05, subscription_id='bench', seed=0):
+    """
+    Input:
+    num_vnets = number of participant/untagged VNETs to generate
+    clusters, locations = one SILB VNET is generated for every (cluster, location) pair
+    peered_fraction = share of participants that are already peered to their SILB
+    untagged_fraction = share of VNETs that have lost their tag but are still peered to a SILB
+
+    Output:
+    Returns a list of SDK shaped VNET objects (SILBs first)
+    """
+    rnd = random.Random(seed)
+    silbs = dict()
+    vnets = list()
+    for c in clusters:
+        for loc in locations:
+            name = 'silb{}{}'.format(c, loc)
+            s = make_vnet(subscription_id, 'rg' + name, name, loc,
+                          {PROGRAM_KEY: c, 'tvpc_silb_vnet': 'True', 'tvpc_silb_private_address': '10.0.0.4'})
+            silbs[(c, loc)] = s
+            vnets.append(s)
+    for n in range(num_vnets):
+        c = rnd.choice(clusters)
+        loc = rnd.choice(locations)
+        s = silbs[(c, loc)]
+        name = 'vnet{}'.format(n)
+        untagged = rnd.random() < untagged_fraction
+        tags = {} if untagged else {PROGRAM_KEY: c}
+        v = make_vnet(subscription_id, 'rg' + name, name, loc, tags)
+        if untagged or rnd.random() < peered_fraction:
+            peering_name = s.name + 'to' + v.name
+            s.virtual_network_peerings.append(make_peering(peering_name, v.id))
+            v.virtual_network_peerings.append(make_peering(peering_name, s.id))
+        vnets.append(v)
+    return vnets
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import copy
+import logging
+import threading
+import time
+from throttle import WRITE_PREFIXES
+
+# writes to these child operation groups change what get returns for the parent resource
+PARENTS = {
+    'inbound_nat_rules': 'load_balancers',
+    'load_balancer_backend_address_pools': 'load_balancers',
+    'routes': 'route_tables',
+    'security_rules': 'network_security_groups',
+    'subnets': 'virtual_networks',
+    'virtual_network_peerings': 'virtual_networks',
+}
+
+
+class InFlight:
+    """
+    A get that is being read from Azure, concurrent callers of the same get wait for its result
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Read-through cache of the get operations of management clients
+    Without ttl entries live until clear() is called, once per poll cycle. With ttl they expire after ttl seconds.
+    Writes made through the cache (create_or_update, delete, ...) drop the entries of the resource and of its parent,
+    once when the call returns and again when its long running operation completes.
+    validate() drops entries whose etag is older than the one a listing reports, invalidate_id() drops a resource
+    Concurrent identical gets are coalesced into one call to Azure
+    Every caller gets its own copy of the result, callers may change it without changing the cached entry
+    Observers are called with (operation, result), result is 'hit', 'miss' or 'coalesced'
+    cache = ResponseCache(ttl=300)
+    network_client = cache.wrap(factory.network())
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        # key -> (value, expires, resource id)
+        self.entries = dict()
+        # (scope, group, first two arguments) -> keys, resource id -> keys
+        self.groups = dict()
+        self.ids = dict()
+        self.inflight = dict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidated': 0, 'expired': 0, 'stale': 0}
+        self.observers = list()
+
+    def wrap(self, client, scope=None):
+        """
+        Returns a proxy of a management client whose get operations are cached
+        scope keeps the entries of clients for different kinds or subscriptions apart, e.g. ('network', sub_id)
+        """
+        return CachedClient(client, self, scope)
+
+    def notify(self, operation, result):
+        logger = logging.getLogger(__name__)
+        for observer in self.observers:
+            try:
+                observer(operation, result)
+            except Exception as e:
+                logger.warning("Unable to record cache {} of {}".format(result, operation))
+                logger.error("{}".format(e))
+
+    def _drop(self, key):
+        value, expires, resource_id = self.entries.pop(key)
+        self.groups[key[:2] + (key[2][:2],)].discard(key)
+        if resource_id:
+            self.ids[resource_id].discard(key)
+
+    def _store(self, key, value):
+        resource_id = getattr(value, 'id', None)
+        resource_id = resource_id.lower() if isinstance(resource_id, str) else None
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (value, expires, resource_id)
+        self.groups.setdefault(key[:2] + (key[2][:2],), set()).add(key)
+        if resource_id:
+            self.ids.setdefault(resource_id, set()).add(key)
+
+    def get(self, scope, group, fn, args, kwargs):
+        """
+        Returns the cached result of fn(*args, **kwargs), calling it on a miss
+        """
+        key = (scope, group, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+        operation = '{}.get'.format(group)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is not None and time.monotonic() >= entry[1]:
+                self._drop(key)
+                self.stats['expired'] += 1
+                entry = None
+            if entry is not None:
+                self.stats['hits'] += 1
+            else:
+                flight = self.inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self.inflight[key] = InFlight()
+                    generation = self.generation
+                    self.stats['misses'] += 1
+                else:
+                    self.stats['coalesced'] += 1
+        if entry is not None:
+            self.notify(operation, 'hit')
+            return copy.deepcopy(entry[0])
+        if not leader:
+            self.notify(operation, 'coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+        self.notify(operation, 'miss')
+        try:
+            flight.value = fn(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                # a write landed while the get was in flight, its result may predate the write
+                if flight.error is None and generation == self.generation:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def invalidate(self, scope, group, args):
+        """
+        Drops the entries a write to group with these arguments makes stale, its own resource and its parent
+        """
+        names = list()
+        for a in args:
+            if not isinstance(a, str):
+                break
+            names.append(a)
+        names = tuple(names)
+        with self.lock:
+            self.generation += 1
+            for g in (group, PARENTS.get(group)):
+                for key in list(self.groups.get((scope, g, names[:2]), ())):
+                    n = min(len(key[2]), len(names))
+                    if key[2][:n] == names[:n]:
+                        self._drop(key)
+                        self.stats['invalidated'] += 1
+
+    def invalidate_id(self, resource_id):
+        """
+        Drops the entries of a resource id, e.g. after an event says it changed
+        """
+        with self.lock:
+            self.generation += 1
+            for key in list(self.ids.get(resource_id.lower(), ())):
+                self._drop(key)
+                self.stats['invalidated'] += 1
+
+    def validate(self, resource_id, etag):
+        """
+        Drops the entries of a resource id whose etag differs from etag, e.g. the etag of a fresh listing
+        """
+        with self.lock:
+            for key in list(self.ids.get(resource_id.lower(), ())):
+                if getattr(self.entries[key][0], 'etag', None) != etag:
+                    self._drop(key)
+                    self.stats['stale'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.groups.clear()
+            self.ids.clear()
+
+    def new_cycle(self, records=()):
+        """
+        Starts a poll cycle, records are the VNETs it listed
+        Without ttl the cache starts empty, with ttl the entries of VNETs whose etag changed are dropped
+        """
+        if self.ttl is None:
+            self.clear()
+            return
+        for r in records:
+            self.validate(r.id, r.etag)
+
+    def write(self, scope, group, fn, args, kwargs):
+        """
+        Calls a write operation and drops the entries it makes stale
+        """
+        logger = logging.getLogger(__name__)
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            self.invalidate(scope, group, args)
+        add_done_callback = getattr(result, 'add_done_callback', None)
+        if callable(add_done_callback):
+            try:
+                add_done_callback(lambda *_: self.invalidate(scope, group, args))
+            except Exception as e:
+                logger.warning("Unable to watch {} for cache invalidation".format(group))
+                logger.error("{}".format(e))
+        return result
+
+
+class CachedClient:
+    def __init__(self, client, cache, scope=None):
+        self._client = client
+        self._cache = cache
+        self._scope = scope
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name in ('config', 'models') or callable(attr):
+            return attr
+        return CachedOperations(attr, self._cache, self._scope, name)
+
+
+class CachedOperations:
+    def __init__(self, operations, cache, scope, name):
+        self._operations = operations
+        self._cache = cache
+        self._scope = scope
+        self._name = name
+
+    def __getattr__(self, name):
+        attr = getattr(self._operations, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        if name == 'get':
+            call = self._cache.get
+        elif name.startswith(WRITE_PREFIXES):
+            call = self._cache.write
+        else:
+            return attr
+        scope = self._scope
+        group = self._name
+
+        def cached(*args, **kwargs):
+            return call(scope, group, attr, args, kwargs)
+        cached.__name__ = name
+        return cached
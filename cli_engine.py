@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import logging
+import re
+import socket
+import time
+
+# an IOS prompt at the start of a line, Router# or Router(config-if)#
+PROMPT = re.compile(rb'(?:^|[\r\n])[\w.\-@/:]+(?:\([\w.\-@/:]+\))?[#>]')
+# IOS answers a rejected line with a % message
+ERROR = re.compile(rb'^\s*(% ?(?:Invalid input|Incomplete command|Ambiguous command|Unknown command|Unrecognized|'
+                   rb'Error|Bad mask|Cannot|Not allowed|Invalid).*)$', re.IGNORECASE | re.MULTILINE)
+
+
+class CLITimeout(socket.timeout):
+    """
+    The router stopped answering, results holds the LineResults of the lines it did answer
+    The session is in an unknown state and should not be reused
+    """
+    def __init__(self, message, results=()):
+        socket.timeout.__init__(self, message)
+        self.results = list(results)
+
+
+class LineResult:
+    """
+    The output of one line sent to the router, error is the IOS % message when the line was rejected
+    """
+    __slots__ = ('line', 'output', 'error')
+
+    def __init__(self, line, output='', error=None):
+        self.line = line
+        self.output = output
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return 'LineResult({!r}, error={!r})'.format(self.line, self.error)
+
+
+class CLIEngine:
+    """
+    Sends commands on an interactive IOS shell sitting at a prompt and splits the answers by prompt
+    Configuration lines are sent chunk_size at a time without waiting for each prompt, so a template costs one round
+    trip per chunk instead of one per line. Every prompt must arrive within command_timeout seconds of the previous
+    one, and a whole call within total_timeout seconds.
+    engine = CLIEngine(channel)
+    results = engine.configure(lines)
+    failed = [r for r in results if not r.ok]
+    """
+    def __init__(self, channel, command_timeout=30.0, total_timeout=600.0, chunk_size=50, prompt=PROMPT,
+                 error=ERROR):
+        self.channel = channel
+        self.command_timeout = command_timeout
+        self.total_timeout = total_timeout
+        self.chunk_size = chunk_size
+        self.prompt = prompt
+        self.error = error
+        self.buffer = bytearray()
+        self.last_prompt = b''
+
+    def receive(self, deadline):
+        """
+        Appends what the router sent to the buffer, waiting at most until deadline
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout()
+        self.channel.settimeout(remaining)
+        data = self.channel.recv(65536)
+        if not data:
+            raise EOFError('Session closed by the router')
+        self.buffer += data
+
+    def answers(self, lines, total_deadline):
+        """
+        Reads one prompt per sent line, returns their LineResults
+        """
+        results = list()
+        start = 0
+        while len(results) < len(lines):
+            match = self.prompt.search(self.buffer, start)
+            if match is None:
+                start = max(0, len(self.buffer) - 256)
+                try:
+                    self.receive(min(total_deadline, time.monotonic() + self.command_timeout))
+                except socket.timeout:
+                    raise CLITimeout('No prompt after {!r}'.format(lines[len(results)]), results)
+                continue
+            results.append(self.result(lines[len(results)], bytes(self.buffer[:match.start()])))
+            self.last_prompt = match.group(0).strip()
+            # the prompt stays in the buffer until the next line's echo follows it
+            del self.buffer[:match.end()]
+            start = 0
+        return results
+
+    def result(self, line, segment):
+        text = segment.decode('utf-8', 'replace')
+        first, _, rest = text.partition('\n')
+        # drop the echo of the line itself
+        output = rest if line.strip() in first else text
+        error = self.error.search(segment)
+        return LineResult(line, output.strip('\r\n'), error.group(1).decode('utf-8', 'replace').strip() if error
+                          else None)
+
+    def send(self, lines, stop_on_error=False):
+        """
+        Sends lines chunk by chunk and returns a LineResult per line, up to the first failed chunk with stop_on_error
+        """
+        total_deadline = time.monotonic() + self.total_timeout
+        results = list()
+        for i in range(0, len(lines), self.chunk_size):
+            chunk = lines[i:i + self.chunk_size]
+            self.channel.sendall(''.join(line + '\n' for line in chunk))
+            try:
+                answers = self.answers(chunk, total_deadline)
+            except CLITimeout as e:
+                raise CLITimeout(str(e), results + e.results)
+            results.extend(answers)
+            if stop_on_error and any(not r.ok for r in answers):
+                break
+        self.channel.settimeout(self.command_timeout)
+        return results
+
+    def run(self, command):
+        """
+        Runs one exec command and returns its LineResult
+        """
+        return self.send([command])[0]
+
+    def in_config_mode(self):
+        return b'(config' in self.last_prompt
+
+    def configure(self, lines, stop_on_error=False):
+        """
+        Enters configuration mode, sends the configuration lines and returns to the exec prompt
+        Blank lines and ! comments are not sent. Returns the LineResults of the configuration lines
+        """
+        logger = logging.getLogger(__name__)
+        lines = [line.rstrip() for line in lines if line.strip() and not line.strip().startswith('!')]
+        results = self.send(['configure terminal'] + lines, stop_on_error)[1:]
+        # lines may leave configuration mode themselves, e.g. end followed by an exec command
+        if self.in_config_mode():
+            self.run('end')
+        for r in results:
+            if not r.ok:
+                logger.warning("Line {!r} rejected: {}".format(r.line, r.error))
+        return results
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import os
+import threading
+import time
+from azure.common.credentials import ServicePrincipalCredentials
+from azure.mgmt.resource import ResourceManagementClient
+from azure.mgmt.compute import ComputeManagementClient
+from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.storage import StorageManagementClient
+from throttle import RequestScheduler
+
+
+class AzureClientFactory:
+    """
+    Long lived credentials and management clients shared across poll cycles
+    The AAD token is kept in memory and refreshed refresh_margin seconds before it expires.
+    Clients are built on first use and keep their HTTP session alive, so connections are reused between cycles.
+    Clients for other subscriptions share the credentials, pass subscription_id to get one.
+    With throttle_settings every subscription gets its own throttle.RequestScheduler, ARM limits are per subscription.
+    request_observer is added to every scheduler, see metrics.PollerMetrics.observe_request
+    With a cache.ResponseCache the get operations of every client are cached, in front of the scheduler
+    factory = AzureClientFactory(throttle_settings=settings)
+    network_client = factory.network()
+    remote_network_client = factory.network(other_subscription_id)
+    """
+    client_classes = {
+        'resource': ResourceManagementClient,
+        'compute': ComputeManagementClient,
+        'storage': StorageManagementClient,
+        'network': NetworkManagementClient,
+    }
+
+    def __init__(self, subscription_id=None, client_id=None, secret=None, tenant=None, refresh_margin=300,
+                 throttle_settings=None, request_observer=None, cache=None):
+        self.subscription_id = subscription_id or os.environ.get('AZURE_SUBSCRIPTION_ID')
+        self.client_id = client_id or os.environ.get('AZURE_CLIENT_ID')
+        self.secret = secret or os.environ.get('AZURE_CLIENT_SECRET')
+        self.tenant = tenant or os.environ.get('AZURE_TENANT_ID')
+        self.refresh_margin = refresh_margin
+        self.throttle_settings = throttle_settings
+        self.request_observer = request_observer
+        self.cache = cache
+        self._schedulers = dict()
+        self._credentials = None
+        self._token_expires = 0.0
+        self._clients = dict()
+        self._lock = threading.RLock()
+
+    def _token_lifetime(self):
+        try:
+            return float(self._credentials.token.get('expires_in', 3599))
+        except (AttributeError, TypeError, ValueError):
+            return 3599.0
+
+    def credentials(self):
+        """
+        Returns the shared credentials, fetching a new AAD token only when the cached one is about to expire
+        """
+        logger = logging.getLogger(__name__)
+        with self._lock:
+            now = time.monotonic()
+            if self._credentials is None:
+                self._credentials = ServicePrincipalCredentials(
+                    client_id=self.client_id,
+                    secret=self.secret,
+                    tenant=self.tenant
+                )
+                self._token_expires = now + self._token_lifetime()
+            elif now >= self._token_expires - self.refresh_margin:
+                try:
+                    self._credentials.set_token()
+                    self._token_expires = now + self._token_lifetime()
+                    logger.info("Refreshed AAD token for client {}".format(self.client_id))
+                except Exception as e:
+                    # keep the old token, it is still valid for up to refresh_margin seconds
+                    logger.warning("Unable to refresh AAD token for client {}".format(self.client_id))
+                    logger.error("{}".format(e))
+            return self._credentials
+
+    def scheduler(self, subscription_id=None):
+        """
+        Returns the request scheduler of a subscription, None without throttle_settings
+        """
+        if self.throttle_settings is None:
+            return None
+        subscription_id = subscription_id or self.subscription_id
+        with self._lock:
+            if subscription_id not in self._schedulers:
+                scheduler = RequestScheduler.from_settings(self.throttle_settings)
+                if self.request_observer:
+                    scheduler.observers.append(self.request_observer)
+                self._schedulers[subscription_id] = scheduler
+            return self._schedulers[subscription_id]
+
+    def client(self, kind, subscription_id=None):
+        """
+        Returns the shared management client of the given kind (resource, compute, storage or network)
+        """
+        subscription_id = subscription_id or self.subscription_id
+        credentials = self.credentials()
+        with self._lock:
+            c = self._clients.get((kind, subscription_id))
+            if c is None:
+                c = self.client_classes[kind](credentials, subscription_id)
+                c.config.keep_alive = True
+                scheduler = self.scheduler(subscription_id)
+                if scheduler:
+                    c = scheduler.wrap(c)
+                # cache hits do not spend throttle tokens
+                if self.cache is not None:
+                    c = self.cache.wrap(c, (kind, subscription_id))
+                self._clients[(kind, subscription_id)] = c
+            return c
+
+    def resource(self, subscription_id=None):
+        return self.client('resource', subscription_id)
+
+    def compute(self, subscription_id=None):
+        return self.client('compute', subscription_id)
+
+    def storage(self, subscription_id=None):
+        return self.client('storage', subscription_id)
+
+    def network(self, subscription_id=None):
+        return self.client('network', subscription_id)
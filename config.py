@@ -26,18 +26,21 @@ import os
 
 class Settings:
     # regions added to the below will be considered for IPSEC overlay participation
+    # transport is how routers of the region are configured, 'ssh' (CLI over SSH) or 'restconf'
     regions = {
         'eastus': {
             'eligible_default': 'True',
             'smart_licensing': 'True',
             'username': os.environ.get('router_username'),
             'password': os.environ.get('router_password'),
+            'transport': 'ssh',
         },
         'westus': {
             'eligible_default': 'True',
             'smart_licensing': 'True',
             'username': os.environ.get('router_username'),
             'password': os.environ.get('router_password'),
+            'transport': 'ssh',
         }
     }
     instance_types = {
@@ -61,6 +64,118 @@ class Settings:
 
     # Items with below key in AWS TAG will be considered participating in program
     tvpc_program_key = 'auto_tvpc_cluster_member'
+    # Participating VNETs get a default route to their SILB in this route table
+    private_route_table_name = 'private_route_table'
+    default_route_name = 'default_route'
     # Router DMVPN Tunnel addresses are from the address space below
     dmvpn_address_space = '192.168.254.0/23'
     dmvpn_password = os.environ.get('dmvpn_password')
+
+    # Seconds between poller reconcile cycles
+    poller_interval = 60
+    # VNET discovery backend, 'list_all' or 'resource_graph' (needs azure-mgmt-resourcegraph, falls back on list_all)
+    poller_discovery = 'list_all'
+    # Poller delta mode only reconciles VNETs whose etag or tvpc tags changed since the last cycle
+    poller_delta_mode = True
+    # Last seen VNET state is kept here so a restarted poller can warm start
+    poller_snapshot_path = 'azure_poller_snapshot.db'
+    # Every n cycles the snapshot is ignored and the whole subscription is reconciled
+    poller_full_reconcile_cycles = 60
+    # Subscriptions reconciled by sharded_poller.py, comma separated in AZURE_SUBSCRIPTION_IDS
+    poller_subscriptions = [i for i in (os.environ.get('AZURE_SUBSCRIPTION_IDS') or
+                                        os.environ.get('AZURE_SUBSCRIPTION_ID') or '').split(',') if i]
+    # Optional region partitioning for sharded_poller.py, e.g. [['eastus', 'eastus2'], ['westus']]
+    # Every subscription gets one shard per region group, without groups one shard per subscription
+    poller_region_shards = []
+    # Port of the poller's Prometheus /metrics endpoint, None to disable it
+    poller_metrics_port = 9110
+    # Address the /metrics endpoint listens on, the endpoint has no authentication, '' serves it on every interface
+    poller_metrics_address = '127.0.0.1'
+    # Optional JSON lines file receiving every metric after each cycle, e.g. 'azure_poller_metrics.jsonl'
+    poller_metrics_jsonl = None
+    # Check the default route of every healthy participant in scope and repair a stale next hop
+    # Costs one route table read per participant, in delta mode only changed participants are in scope
+    poller_verify_routes = True
+    # Peering jobs for different participant VNETs run in parallel on this many threads
+    poller_max_workers = 16
+
+    # Replica coordination, None runs a single poller. 'file' or 'blob' elect a leader through a lease,
+    # standbys take over at most poller_lease_duration seconds after the leader stops
+    poller_lease_backend = None
+    # Directory of the file backend's leases, shared by the replicas
+    poller_lease_path = './leases'
+    # Storage account and container of the blob backend, needs pip install azure-storage-blob
+    poller_lease_connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    poller_lease_container = 'tvpc-poller-leases'
+    # Lease duration in seconds, blob leases last 15 to 60 seconds
+    poller_lease_duration = 15
+    # With n > 0 the replicas split the (cluster, location) keys into n shards instead of electing a leader
+    poller_lease_shards = 0
+    # Name of this replica, defaults to the host name. It names the replica's snapshot file, so a restarted replica
+    # warm starts from its snapshot. The lease holder name is the replica id, or the host name and process id
+    # Set it when several replicas run on one host, replicas must not share a snapshot
+    poller_replica_id = os.environ.get('TVPC_REPLICA_ID')
+
+    # Event driven mode, event_listener.py accepts Event Grid resource events on http://<address>:<port>/events
+    event_listener_port = 8089
+    event_listener_address = ''
+    # Optional shared secret, the Event Grid webhook URL passes it as ?code=<token>
+    event_listener_token = os.environ.get('TVPC_EVENT_TOKEN')
+    # Events for the same VNETs arriving within this many seconds are reconciled together
+    event_debounce = 1.0
+    # A batch is reconciled at most this many seconds after its first event, even while events keep arriving
+    event_max_wait = 10.0
+    # Full scans keep running as a safety net for lost events, every this many seconds
+    event_full_scan_interval = 600
+
+    # ARM request pacing per subscription, tokens per second and bucket size for reads and writes
+    arm_read_rate = 25.0
+    arm_read_burst = 250
+    arm_write_rate = 10.0
+    arm_write_burst = 200
+    # Throttled and transient ARM errors are retried this many times before the call fails
+    arm_max_retries = 6
+    # ARM get results are cached for one poller cycle or full scan, or for this many seconds
+    # Writes drop the entries they change, newer etags from listings and events drop the entries of a VNET
+    arm_cache_ttl = None
+
+    # Router SSH sessions stay open between calls, at most this many per process
+    ssh_pool_max_size = 32
+    # Idle sessions are closed after this many seconds
+    ssh_pool_max_idle = 300
+    # Seconds between SSH keepalives, sessions idle for longer are probed before they are reused
+    ssh_keepalive = 30
+    # A router command that does not bring back the prompt within this many seconds fails
+    ssh_command_timeout = 120
+    # Configuration lines are sent this many at a time without waiting for each prompt
+    cli_chunk_size = 50
+    # A whole configuration push fails after this many seconds
+    cli_total_timeout = 600
+    # Fleet jobs configure this many routers at once, keep ssh_pool_max_size at least as large
+    fleet_max_workers = 32
+    # A router's fleet job is given up after this many seconds, and retried this many times when it fails
+    fleet_device_timeout = 900
+    fleet_retries = 1
+    # RESTCONF transport, HTTPS port of the routers and whether to verify their self signed certificates
+    restconf_port = 443
+    restconf_verify = False
+    # Seconds to wait for RESTCONF to answer after it is turned on
+    restconf_startup_timeout = 120
+    # Compiled router templates kept in memory, and an optional directory that keeps their bytecode between runs
+    template_cache_size = 64
+    template_bytecode_cache = None
+    # A new router must accept SSH logins within this many seconds, a running one within readiness_check_deadline
+    readiness_deadline = 450
+    readiness_check_deadline = 30
+    # Readiness probes give up a TCP connect or banner read after this many seconds, and back off from
+    # readiness_initial_delay up to readiness_max_delay seconds between tries
+    readiness_connect_timeout = 3.0
+    readiness_initial_delay = 1.0
+    readiness_max_delay = 15.0
+    # Smart license registration is given up this many seconds after the register command, and sent again this many
+    # times when the router reports it failed. The status is polled from license_poll_initial seconds apart, slowing
+    # down to license_poll_max while it does not change
+    license_timeout = 300
+    license_retries = 1
+    license_poll_initial = 2.0
+    license_poll_max = 30.0
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+from collections import OrderedDict
+
+# lines of show running-config that are not configuration
+NOISE = ('Building configuration', 'Current configuration', 'Last configuration change', 'NVRAM config last updated',
+         'version ', 'end')
+
+
+class Block:
+    """
+    A configuration line and the lines indented below it, children are keyed by their text in order
+    """
+    __slots__ = ('line', 'children')
+
+    def __init__(self, line=None):
+        self.line = line
+        self.children = OrderedDict()
+
+    def lines(self, depth=0):
+        """
+        Yields the block's children and their descendants as indented IOS lines
+        """
+        for text, child in self.children.items():
+            yield ' ' * depth + text
+            for line in child.lines(depth + 1):
+                yield line
+
+
+def config_lines(lines):
+    return [line.rstrip() for line in lines if line.strip() and not line.strip().startswith('!')]
+
+
+def parse(lines):
+    """
+    Parses IOS configuration lines into a Block tree by indentation
+    Blank lines, ! comments and the header and trailer of show running-config are skipped
+    """
+    root = Block()
+    stack = [(-1, root)]
+    for raw in lines:
+        line = raw.rstrip()
+        text = line.strip()
+        if not text or text.startswith('!'):
+            continue
+        indent = len(line) - len(line.lstrip(' '))
+        while indent <= stack[-1][0]:
+            stack.pop()
+        # the trailing end follows the last block, so noise is only recognised once back at the top level
+        if len(stack) == 1 and text.startswith(NOISE):
+            continue
+        parent = stack[-1][1]
+        block = parent.children.get(text)
+        if block is None:
+            block = parent.children[text] = Block(text)
+        stack.append((indent, block))
+    return root
+
+
+def satisfied(text, running):
+    """
+    A no line is in place when the running block does not hold what it removes
+    """
+    if text.startswith('no '):
+        return text[3:] not in running.children
+    return False
+
+
+def delta_blocks(running, wanted, depth=0):
+    commands = list()
+    for text, child in wanted.children.items():
+        current = running.children.get(text)
+        if current is None:
+            if satisfied(text, running):
+                continue
+            # a new block is sent whole
+            commands.append(' ' * depth + text)
+            commands.extend(child.lines(depth + 1))
+            continue
+        below = delta_blocks(current, child, depth + 1)
+        if below:
+            # enter the block so its changed lines land in the right mode
+            commands.append(' ' * depth + text)
+            commands.extend(below)
+    return commands
+
+
+def delta(running_lines, wanted_lines):
+    """
+    Returns the lines of wanted_lines missing from running_lines, with the parent lines needed to reach them
+    The delta only adds, lines of the running configuration the template does not mention are left alone.
+    Lines IOS stores in another form, e.g. abbreviated interface names or passwords it encrypts, are sent again
+    """
+    return delta_blocks(parse(running_lines), parse(wanted_lines))
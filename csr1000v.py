@@ -23,17 +23,65 @@ __copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
 __license__ = "Cisco Sample Code License, Version 1.1"
 
 import logging
-from jinja2 import Template
-import paramiko
 import time
+from cli_engine import CLIEngine
 from config import Settings
+import config_diff
+from licensing import Registration, STATUS_COMMAND, parse_license_status
+from readiness import ReadinessProbe, wait_ready
+from rendering import shared_renderer
+from restconf import RestconfTransport
+from ssh_pool import shared_pool
+
+# turns RESTCONF on for the restconf transport, templates/baseline.j2 keeps it on
+RESTCONF_BOOTSTRAP = ['ip http secure-server', 'ip http authentication local', 'restconf']
+
+
+def split_exec(config_input):
+    """
+    Splits configuration lines at the first end, the commands after it run in exec mode
+    """
+    lines = list(config_input)
+    commands = [line.strip() for line in lines]
+    if 'end' not in commands:
+        return lines, list()
+    split = commands.index('end')
+    return lines[:split], [c for c in commands[split + 1:] if c and not c.startswith('!')]
+
+
+def render_configs(routers, template_name, variables_dicts=None):
+    """
+    Renders template_name for every router from one compiled template, variables_dicts holds one dictionary per router
+    configs = render_configs(routers, 'templates/baseline.j2', [vv1, vv2])
+    """
+    variables_dicts = variables_dicts or [None] * len(routers)
+    return shared_renderer().render_many(template_name, [router.template_variables(variables_dict)
+                                                         for router, variables_dict in zip(routers, variables_dicts)])
+
+
+def wait_routers_ready(routers, deadline=None):
+    """
+    Waits for many booting routers at once, returns a readiness.Readiness per router and keeps it in router.readiness
+    """
+    results = wait_ready([router.readiness_probe(deadline or Settings.readiness_deadline, login_timeout=5.0)
+                          for router in routers], max_workers=Settings.fleet_max_workers)
+    for router, result in zip(routers, results):
+        router.readiness = result
+    return results
 
 
 class Router:
     """
     rtr.configure_router(rtr.render_config_from_template('templates/baseline.j2', variables_dict={'router_name': 'test123'}))
+    SSH sessions come from an ssh_pool.SSHSessionPool and stay open between calls, by default the pool of the process
+    With 'transport': 'restconf' in the router's region of Settings.regions configuration is applied as one
+    RESTCONF transaction per call instead of over the SSH shell
+    Templates are compiled once per process by rendering.shared_renderer(), render_configs renders many routers
+    initial_check_responsive and check_responsive wait with a staged readiness.ReadinessProbe, the outcome is kept in
+    router.readiness
+    register and ensure_registered run a licensing.Registration, its state and latency are kept in router.registration
     """
-    def __init__(self, public_ip, username, password, region, instance_type=None, max_bandwidth=1000):
+    def __init__(self, public_ip, username, password, region, instance_type=None, max_bandwidth=1000, pool=None):
         self.settings = Settings
         self.public_ip = public_ip
         self.username = username
@@ -41,38 +89,97 @@ class Router:
         self.region = region
         self.instance_type = instance_type
         self.max_bandwidth = max_bandwidth
+        self.pool = pool or shared_pool()
+        self.transport = Settings.regions.get(region, dict()).get('transport', 'ssh')
+        self.restconf_transport = None
+        self.readiness = None
+        self.registration = None
+
+    def ssh_run(self, fn, timeout=None):
+        """
+        Returns fn(cli), cli a cli_engine.CLIEngine on the shell of a pooled SSH session at the exec prompt
+        fn runs again on a new session when a reused one was lost, see ssh_pool.SSHSessionPool.run
+        """
+        return self.pool.run(self.public_ip, self.username, self.password, lambda s: fn(self.cli(s.channel)), timeout)
+
+    def abort(self):
+        """
+        Closes the router's pooled SSH sessions, also one a running call is waiting on, and its RESTCONF session
+        """
+        self.pool.abort(self.public_ip)
+        if self.restconf_transport is not None:
+            self.restconf_transport.close()
+
+    def cli(self, ssh):
+        return CLIEngine(ssh, command_timeout=Settings.ssh_command_timeout,
+                         total_timeout=Settings.cli_total_timeout, chunk_size=Settings.cli_chunk_size)
         
-    def register(self):
+    def enable_restconf(self):
+        """
+        Turns RESTCONF on over SSH and waits until it answers, returns the RestconfTransport
+        """
+        logger = logging.getLogger(__name__)
+        self.ssh_run(lambda cli: cli.configure(RESTCONF_BOOTSTRAP))
+        transport = RestconfTransport(self.public_ip, self.username, self.password, port=Settings.restconf_port,
+                                      verify=Settings.restconf_verify)
+        deadline = time.monotonic() + Settings.restconf_startup_timeout
+        while True:
+            try:
+                transport.show_version()
+                logger.info('Router %s RESTCONF enabled', self.public_ip)
+                return transport
+            except Exception:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(2)
+
+    def restconf(self):
+        if self.restconf_transport is None:
+            self.restconf_transport = self.enable_restconf()
+        return self.restconf_transport
+
+    def configure_restconf(self, config_lines, exec_lines):
+        """
+        Applies the configuration lines as one RESTCONF transaction and saves it
+        Exec commands, e.g. license smart register, have no RESTCONF equivalent and run over SSH
+        """
+        results = list()
+        if config_lines:
+            transport = self.restconf()
+            results = transport.configure(config_lines)
+            if results and all(r.ok for r in results):
+                transport.save()
+        if exec_lines:
+            results += self.ssh_run(lambda cli: cli.send(exec_lines))
+        return results
+
+    def license_registration(self):
+        """
+        Returns a licensing.Registration that configures smart licensing, registers and enables the license
+        """
         if not self.set_license_info():
-            return False
+            return None
         if not self.render_smart_license_configure():
-            return False
+            return None
         if not self.render_smart_license_enable():
+            return None
+        configure_lines, register_commands = split_exec(self.smart_license_configure_config)
+        return Registration.from_settings(self, Settings, configure_lines, register_commands,
+                                          self.smart_license_enable_config)
+
+    def register(self):
+        self.registration = self.license_registration()
+        if not self.registration:
             return False
-        if not self.configure_router(self.smart_license_configure_config):
-            return False
-        if not self.ensure_registered():
-            return False
-        if not self.configure_router(self.smart_license_enable_config):
-            return False
-        return True
+        return self.registration.run()
 
     def deregister(self):
         logger = logging.getLogger(__name__)
         try:
-            c = paramiko.SSHClient()
-            c.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            c.connect(self.public_ip,
-                      username=self.username,
-                      password=self.password,
-                      timeout=15.0)
-            ssh = c.invoke_shell()
-            self.prompt(ssh)
-            ssh.send('license smart deregister\n')
-            self.prompt(ssh)
-            ssh.send('wr mem\n')
-            self.prompt(ssh)
-            ssh.close()
+            def deregister(cli):
+                cli.run('license smart deregister')
+                cli.run('wr mem')
+            self.ssh_run(deregister)
             logger.info('Router %s successfully deregistered smart license', self.public_ip)
             return True
         except Exception as e:
@@ -145,150 +252,108 @@ class Router:
             logger.error(e)
             return False
 
-    def configure_router(self, config_input):
+    def running_config(self):
+        return self.ssh_run(lambda cli: cli.run('show running-config')).output.splitlines()
+
+    def config_delta(self, config_lines):
+        """
+        Returns the configuration lines missing from the running configuration, see config_diff.delta
+        The number of lines is kept in self.diff_size
+        """
+        logger = logging.getLogger(__name__)
+        delta = config_diff.delta(self.running_config(), config_lines)
+        self.diff_size = len(delta)
+        logger.info('Router %s is missing %d of %d configuration lines', self.public_ip, len(delta),
+                    len(config_diff.config_lines(config_lines)))
+        return delta
+
+    def configure_router(self, config_input, diff=False):
+        """
+        Sends the configuration lines in chunks, or as a RESTCONF transaction, and saves it
+        With diff only the lines missing from the running configuration are sent, and nothing is saved when none are
+        Returns False when the router rejected a line
+        The cli_engine.LineResult of every line is kept in self.config_results
+        """
         logger = logging.getLogger(__name__)
         try:
-            c = paramiko.SSHClient()
-            c.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            c.connect(self.public_ip,
-                      username=self.username,
-                      password=self.password,
-                      timeout=15.0)
-            ssh = c.invoke_shell()
-            self.prompt(ssh)
-            ssh.send('config t\n')
-            self.prompt(ssh)
-            for line in config_input:
-                ssh.send(line + '\n')
-                self.prompt(ssh)
-            ssh.send('end\n')
-            self.prompt(ssh)
-            ssh.send('wr mem\n')
-            self.prompt(ssh)
-            ssh.close()
+            config_lines, exec_lines = split_exec(config_input)
+            if diff:
+                config_lines = self.config_delta(config_lines)
+                if not config_lines and not exec_lines:
+                    self.config_results = list()
+                    logger.info('Router %s already configured', self.public_ip)
+                    return True
+            if self.transport == 'restconf':
+                self.config_results = self.configure_restconf(config_lines, exec_lines)
+            else:
+                def push(cli):
+                    results = cli.configure(config_lines + (['end'] + exec_lines if exec_lines else []))
+                    if config_lines or not diff:
+                        cli.run('wr mem')
+                    return results
+                self.config_results = self.ssh_run(push)
+            failed = [r for r in self.config_results if not r.ok]
+            if failed:
+                logger.warning('Router %s rejected %d of %d configuration lines', self.public_ip, len(failed),
+                               len(self.config_results))
+                return False
             logger.info('Router %s successfully configured', self.public_ip)
             return True
         except Exception as e:
             logger.error(e)
             return False
 
+    def run_command(self, command):
+        """
+        Runs an exec command over a pooled session, returns its output
+        """
+        return self.ssh_run(lambda cli: cli.run(command)).output
+
+    def license_status(self):
+        """
+        Returns the licensing.LicenseStatus of the router
+        """
+        return parse_license_status(self.run_command(STATUS_COMMAND))
+
     def ensure_registered(self):
-        logger = logging.getLogger(__name__)
-        counter = 0
-        try:
-            c = paramiko.SSHClient()
-            c.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            c.connect(self.public_ip,
-                      username=self.username,
-                      password=self.password,
-                      timeout=15.0)
-            ssh = c.invoke_shell()
-            self.prompt(ssh)
-            while counter != 4:
-                ssh.send('terminal length 0\n')
-                self.prompt(ssh)
-                ssh.send('show license summary\n')
-                result = self.prompt(ssh)
-                lines = result.splitlines()
-                if 'Smart Licensing is ENABLED' in lines:
-                    logger.info('Router %s smart licensing registered!', self.public_ip)
-                    ssh.close()
-                    return True
-                time.sleep(2)
-                counter += 1
-            ssh.close()
-            logger.warning('Router %s unable to register with smart licensing', self.public_ip)
-            return False
-        except Exception as e:
-            logger.error(e)
-            return False
+        self.registration = Registration.from_settings(self, Settings)
+        return self.registration.run()
+
+    def readiness_probe(self, deadline=None, login_timeout=15.0):
+        """
+        Returns a readiness.ReadinessProbe for this router, its login runs show version over a pooled session
+        """
+        def login():
+            self.ssh_run(lambda cli: cli.run('show version'), timeout=login_timeout)
+            return True
+        return ReadinessProbe.from_settings(self.public_ip, login, Settings, deadline)
 
-    @staticmethod
-    def prompt(chan):
-        buff = ''
-        while not buff.endswith('#'):
-            resp = chan.recv(9999)
-            resp1 = resp.decode('utf-8')
-            buff += resp1
-        return buff
-    
     def check_responsive(self):
-        logger = logging.getLogger(__name__)
-        counter = 0
-        while counter < 3:
-            try:
-                c = paramiko.SSHClient()
-                c.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                c.connect(self.public_ip,
-                          username=self.username,
-                          password=self.password,
-                          timeout=15.0)
-                ssh = c.invoke_shell()
-                ssh.send('terminal length 0\n')
-                self.prompt(ssh)
-                ssh.send('show version\n')
-                self.prompt(ssh)
-                ssh.close()
-                return True
-            except:
-                if counter < 3:
-                    time.sleep(1)
-                    counter += 1
-                else:
-                    logger.warning('Exception driven Responsive test failed for {}'.format(self.public_ip))
-                    return False
-        logger.warning('Responsive test failed for {}'.format(self.public_ip))
-        return False
+        self.readiness = self.readiness_probe(Settings.readiness_check_deadline).wait()
+        return self.readiness.ready
 
     def initial_check_responsive(self):
-        logger = logging.getLogger(__name__)
-        counter = 0
-        while counter < 90:
-            try:
-                print(str(counter))
-                c = paramiko.SSHClient()
-                c.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                c.connect(self.public_ip,
-                          username=self.username,
-                          password=self.password,
-                          timeout=5.0)
-                ssh = c.invoke_shell()
-                ssh.send('terminal length 0\n')
-                self.prompt(ssh)
-                ssh.send('show version\n')
-                self.prompt(ssh)
-                ssh.close()
-                return True
-            except:
-                if counter < 90:
-                    time.sleep(5)
-                    counter += 1
-                else:
-                    logger.warning('Exception driven Responsive test failed for {}'.format(self.public_ip))
-                    return False
-        logger.warning('Responsive test failed for {}'.format(self.public_ip))
-        return False
+        # a new router's first session stays in the pool for its configuration
+        self.readiness = self.readiness_probe(Settings.readiness_deadline, login_timeout=5.0).wait()
+        return self.readiness.ready
+
+    def template_variables(self, variables_dict=None):
+        """
+        Returns the template variables of this router, its attributes updated with variables_dict and the settings
+        """
+        # a copy, the settings entry below would replace self.settings
+        conf_vars_dict = dict(vars(self))
+        if variables_dict:
+            conf_vars_dict.update(variables_dict)
+        conf_vars_dict['settings'] = {'dmvpn_password': Settings.dmvpn_password}
+        return conf_vars_dict
 
     def render_config_from_template(self, template_name, variables_dict=None):
         logger = logging.getLogger(__name__)
-        settings = Settings()
         try:
-            with open(template_name, 'r') as t:
-                template_data = t.readlines()
-            configuration = list()
-            conf_vars_dict = vars(self)
-            if variables_dict:
-                conf_vars_dict.update(variables_dict)
-            conf_vars_dict['settings'] = dict()
-            conf_vars_dict['settings']['dmvpn_password'] = settings.dmvpn_password
-
-            for line in template_data:
-                line = line.rstrip('\n')
-                t = Template(line)
-                new_line = t.render(conf_vars_dict)
-                configuration.append(new_line)
-            return configuration
+            return shared_renderer().render(template_name, self.template_variables(variables_dict))
         except Exception as e:
+            logger.warning("Unable to render {}".format(template_name))
             logger.error(e)
             return False
 
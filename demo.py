@@ -35,8 +35,11 @@ import azure.mgmt.compute.models as compute_models
 from multiprocessing import Process
 from multiprocessing import Queue
 from queue import Empty
+from cache import ResponseCache
 from csr1000v import Router
 from config import Settings
+from fleet import Fleet, format_results
+from throttle import RequestScheduler
 
 
 def generate_variables(rtr_list, g_vnet_types, g_instance_type, g_region, g_cluster, g_asn,
@@ -109,10 +112,14 @@ def create_vnet(results_queue, creds, subscription, vv):
     hub_1_public = None
     hub_1_private = None
 
-    resource_client = ResourceManagementClient(creds, subscription)
-    compute_client = ComputeManagementClient(creds, subscription)
-    storage_client = StorageManagementClient(creds, subscription)
-    network_client = NetworkManagementClient(creds, subscription)
+    # all Azure calls from this process are paced to stay under the ARM throttling limits
+    scheduler = RequestScheduler.from_settings(settings)
+    # repeated gets of the same resource are answered from the cache, writes drop what they change
+    cache = ResponseCache(settings.arm_cache_ttl)
+    resource_client = scheduler.wrap(ResourceManagementClient(creds, subscription))
+    compute_client = cache.wrap(scheduler.wrap(ComputeManagementClient(creds, subscription)), 'compute')
+    storage_client = scheduler.wrap(StorageManagementClient(creds, subscription))
+    network_client = cache.wrap(scheduler.wrap(NetworkManagementClient(creds, subscription)), 'network')
 
     # 1 Create Resource Group
     resg = resource_client.resource_groups.create_or_update(
@@ -243,7 +250,7 @@ def create_vnet(results_queue, creds, subscription, vv):
         routes=[private_subnet_route]
     )
     result_object_route_table_private_creation = network_client.route_tables.create_or_update(vv['resource_group_name'],
-                                                                                      'private_route_table',
+                                                                                      settings.private_route_table_name,
                                                                                       private_route_table_params)
     result_object_route_table_private_creation.wait()
     private_route_table = result_object_route_table_private_creation.result()
@@ -394,6 +401,7 @@ def create_vnet(results_queue, creds, subscription, vv):
                                                                           load_balancer_name,
                                                                           bap_name)
     router_counter = 0
+    routers = list()
     for r in vv['dmvpn_address']:
         vv['router_counter'] = str(router_counter)
         vv['dmvpn_address_router'] = vv['dmvpn_address'][router_counter]
@@ -543,38 +551,29 @@ def create_vnet(results_queue, creds, subscription, vv):
 
         router = Router(vv['public_ip'], vv['username'], vv['password'], vv['region'], vv['instance_type'],
                         settings.instance_types[vv['instance_type']])
-        if not router.initial_check_responsive():
-            print('router unresponsive')
-        if settings.regions[vv['region']]['smart_licensing'] == 'True':
-            if not router.register():
-                print('router unable to register with smart licensing')
 
-        config = router.render_config_from_template(template_name='templates/baseline.j2', variables_dict=vv)
-
-        # want an exception if configuration result is not true
-        if not router.configure_router(config):
-            print('unable to configure router')
+        # configurations are rendered now, vv changes for the next router
+        configs = [router.render_config_from_template(template_name='templates/baseline.j2', variables_dict=vv)]
         if vv['type'] == 'hub':
-            config = router.render_config_from_template(template_name='templates/dmvpn_hub.j2', variables_dict=vv)
-            if not router.configure_router(config):
-                print('unable to configure router')
+            configs.append(router.render_config_from_template(template_name='templates/dmvpn_hub.j2',
+                                                              variables_dict=vv))
         elif vv['type'] == 'spoke':
-            config = router.render_config_from_template(template_name='templates/dmvpn_spoke.j2', variables_dict=vv)
-            if not router.configure_router(config):
-                print('unable to configure router')
+            configs.append(router.render_config_from_template(template_name='templates/dmvpn_spoke.j2',
+                                                              variables_dict=vv))
         elif vv['type'] == 'silb':
-            config = router.render_config_from_template(template_name='templates/dmvpn_spoke_silb.j2',
-                                                        variables_dict=vv)
-            if not router.configure_router(config):
-                print('unable to configure router')
+            configs.append(router.render_config_from_template(template_name='templates/dmvpn_spoke_silb.j2',
+                                                              variables_dict=vv))
         elif vv['type'] == 'vnet':
-            config = router.render_config_from_template(template_name='templates/app_vnet.j2', variables_dict=vv)
-            if not router.configure_router(config):
-                print('unable to configure router')
-        if not router.configure_router(['end', 'event  manager run 10interface']):
-            print('unable to configure 10 gigabitethernet interface')
+            configs.append(router.render_config_from_template(template_name='templates/app_vnet.j2',
+                                                              variables_dict=vv))
+        configs.append(['end', 'event  manager run 10interface'])
+        routers.append((router, configs))
         router_counter += 1
 
+    # the VNET's routers boot, register and get configured at the same time
+    results = Fleet.from_settings(settings).run(routers, provision_router)
+    print(format_results(results))
+
     # Tag SILB VNET with SILB private IP
     if vv['type'] == 'silb':
         lb_info = network_client.load_balancers.get(vv['resource_group_name'], load_balancer_name)
@@ -587,6 +586,26 @@ def create_vnet(results_queue, creds, subscription, vv):
     results_queue.put({'hub_1_public': hub_1_public, 'hub_1_private': hub_1_private})
 
 
+def provision_router(router, configs):
+    """
+    Waits for a new router to answer, registers its smart license and pushes its configurations in order
+    """
+    settings = Settings()
+    if not router.initial_check_responsive():
+        print('router unresponsive')
+        return False
+    if settings.regions[router.region]['smart_licensing'] == 'True':
+        if not router.register():
+            print('router unable to register with smart licensing')
+    ok = True
+    for config in configs:
+        # want an exception if configuration result is not true
+        if not router.configure_router(config):
+            print('unable to configure router {}'.format(router.public_ip))
+            ok = False
+    return ok
+
+
 def create_tasks(req_queue, num_processes, vnet_vars):
     """
          The request_queue is populated the router objects
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+from records import PeeringRecord, VnetRecord, intern, project_vnets, relevant_tags
+
+try:
+    from azure.mgmt.resourcegraph import ResourceGraphClient
+    from azure.mgmt.resourcegraph.models import QueryRequest, QueryRequestOptions
+except ImportError:
+    ResourceGraphClient = None
+
+RESOURCE_GRAPH_QUERY = """Resources
+| where type =~ 'microsoft.network/virtualnetworks'
+| where isnotempty(tags['{program_key}'])
+| project id, name, location, tags, peerings = properties.virtualNetworkPeerings"""
+
+
+class ListAllDiscovery:
+    """
+    Lists every VNET in the subscription with virtual_networks.list_all()
+    The pager is consumed as a stream, each tagged VNET is projected into a records.VnetRecord and the
+    SDK models are dropped page by page, untagged VNETs are never kept
+    """
+    name = 'list_all'
+
+    def __init__(self, factory, program_key):
+        self.factory = factory
+        self.program_key = program_key
+
+    def vnets(self):
+        return list(project_vnets(self.factory.network().virtual_networks.list_all(), self.program_key))
+
+
+class ResourceGraphDiscovery:
+    """
+    Asks Azure Resource Graph for tagged VNETs only, projected to the fields reconciliation needs
+    Requires the optional azure-mgmt-resourcegraph package
+    Rows are projected into records.VnetRecord like list_all results
+    Resource Graph does not return etags, the topology snapshot falls back on tags and peerings
+    """
+    name = 'resource_graph'
+    page_size = 1000
+
+    def __init__(self, factory, program_key):
+        if ResourceGraphClient is None:
+            raise ImportError('azure-mgmt-resourcegraph is not installed')
+        self.factory = factory
+        self.program_key = program_key
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            self._client = ResourceGraphClient(self.factory.credentials())
+            self._client.config.keep_alive = True
+        return self._client
+
+    def rows(self):
+        query = RESOURCE_GRAPH_QUERY.format(program_key=self.program_key)
+        skip_token = None
+        while True:
+            request = QueryRequest(subscriptions=[self.factory.subscription_id], query=query,
+                                   options=QueryRequestOptions(top=self.page_size, skip_token=skip_token,
+                                                               result_format='objectArray'))
+            response = self.client().resources(request)
+            for row in response.data:
+                yield row
+            skip_token = response.skip_token
+            if not skip_token:
+                break
+
+    def vnets(self):
+        return [vnet_from_row(row, self.program_key) for row in self.rows()]
+
+
+class FakeDiscovery:
+    """
+    Returns a fixed list of VNET objects, for tests and benchmarks
+    available=False makes vnets() raise, as an unreachable backend would
+    """
+    name = 'fake'
+
+    def __init__(self, vnets, available=True):
+        self._vnets = vnets
+        self.available = available
+        self.calls = 0
+
+    def vnets(self):
+        self.calls += 1
+        if not self.available:
+            raise RuntimeError('fake discovery backend unavailable')
+        return list(self._vnets)
+
+
+class FallbackDiscovery:
+    """
+    Uses the primary backend and falls back on the secondary one when the primary raises
+    """
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    def vnets(self):
+        logger = logging.getLogger(__name__)
+        try:
+            return self.primary.vnets()
+        except Exception as e:
+            logger.warning("{} discovery failed, falling back on {}".format(self.primary.name, self.fallback.name))
+            logger.error("{}".format(e))
+            return self.fallback.vnets()
+
+
+def vnet_from_row(row, program_key):
+    peerings = list()
+    for p in row.get('peerings') or []:
+        properties = p.get('properties') or {}
+        peerings.append(PeeringRecord(p.get('name'), intern((properties.get('remoteVirtualNetwork') or {}).get('id')),
+                                      intern(properties.get('peeringState'))))
+    return VnetRecord(row['id'], row['name'], intern(row['location']), relevant_tags(row.get('tags'), program_key),
+                      None, peerings)
+
+
+def make_discovery(settings, factory):
+    """
+    Returns the discovery backend selected by settings.poller_discovery
+    resource_graph falls back on list_all when the package is missing or the query fails
+    """
+    logger = logging.getLogger(__name__)
+    list_all = ListAllDiscovery(factory, settings.tvpc_program_key)
+    if settings.poller_discovery == 'resource_graph':
+        try:
+            return FallbackDiscovery(ResourceGraphDiscovery(factory, settings.tvpc_program_key), list_all)
+        except ImportError as e:
+            logger.warning("Resource Graph discovery unavailable, using list_all")
+            logger.error("{}".format(e))
+    return list_all
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from cache import ResponseCache
+from clients import AzureClientFactory
+from config import Settings
+from discovery import make_discovery
+from executor import OrderedExecutor
+from reconcile import apply, parse_subscription_id, parse_vnet_id, plan
+from records import project_vnet
+from snapshot import TopologySnapshot
+from throttle import error_status
+from udr import RouteManager
+
+VALIDATION_EVENT = 'Microsoft.EventGrid.SubscriptionValidationEvent'
+RESOURCE_EVENTS = ('Microsoft.Resources.ResourceWriteSuccess', 'Microsoft.Resources.ResourceDeleteSuccess')
+
+
+def vnet_id_from_resource(resource_uri):
+    """
+    Returns the VNET id a resource id belongs to, None when it is not a VNET or a child of one
+    Peerings, subnets and the tags scope (.../providers/Microsoft.Resources/tags/default) map to their VNET
+    """
+    parts = (resource_uri or '').rstrip('/').split('/')
+    lower = [p.lower() for p in parts]
+    for n in range(1, len(parts) - 1):
+        if lower[n] == 'virtualnetworks' and lower[n - 1] == 'microsoft.network':
+            return '/'.join(parts[:n + 2])
+    return None
+
+
+def event_time(event):
+    """
+    Returns the eventTime of an Event Grid event as epoch seconds, now when it is missing or unreadable
+    """
+    try:
+        # Event Grid sends up to 7 fractional digits, datetime reads exactly 6
+        value = event['eventTime'].replace('Z', '+00:00')
+        value = re.sub(r'\.(\d+)', lambda m: '.' + (m.group(1) + '000000')[:6], value)
+        return datetime.fromisoformat(value).timestamp()
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return time.time()
+
+
+class EventQueue:
+    """
+    VNET ids waiting for a targeted reconcile with the time of their oldest event
+    take() returns once events have stopped arriving for debounce seconds, so a burst of writes to one VNET
+    (tags, peerings, subnets) is reconciled once. Under a steady stream of events, such as the reconciler's own
+    peering and route writes, it still returns max_wait seconds after the first event of the batch
+    """
+    def __init__(self, debounce=1.0, max_wait=10.0):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.pending = dict()
+        self.first = 0.0
+        self.last = 0.0
+        self.condition = threading.Condition()
+
+    def add(self, vnet_ids, received=None):
+        received = received or time.time()
+        with self.condition:
+            now = time.monotonic()
+            if not self.pending:
+                self.first = now
+            for i in vnet_ids:
+                self.pending[i] = min(self.pending.get(i, received), received)
+            self.last = now
+            self.condition.notify()
+
+    def take(self, timeout):
+        """
+        Returns a dictionary of VNET id -> event time, empty when nothing arrived within timeout seconds
+        A batch is returned by the timeout at the latest
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self.condition:
+            while not self.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return dict()
+                self.condition.wait(remaining)
+            while True:
+                quiet = min(self.last + self.debounce, self.first + self.max_wait, deadline) - time.monotonic()
+                if quiet <= 0:
+                    break
+                self.condition.wait(quiet)
+            batch = self.pending
+            self.pending = dict()
+            return batch
+
+
+class EventHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class EventListener:
+    """
+    Receives Event Grid resource write and delete notifications on POST /events and queues the affected VNET ids
+    The Event Grid subscription validation handshake is answered with the validation code.
+    With a token, requests have to carry it as ?code=<token>, like an Event Grid webhook URL
+    listener = EventListener(queue, port=8089).start()
+    """
+    def __init__(self, queue, port=8089, host='', token=None):
+        self.queue = queue
+        self.token = token
+        self.server = EventHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/events'.format(host or '127.0.0.1', port)
+
+    def handle(self, events):
+        """
+        Returns the response body for a list of Event Grid events
+        """
+        logger = logging.getLogger(__name__)
+        vnet_ids = set()
+        received = None
+        for e in events:
+            event_type = e.get('eventType')
+            data = e.get('data') or {}
+            if event_type == VALIDATION_EVENT:
+                logger.info("Answering Event Grid subscription validation")
+                return {'validationResponse': data.get('validationCode')}
+            if event_type not in RESOURCE_EVENTS:
+                continue
+            vnet_id = vnet_id_from_resource(data.get('resourceUri') or e.get('subject'))
+            if vnet_id:
+                vnet_ids.add(vnet_id)
+                t = event_time(e)
+                received = t if received is None else min(received, t)
+        if vnet_ids:
+            self.queue.add(vnet_ids, received)
+        return {'accepted': len(vnet_ids)}
+
+    def handler_class(self):
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path.rstrip('/') != '/events':
+                    self.reply(404, {'error': 'not found'})
+                    return
+                if listener.token and parse_qs(url.query).get('code', [None])[0] != listener.token:
+                    self.reply(401, {'error': 'invalid code'})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    events = json.loads(self.rfile.read(length).decode('utf-8') or '[]')
+                except ValueError:
+                    self.reply(400, {'error': 'invalid json'})
+                    return
+                if isinstance(events, dict):
+                    events = [events]
+                self.reply(200, listener.handle(events))
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def post_events(url, vnet_ids, event_type='Microsoft.Resources.ResourceWriteSuccess'):
+    """
+    Local stand-in for Event Grid, posts one resource event per VNET id to a listener
+    """
+    now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    events = [{'id': '{}-{}'.format(time.time(), n), 'eventType': event_type, 'subject': i, 'eventTime': now,
+               'dataVersion': '', 'data': {'resourceUri': i, 'operationName': 'Microsoft.Resources/tags/write'}}
+              for n, i in enumerate(vnet_ids)]
+    request = urllib.request.Request(url, json.dumps(events).encode('utf-8'), {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+class EventReconciler:
+    """
+    Keeps the VNET records of the last full scan and reconciles single VNETs as their events arrive
+    A targeted reconcile reads the affected VNETs and the SILB VNETs of their cluster and region again with
+    virtual_networks.get, then plans and applies only them. A changed or deleted SILB VNET brings its participants
+    in scope. Full scans keep running on an interval as the safety net for lost events
+    With the cache.ResponseCache of the factory, SILB VNETs unrelated to the changed VNETs are not read again
+    """
+    def __init__(self, factory, settings, discovery, snapshot=None, dry_run=False):
+        self.factory = factory
+        self.settings = settings
+        self.discovery = discovery
+        self.snapshot = snapshot
+        self.dry_run = dry_run
+        self.cache = factory.cache
+        self.records = dict()
+        self.cycle = 0
+
+    def is_silb(self, record):
+        return record is not None and record.tags.get('tvpc_silb_vnet') == 'True'
+
+    def key(self, record):
+        return record.tags.get(self.settings.tvpc_program_key), record.location
+
+    def lookup(self, vnet_id):
+        # resource ids are case insensitive, events do not always use the casing of the listing
+        for i in (vnet_id, vnet_id.lower()):
+            if i in self.records:
+                return self.records[i]
+        return None
+
+    def store(self, vnet_id, record):
+        self.records.pop(vnet_id.lower(), None)
+        if record is not None:
+            self.records[record.id.lower()] = record
+
+    def fetch(self, vnet_id, changed=True):
+        """
+        Returns the current record of a VNET, None when it is gone or no longer tagged
+        changed VNETs are read from Azure, the others may come from the cache
+        """
+        if changed and self.cache is not None:
+            self.cache.invalidate_id(vnet_id)
+        resource_group_name, vnet_name = parse_vnet_id(vnet_id)
+        try:
+            v = self.factory.network(parse_subscription_id(vnet_id)).virtual_networks.get(resource_group_name,
+                                                                                          vnet_name)
+        except Exception as e:
+            if error_status(e) == 404:
+                return None
+            raise
+        return project_vnet(v, self.settings.tvpc_program_key)
+
+    def run(self, reconcile_plan):
+        logger = logging.getLogger(__name__)
+        if self.dry_run:
+            for line in reconcile_plan.describe():
+                logger.info("Dry run: {}".format(line))
+            return list()
+        return apply(reconcile_plan, self.factory, OrderedExecutor(self.settings.poller_max_workers),
+                     RouteManager(self.factory))
+
+    def full_scan(self):
+        """
+        Reconciles the whole subscription like a poller cycle and refreshes the records
+        """
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        self.cycle += 1
+        try:
+            vnets = self.discovery.vnets()
+        except Exception as e:
+            logger.warning("Unable to access Azure")
+            logger.error("{}".format(e))
+            return None
+        if self.cache is not None:
+            self.cache.new_cycle(vnets)
+        delta = bool(self.cycle % self.settings.poller_full_reconcile_cycles)
+        reconcile_plan = plan(vnets, self.settings, self.snapshot, delta)
+        logger.info("Full scan {} plan: {}".format(self.cycle, reconcile_plan.summary()))
+        failed_ids = set(r.key for r in self.run(reconcile_plan) if not r.ok)
+        if self.snapshot and not self.dry_run:
+            self.snapshot.update(vnets, failed_ids)
+        self.records = dict((v.id.lower(), v) for v in vnets)
+        logger.info("Full scan {} reconciled {} VNETs in {:.1f}s, {} failed".format(
+            self.cycle, len(vnets), time.monotonic() - start, len(failed_ids)))
+        return failed_ids
+
+    def reconcile_events(self, batch):
+        """
+        Reconciles the VNETs of a batch of events, batch is a dictionary of VNET id -> event time
+        """
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        changed_ids = set()
+        keys = set()
+        retagged_keys = set()
+        try:
+            for vnet_id in batch:
+                old = self.lookup(vnet_id)
+                new = self.fetch(vnet_id)
+                self.store(vnet_id, new)
+                # most SILB events are the SILB side of our own peering writes, only a SILB that appeared, went away
+                # or changed its tags moves the next hop of its participants
+                retagged = old is None or new is None or old.tags != new.tags
+                for r in (old, new):
+                    if r is not None:
+                        changed_ids.add(r.id)
+                        keys.add(self.key(r))
+                        if self.is_silb(r) and retagged:
+                            # participants of a new, retagged or deleted SILB have to be peered or cleaned up again
+                            retagged_keys.add(self.key(r))
+                            changed_ids.update(v.id for v in self.records.values()
+                                               if not self.is_silb(v) and self.key(v) == self.key(r))
+            # the SILB side of the peering has to be current too, records of the last full scan predate its changes
+            # the state of a SILB peering follows its remote VNET, so SILBs peered with a changed VNET are read again
+            for v in list(self.records.values()):
+                if not self.is_silb(v) or v.id in changed_ids:
+                    continue
+                peered = any(x.remote_virtual_network.id in changed_ids for x in v.virtual_network_peerings)
+                if peered or self.key(v) in keys:
+                    self.store(v.id, self.fetch(v.id, peered))
+        except Exception as e:
+            logger.warning("Unable to read VNETs {}".format(', '.join(sorted(batch))))
+            logger.error("{}".format(e))
+            return None
+        if not changed_ids:
+            logger.info("Events for {} need no reconcile".format(', '.join(sorted(batch))))
+            return list()
+
+        reconcile_plan = plan(list(self.records.values()), self.settings, changed_ids=changed_ids,
+                              retagged_keys=retagged_keys)
+        logger.info("Event plan for {} VNETs: {}".format(len(changed_ids), reconcile_plan.summary()))
+        results = self.run(reconcile_plan)
+        lag = time.time() - min(batch.values())
+        logger.info("Reconciled {} VNETs in {:.1f}s, {:.1f}s after the first event, {} failed".format(
+            len(changed_ids), time.monotonic() - start, lag, len([r for r in results if not r.ok])))
+        if self.cache is not None:
+            logger.info("ARM get cache: {}".format(self.cache.stats))
+        return results
+
+    def serve(self, queue, full_scan_interval):
+        """
+        Runs full scans every full_scan_interval seconds and targeted reconciles for queued events in between
+        Everything runs on the calling thread, a targeted reconcile never overlaps a full scan
+        """
+        next_scan = time.monotonic()
+        while True:
+            if time.monotonic() >= next_scan:
+                self.full_scan()
+                next_scan = time.monotonic() + full_scan_interval
+            batch = queue.take(next_scan - time.monotonic())
+            if batch:
+                self.reconcile_events(batch)
+
+
+if __name__ == '__main__':
+    """
+    Event driven mode, point an Event Grid subscription for resource write and delete events on the subscription
+    at http://<host>:8089/events?code=<TVPC_EVENT_TOKEN>
+    python event_listener.py
+    To notify a running listener by hand, like Event Grid would after tagging a VNET:
+    python event_listener.py --notify \
+        /subscriptions/<sub>/resourceGroups/<rg>/providers/Microsoft.Network/virtualNetworks/<vnet>
+    """
+    parser = argparse.ArgumentParser(description='Event driven peering and UDR reconciler')
+    parser.add_argument('--dry-run', action='store_true', help='log the planned changes without applying them')
+    parser.add_argument('--snapshot', default='azure_event_listener_snapshot.db', help='delta mode snapshot file')
+    parser.add_argument('--notify', nargs='+', default=None, help='post events for these VNET ids and exit')
+    parser.add_argument('--url', default=None, help='listener URL for --notify')
+    args = parser.parse_args()
+    settings = Settings()
+
+    if args.notify:
+        url = args.url or 'http://127.0.0.1:{}/events'.format(settings.event_listener_port)
+        if settings.event_listener_token:
+            url += '?code={}'.format(settings.event_listener_token)
+        print(post_events(url, args.notify))
+    else:
+        # logging info
+        FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        logging.basicConfig(handlers=[
+            logging.FileHandler("{0}/{1}.log".format('./', 'azure_event_listener')),
+            logging.StreamHandler()], format=FORMAT, level=logging.INFO)
+
+        factory = AzureClientFactory(throttle_settings=settings, cache=ResponseCache(settings.arm_cache_ttl))
+        snapshot = None
+        if settings.poller_delta_mode:
+            snapshot = TopologySnapshot(args.snapshot, settings.tvpc_program_key)
+        events = EventQueue(settings.event_debounce, settings.event_max_wait)
+        EventListener(events, settings.event_listener_port, settings.event_listener_address,
+                      settings.event_listener_token).start()
+        reconciler = EventReconciler(factory, settings, make_discovery(settings, factory), snapshot, args.dry_run)
+        reconciler.serve(events, settings.event_full_scan_interval)
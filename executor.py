@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobResult:
+    def __init__(self, key, description, ok, error=None, elapsed=0.0):
+        self.key = key
+        self.description = description
+        self.ok = ok
+        self.error = error
+        self.elapsed = elapsed
+
+
+class OrderedExecutor:
+    """
+    Runs independent jobs on a bounded thread pool
+    Jobs submitted with the same key (a VNET id) run one after another in submission order, jobs with different
+    keys run in parallel. A failed job is logged and recorded, it does not stop the rest of the batch
+    executor = OrderedExecutor(max_workers=16)
+    executor.submit(i.id, 'Build peering between a and b', build_peering, network_client, i, s)
+    results = executor.run()
+    """
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self.chains = OrderedDict()
+
+    def submit(self, key, description, fn, *args, **kwargs):
+        self.chains.setdefault(key, list()).append((description, fn, args, kwargs))
+
+    def __len__(self):
+        return sum(len(c) for c in self.chains.values())
+
+    @staticmethod
+    def run_job(key, description, fn, args, kwargs):
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        try:
+            fn(*args, **kwargs)
+            logger.info(description)
+            return JobResult(key, description, True, elapsed=time.monotonic() - start)
+        except Exception as e:
+            logger.warning("Unable to {}{}".format(description[0].lower(), description[1:]))
+            logger.error("{}".format(e))
+            return JobResult(key, description, False, error=e, elapsed=time.monotonic() - start)
+
+    def run_chain(self, key, chain):
+        return [self.run_job(key, description, fn, args, kwargs) for description, fn, args, kwargs in chain]
+
+    def run(self):
+        """
+        Runs every submitted job and returns a list of JobResult, the queue is emptied
+        """
+        chains = self.chains
+        self.chains = OrderedDict()
+        if not chains:
+            return list()
+        results = list()
+        workers = max(1, min(self.max_workers, len(chains)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.run_chain, key, chain) for key, chain in chains.items()]
+            for f in futures:
+                results.extend(f.result())
+        return results
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+class FakeArmHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeArm:
+    """
+    In memory stand-in for the ARM REST endpoint with per subscription read and write limits
+    Like ARM, reads (GET) and writes (PUT/PATCH/POST/DELETE) each draw from a token bucket holding up to limit tokens
+    and refilling limit tokens per window. Requests finding the bucket empty get a 429 with Retry-After,
+    every response carries the x-ms-ratelimit-remaining-subscription-* headers
+    arm = FakeArm(read_limit=100, write_limit=20, window=5.0).start()
+    client = FakeArmClient(arm.url)
+    ...
+    arm.stop()
+    """
+    def __init__(self, read_limit=250, write_limit=200, window=10.0, host='127.0.0.1', port=0):
+        self.limits = {'read': read_limit, 'write': write_limit}
+        self.window = window
+        self.resources = dict()
+        self.stats = {'read': 0, 'write': 0, 'throttled': 0}
+        self.lock = threading.Lock()
+        self.tokens = {'read': float(read_limit), 'write': float(write_limit)}
+        self.last = time.monotonic()
+        self.server = FakeArmHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _refill(self):
+        now = time.monotonic()
+        for kind, limit in self.limits.items():
+            self.tokens[kind] = min(float(limit), self.tokens[kind] + (now - self.last) * limit / self.window)
+        self.last = now
+
+    def admit(self, kind):
+        """
+        Returns (allowed, retry_after) for one request of the given kind
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens[kind] < 1.0:
+                self.stats['throttled'] += 1
+                return False, (1.0 - self.tokens[kind]) * self.window / self.limits[kind]
+            self.tokens[kind] -= 1.0
+            self.stats[kind] += 1
+            return True, 0.0
+
+    def remaining(self):
+        with self.lock:
+            self._refill()
+            return {k: int(v) for k, v in self.tokens.items()}
+
+    def handler_class(self):
+        arm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=None, headers=None):
+                data = json.dumps(body).encode('utf-8') if body is not None else b''
+                self.send_response(status)
+                remaining = arm.remaining()
+                self.send_header('x-ms-ratelimit-remaining-subscription-reads', str(remaining['read']))
+                self.send_header('x-ms-ratelimit-remaining-subscription-writes', str(remaining['write']))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def handle_request(self, kind):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                allowed, retry = arm.admit(kind)
+                if not allowed:
+                    self.reply(429, {'error': {'code': 'TooManyRequests', 'message': 'throttled'}},
+                               {'Retry-After': '{:.3f}'.format(retry)})
+                    return
+                path = self.path.split('?')[0]
+                if self.command == 'GET':
+                    if path in arm.resources:
+                        self.reply(200, arm.resources[path])
+                    else:
+                        self.reply(404, {'error': {'code': 'NotFound', 'message': path}})
+                elif self.command == 'DELETE':
+                    existed = arm.resources.pop(path, None) is not None
+                    self.reply(200 if existed else 204)
+                else:
+                    resource = json.loads(body.decode('utf-8')) if body else {}
+                    resource['id'] = path
+                    arm.resources[path] = resource
+                    self.reply(200, resource)
+
+            def do_GET(self):
+                self.handle_request('read')
+
+            def do_PUT(self):
+                self.handle_request('write')
+
+            def do_PATCH(self):
+                self.handle_request('write')
+
+            def do_POST(self):
+                self.handle_request('write')
+
+            def do_DELETE(self):
+                self.handle_request('write')
+
+        return Handler
+
+
+class FakeArmError(Exception):
+    """
+    Carries status_code and response.headers like msrestazure's CloudError
+    """
+    def __init__(self, status_code, headers, message=''):
+        super().__init__('{} {}'.format(status_code, message))
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeArmClient:
+    """
+    Minimal REST client for FakeArm, response headers are passed to hook like a requests response hook
+    """
+    def __init__(self, base_url, hook=None, timeout=10.0):
+        self.base_url = base_url
+        self.hook = hook
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                headers = dict(r.headers)
+                payload = r.read()
+        except urllib.error.HTTPError as e:
+            raise FakeArmError(e.code, dict(e.headers), e.reason)
+        if self.hook:
+            self.hook(SimpleNamespace(status_code=200, headers=headers))
+        return json.loads(payload.decode('utf-8')) if payload else None
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def create_or_update(self, path, body):
+        return self.request('PUT', path, body)
+
+    def delete(self, path):
+        return self.request('DELETE', path)
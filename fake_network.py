@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+
+class FakeNetworkError(Exception):
+    """
+    Raised by injected failures, shaped like an msrest CloudError so throttle.RequestScheduler can read it
+    """
+    def __init__(self, status_code, message, headers=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakePoller:
+    """
+    Stands in for the long running operation poller returned by create_or_update and delete
+    """
+    def __init__(self, value=None):
+        self.value = value
+
+    def result(self, timeout=None):
+        return self.value
+
+    def done(self):
+        return True
+
+    def wait(self, timeout=None):
+        return None
+
+
+class FakePaged:
+    """
+    Iterates like msrest.paging.Paged, advance_page() fetches the page at next_link with get_page(next_link), which
+    returns the page and the next next_link, None after the last page
+    """
+    def __init__(self, get_page):
+        self.get_page = get_page
+        self.next_link = ''
+        self.current_page = list()
+        self.index = 0
+
+    def advance_page(self):
+        if self.next_link is None:
+            raise StopIteration('End of paging')
+        self.index = 0
+        self.current_page, self.next_link = self.get_page(self.next_link)
+        return self.current_page
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.index < len(self.current_page):
+            self.index += 1
+            return self.current_page[self.index - 1]
+        self.advance_page()
+        return self.__next__()
+
+
+class FakeOperations:
+    def __init__(self, client, group):
+        self.client = client
+        self.group = group
+
+    def call(self, method):
+        self.client.call('{}.{}'.format(self.group, method))
+
+
+class FakeVirtualNetworks(FakeOperations):
+    def list_all(self):
+        """
+        Returns a FakePaged of copies of every VNET, like the SDK pager each page is fetched and deserialized while
+        it is iterated
+        """
+        with self.client.lock:
+            ids = list(self.client.vnets)
+
+        def get_page(next_link):
+            start = int(next_link or 0)
+            end = start + self.client.page_size
+            self.call('list_all')
+            with self.client.lock:
+                page = [self.client.export(self.client.vnets[i]) for i in ids[start:end] if i in self.client.vnets]
+            return page, str(end) if end < len(ids) else None
+        return FakePaged(get_page)
+
+    def get(self, resource_group_name, virtual_network_name):
+        self.call('get')
+        with self.client.lock:
+            return self.client.export(self.client.vnet(resource_group_name, virtual_network_name))
+
+
+class FakeVirtualNetworkPeerings(FakeOperations):
+    @contextmanager
+    def writing(self, resource_group_name, virtual_network_name):
+        """
+        Holds the VNET for the duration of a write, like ARM another write to it meanwhile gets a 409
+        """
+        vnet = (resource_group_name.lower(), virtual_network_name.lower())
+        with self.client.lock:
+            if vnet in self.client.writing:
+                self.client.conflicts += 1
+                raise FakeNetworkError(409, 'AnotherOperationInProgress: another operation on VNET {}/{} is in '
+                                            'progress'.format(resource_group_name, virtual_network_name))
+            self.client.writing.add(vnet)
+        try:
+            yield
+        finally:
+            with self.client.lock:
+                self.client.writing.discard(vnet)
+
+    def create_or_update(self, resource_group_name, virtual_network_name, virtual_network_peering_name,
+                         virtual_network_peering_parameters):
+        with self.writing(resource_group_name, virtual_network_name):
+            return self.write_peering(resource_group_name, virtual_network_name, virtual_network_peering_name,
+                                      virtual_network_peering_parameters)
+
+    def write_peering(self, resource_group_name, virtual_network_name, virtual_network_peering_name,
+                      virtual_network_peering_parameters):
+        self.call('create_or_update')
+        remote_id = self.client.remote_id(virtual_network_peering_parameters)
+        with self.client.lock:
+            v = self.client.vnet(resource_group_name, virtual_network_name)
+            peering = self.client.add_peering(v, virtual_network_peering_name, remote_id, 'Initiated')
+            # both sides become Connected once the remote side points back
+            remote = self.client.vnets.get(remote_id)
+            if remote is not None:
+                back = remote.peerings.get(remote.remotes.get(v.id))
+                if back is not None:
+                    back.peering_state = 'Connected'
+                    peering.peering_state = 'Connected'
+                    self.client.touch(remote)
+            self.client.touch(v)
+            return FakePoller(peering)
+
+    def delete(self, resource_group_name, virtual_network_name, virtual_network_peering_name):
+        with self.writing(resource_group_name, virtual_network_name):
+            return self.delete_peering(resource_group_name, virtual_network_name, virtual_network_peering_name)
+
+    def delete_peering(self, resource_group_name, virtual_network_name, virtual_network_peering_name):
+        self.call('delete')
+        with self.client.lock:
+            v = self.client.vnet(resource_group_name, virtual_network_name)
+            gone = self.client.remove_peering(v, virtual_network_peering_name)
+            remote = self.client.vnets.get(gone.remote_virtual_network.id) if gone else None
+            if remote is not None:
+                back = remote.peerings.get(remote.remotes.get(v.id))
+                if back is not None:
+                    back.peering_state = 'Disconnected'
+                    self.client.touch(remote)
+            self.client.touch(v)
+            return FakePoller()
+
+    def list(self, resource_group_name, virtual_network_name):
+        self.call('list')
+        with self.client.lock:
+            return list(self.client.export(self.client.vnet(resource_group_name,
+                                                             virtual_network_name)).virtual_network_peerings)
+
+
+class FakeRouteTables(FakeOperations):
+    def get(self, resource_group_name, route_table_name):
+        self.call('get')
+        with self.client.lock:
+            table = self.client.table(resource_group_name, route_table_name)
+            return SimpleNamespace(name=route_table_name, routes=[SimpleNamespace(**vars(r))
+                                                                  for r in table.values()])
+
+    def create_or_update(self, resource_group_name, route_table_name, parameters):
+        self.call('create_or_update')
+        with self.client.lock:
+            self.client.tables.setdefault((resource_group_name.lower(), route_table_name.lower()), dict())
+            return FakePoller(SimpleNamespace(name=route_table_name))
+
+
+class FakeRoutes(FakeOperations):
+    def list(self, resource_group_name, route_table_name):
+        self.call('list')
+        with self.client.lock:
+            return [SimpleNamespace(**vars(r)) for r in self.client.table(resource_group_name,
+                                                                          route_table_name).values()]
+
+    def create_or_update(self, resource_group_name, route_table_name, route_name, route_parameters):
+        self.call('create_or_update')
+        p = route_parameters if isinstance(route_parameters, dict) else vars(route_parameters)
+        route = SimpleNamespace(name=route_name, address_prefix=p.get('address_prefix'),
+                                next_hop_type=p.get('next_hop_type'),
+                                next_hop_ip_address=p.get('next_hop_ip_address'))
+        with self.client.lock:
+            self.client.table(resource_group_name, route_table_name)[route_name] = route
+            return FakePoller(route)
+
+    def delete(self, resource_group_name, route_table_name, route_name):
+        self.call('delete')
+        with self.client.lock:
+            self.client.table(resource_group_name, route_table_name).pop(route_name, None)
+            return FakePoller()
+
+
+class FakeNetworkManagementClient:
+    """
+    In memory stand-in for the NetworkManagementClient surfaces the poller uses:
+    virtual_networks, virtual_network_peerings, route_tables and routes
+    Every call sleeps latency seconds (plus up to jitter) and fails with probability failure_rate, optionally only
+    for the operations in fail_operations (e.g. {'virtual_network_peerings.create_or_update'}).
+    calls counts the calls per operation, list_all counts one call per page of page_size VNETs.
+    A peering write to a VNET another peering write is still changing fails with 409, counted in conflicts
+    client = FakeNetworkManagementClient(generate_topology(10000), latency=0.02)
+    factory = FakeNetworkFactory(client)
+    """
+    def __init__(self, vnets=(), latency=0.0, jitter=0.0, failure_rate=0.0, fail_operations=None, page_size=100,
+                 seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_operations = set(fail_operations) if fail_operations else None
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.failures = Counter()
+        self.writing = set()
+        self.conflicts = 0
+        self.vnets = dict()
+        self.names = dict()
+        self.tables = dict()
+        self.virtual_networks = FakeVirtualNetworks(self, 'virtual_networks')
+        self.virtual_network_peerings = FakeVirtualNetworkPeerings(self, 'virtual_network_peerings')
+        self.route_tables = FakeRouteTables(self, 'route_tables')
+        self.routes = FakeRoutes(self, 'routes')
+        self.load(vnets)
+
+    def load(self, vnets):
+        for v in vnets:
+            resource_group_name = v.id.split('/')[4]
+            # peerings are kept by name and by remote VNET id, SILB VNETs hold thousands of them
+            stored = SimpleNamespace(id=v.id, name=v.name, location=v.location, tags=dict(v.tags or {}),
+                                     etag=getattr(v, 'etag', None) or 'W/"0"', resource_group_name=resource_group_name,
+                                     peerings=dict(), remotes=dict())
+            for x in v.virtual_network_peerings or []:
+                self.add_peering(stored, x.name, x.remote_virtual_network.id,
+                                 getattr(x, 'peering_state', 'Connected'))
+            self.vnets[v.id] = stored
+            self.names[(resource_group_name.lower(), v.name.lower())] = v.id
+
+    @staticmethod
+    def add_peering(v, name, remote_id, peering_state):
+        FakeNetworkManagementClient.remove_peering(v, name)
+        peering = SimpleNamespace(name=name, peering_state=peering_state,
+                                  remote_virtual_network=SimpleNamespace(id=remote_id))
+        v.peerings[name] = peering
+        v.remotes[remote_id] = name
+        return peering
+
+    @staticmethod
+    def remove_peering(v, name):
+        peering = v.peerings.pop(name, None)
+        if peering is not None and v.remotes.get(peering.remote_virtual_network.id) == name:
+            del v.remotes[peering.remote_virtual_network.id]
+        return peering
+
+    def add_route_table(self, resource_group_name, route_table_name, routes=()):
+        """
+        Seeds a route table, routes are (name, address_prefix, next_hop_ip_address) tuples
+        """
+        table = self.tables.setdefault((resource_group_name.lower(), route_table_name.lower()), dict())
+        for name, address_prefix, next_hop_ip_address in routes:
+            table[name] = SimpleNamespace(name=name, address_prefix=address_prefix, next_hop_type='VirtualAppliance',
+                                          next_hop_ip_address=next_hop_ip_address)
+        return table
+
+    def call(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = (self.failure_rate and (self.fail_operations is None or operation in self.fail_operations) and
+                    self.random.random() < self.failure_rate)
+            if fail:
+                self.failures[operation] += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeNetworkError(500, 'Injected failure of {}'.format(operation))
+
+    @staticmethod
+    def export(v):
+        return SimpleNamespace(id=v.id, name=v.name, location=v.location, tags=dict(v.tags), etag=v.etag,
+                               virtual_network_peerings=[
+                                   SimpleNamespace(name=x.name, peering_state=x.peering_state,
+                                                   remote_virtual_network=SimpleNamespace(
+                                                       id=x.remote_virtual_network.id))
+                                   for x in v.peerings.values()])
+
+    @staticmethod
+    def remote_id(parameters):
+        if isinstance(parameters, dict):
+            return parameters['remote_virtual_network']['id']
+        return parameters.remote_virtual_network.id
+
+    @staticmethod
+    def touch(v):
+        v.etag = 'W/"{}"'.format(int(v.etag.strip('W/"') or 0) + 1)
+
+    def vnet(self, resource_group_name, virtual_network_name):
+        vnet_id = self.names.get((resource_group_name.lower(), virtual_network_name.lower()))
+        if vnet_id is None:
+            raise FakeNetworkError(404, 'VNET {}/{} not found'.format(resource_group_name, virtual_network_name))
+        return self.vnets[vnet_id]
+
+    def table(self, resource_group_name, route_table_name):
+        table = self.tables.get((resource_group_name.lower(), route_table_name.lower()))
+        if table is None:
+            raise FakeNetworkError(404, 'Route table {}/{} not found'.format(resource_group_name, route_table_name))
+        return table
+
+
+class FakeNetworkFactory:
+    """
+    Hands out the same fake client for every subscription, like clients.AzureClientFactory.network
+    With a cache.ResponseCache its get operations are cached
+    """
+    def __init__(self, client, subscription_id='fake', cache=None):
+        self.client = client
+        self.subscription_id = subscription_id
+        self.cache = cache
+        self.cached = cache.wrap(client, ('network', subscription_id)) if cache is not None else client
+
+    def network(self, subscription_id=None):
+        return self.cached
+
+    def scheduler(self, subscription_id=None):
+        return None
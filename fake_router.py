@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import base64
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from restconf import CLI_TRANS, SAVE_CONFIG, VERSION
+
+INVALID = re.compile(r'^\s*(bogus|invalid)\b')
+
+
+class FakeRouter:
+    """
+    In memory stand-in for a CSR1000v's configuration, shared by FakeShell and RestconfStandin
+    Lines matching invalid are rejected like IOS rejects unknown commands
+    """
+    def __init__(self, hostname='Router', username='admin', password='admin', invalid=INVALID):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.invalid = invalid
+        self.running = list()
+        self.saved = list()
+        self.lock = threading.Lock()
+
+    def accepts(self, line):
+        return not self.invalid.match(line)
+
+    def apply(self, line):
+        with self.lock:
+            self.running.append(line)
+            if line.strip().startswith('hostname '):
+                self.hostname = line.split()[1]
+
+    def save(self):
+        with self.lock:
+            self.saved = list(self.running)
+
+
+class FakeShell:
+    """
+    Stands in for the interactive shell channel of a router's SSH session
+    Lines reach the router rtt / 2 after they are sent and their answer takes another rtt / 2, so a line waited for
+    costs one round trip. Tracks exec and configuration modes and answers rejected lines with % Invalid input
+    """
+    def __init__(self, router, rtt=0.0):
+        self.router = router
+        self.rtt = rtt
+        self.mode = ''
+        self.timeout = None
+        self.closed = False
+        self.eof_received = False
+        self.lock = threading.Condition()
+        self.output = [(0.0, '\r\n' + self.prompt())]
+
+    def prompt(self):
+        return '{}{}#'.format(self.router.hostname, '({})'.format(self.mode) if self.mode else '')
+
+    def answer(self, line):
+        command = line.strip()
+        out = line + '\r\n'
+        if not self.mode:
+            if command in ('configure terminal', 'config t', 'conf t'):
+                self.mode = 'config'
+                out += 'Enter configuration commands, one per line.  End with CNTL/Z.\r\n'
+            elif command in ('wr mem', 'write memory'):
+                self.router.save()
+                out += 'Building configuration...\r\n[OK]\r\n'
+            elif command == 'show version':
+                out += 'Cisco IOS XE Software, Version 16.10.01b\r\n'
+            elif command == 'show running-config':
+                out += '\r\n'.join(['Building configuration...', ''] + self.router.running + ['end']) + '\r\n'
+            elif command and not self.router.accepts(command):
+                out += '% Invalid input detected at \'^\' marker.\r\n\r\n'
+        elif command == 'end':
+            self.mode = ''
+        elif not command or command.startswith('!'):
+            pass
+        elif not self.router.accepts(command):
+            out += ' ' * len(self.prompt()) + '^\r\n% Invalid input detected at \'^\' marker.\r\n\r\n'
+        else:
+            self.router.apply(line)
+            if not line.startswith(' ') and command.split()[0] in ('interface', 'router', 'crypto', 'line',
+                                                                      'event', 'vrf', 'call-home'):
+                self.mode = 'config-sub'
+            elif not line.startswith(' '):
+                self.mode = 'config'
+        return out + self.prompt()
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def send(self, data):
+        ready = time.monotonic() + self.rtt
+        with self.lock:
+            for line in data.split('\n')[:-1]:
+                self.output.append((ready, self.answer(line.rstrip('\r'))))
+            self.lock.notify_all()
+        return len(data)
+
+    sendall = send
+
+    def recv(self, size):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.lock:
+            while True:
+                if self.closed:
+                    return b''
+                now = time.monotonic()
+                ready = [o for o in self.output if o[0] <= now]
+                if ready:
+                    self.output = [o for o in self.output if o[0] > now]
+                    return ''.join(o[1] for o in ready).encode('utf-8')
+                wake = min([o[0] for o in self.output] + ([deadline] if deadline else []), default=None)
+                if deadline is not None and now >= deadline:
+                    raise socket.timeout()
+                self.lock.wait(None if wake is None else max(0.0, wake - now))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+
+
+class FakeSSHClient:
+    """
+    Stands in for the paramiko.SSHClient of an ssh_pool.Session whose channel is a FakeShell
+    """
+    def __init__(self, shell):
+        self.shell = shell
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return not self.shell.closed
+
+    def close(self):
+        self.shell.close()
+
+
+class StandinHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class RestconfStandin:
+    """
+    Local stand-in for the RESTCONF endpoint of IOS-XE, answering on http://host:port/restconf
+    Implements the config-ios-cli-trans and save-config RPCs and a read of the version, behind basic auth.
+    Every request takes rtt seconds, one round trip
+    standin = RestconfStandin(FakeRouter()).start()
+    transport = RestconfTransport('127.0.0.1', 'admin', 'admin', port=standin.port, scheme='http')
+    """
+    def __init__(self, router, rtt=0.0, host='127.0.0.1', port=0):
+        self.router = router
+        self.rtt = rtt
+        self.stats = {'requests': 0, 'transactions': 0, 'rejected': 0}
+        self.server = StandinHTTPServer((host, port), self.handler_class())
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler_class(self):
+        standin = self
+        credentials = 'Basic ' + base64.b64encode('{}:{}'.format(self.router.username,
+                                                                 self.router.password).encode()).decode()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are separate writes, Nagle would hold the body back for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=None):
+                data = json.dumps(body).encode('utf-8') if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/yang-data+json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def error(self, status, message):
+                self.reply(status, {'errors': {'error': [{'error-type': 'application', 'error-tag':
+                                                          'operation-failed', 'error-message': message}]}})
+
+            def admit(self):
+                standin.stats['requests'] += 1
+                time.sleep(standin.rtt)
+                if self.headers.get('Authorization') != credentials:
+                    self.error(401, 'access denied')
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self.admit():
+                    return
+                if self.path == '/restconf/data/{}'.format(VERSION):
+                    self.reply(200, {'Cisco-IOS-XE-native:version': '16.10'})
+                else:
+                    self.error(404, 'uri keypath not found')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length).decode('utf-8') or '{}') if length else {}
+                if not self.admit():
+                    return
+                if self.path == '/restconf/operations/{}'.format(CLI_TRANS):
+                    lines = (body.get('Cisco-IOS-XE-cli-rpc:input') or {}).get('clis', '').split('\n')
+                    rejected = [line for line in lines if not standin.router.accepts(line)]
+                    if rejected:
+                        standin.stats['rejected'] += 1
+                        self.error(400, 'inconsistent value: Device refused one or more commands, '
+                                        'line {!r}'.format(rejected[0].strip()))
+                        return
+                    for line in lines:
+                        standin.router.apply(line)
+                    standin.stats['transactions'] += 1
+                    self.reply(200, {'Cisco-IOS-XE-cli-rpc:output': {'result': 'OK'}})
+                elif self.path == '/restconf/operations/{}'.format(SAVE_CONFIG):
+                    standin.router.save()
+                    self.reply(200, {'cisco-ia:output': {'result': 'Save running-config successful'}})
+                else:
+                    self.error(404, 'uri keypath not found')
+        return Handler
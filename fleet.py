@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+
+class DeviceResult:
+    """
+    The outcome of one router's job, status is 'ok', 'failed', 'error' or 'timeout'
+    failed_lines are the cli_engine.LineResults the router rejected, diff_size the lines a diff push sent
+    ready_seconds the time the router took to accept logins when the job waited for it, license_seconds the time from
+    the smart license register command to the router reporting it registered
+    """
+    def __init__(self, host, status='timeout', attempts=0, seconds=0.0, error=None, failed_lines=(), diff_size=None,
+                 ready_seconds=None, license_seconds=None):
+        self.host = host
+        self.status = status
+        self.attempts = attempts
+        self.seconds = seconds
+        self.error = error
+        self.failed_lines = list(failed_lines)
+        self.diff_size = diff_size
+        self.ready_seconds = ready_seconds
+        self.license_seconds = license_seconds
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+
+class Fleet:
+    """
+    Runs a job on many routers at once, at most max_workers routers at a time
+    A job returning False or raising is retried up to retries times after retry_delay seconds with jitter.
+    A router still busy timeout seconds after its job started is reported as timed out and no longer waited for,
+    router.abort() closes its sessions so the job's thread fails instead of holding a pooled session
+    fleet = Fleet(max_workers=32)
+    results = fleet.configure([(router, [baseline_lines, dmvpn_lines]), ...])
+    print(format_results(results))
+    """
+    def __init__(self, max_workers=32, timeout=900, retries=1, retry_delay=5.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(max_workers=settings.fleet_max_workers, timeout=settings.fleet_device_timeout,
+                   retries=settings.fleet_retries)
+
+    def attempt(self, index, router, fn, payload, started):
+        logger = logging.getLogger(__name__)
+        started[index] = time.monotonic()
+        deadline = started[index] + self.timeout
+        result = DeviceResult(router.public_ip)
+        while True:
+            result.attempts += 1
+            try:
+                if fn(router, payload):
+                    result.status = 'ok'
+                    result.error = None
+                else:
+                    result.status = 'failed'
+                    result.error = 'job returned False'
+            except Exception as e:
+                logger.warning("Unable to run job on router {}".format(router.public_ip))
+                logger.error("{}".format(e))
+                result.status = 'error'
+                result.error = str(e)
+            result.failed_lines = [r for r in getattr(router, 'config_results', None) or () if not r.ok]
+            result.diff_size = getattr(router, 'diff_size', None)
+            readiness = getattr(router, 'readiness', None)
+            if readiness is not None and readiness.ready:
+                result.ready_seconds = readiness.seconds
+            registration = getattr(router, 'registration', None)
+            if registration is not None:
+                result.license_seconds = registration.latency
+            delay = random.uniform(0.5, 1.5) * self.retry_delay
+            if result.ok or result.attempts > self.retries or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+        result.seconds = time.monotonic() - started[index]
+        return result
+
+    def abort(self, router):
+        logger = logging.getLogger(__name__)
+        abort = getattr(router, 'abort', None)
+        if abort is None:
+            return
+        try:
+            abort()
+        except Exception as e:
+            logger.warning("Unable to close the sessions of router {}".format(router.public_ip))
+            logger.error("{}".format(e))
+
+    def run(self, jobs, fn):
+        """
+        Calls fn(router, payload) for every (router, payload) of jobs, returns a DeviceResult per router in order
+        """
+        logger = logging.getLogger(__name__)
+        results = [None] * len(jobs)
+        started = dict()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = dict((executor.submit(self.attempt, index, router, fn, payload, started), index)
+                       for index, (router, payload) in enumerate(jobs))
+        while pending:
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if index in started and now - started[index] > self.timeout:
+                    host = jobs[index][0].public_ip
+                    logger.warning("Router {} timed out after {}s".format(host, self.timeout))
+                    results[index] = DeviceResult(host, 'timeout', seconds=now - started[index],
+                                                  error='timed out after {}s'.format(self.timeout))
+                    del pending[future]
+                    self.abort(jobs[index][0])
+        executor.shutdown(wait=False)
+        return results
+
+    def configure(self, pushes, diff=False):
+        """
+        Pushes every configuration of pushes, a list of (router, [lines, lines, ...]), in order on each router
+        With diff only the lines missing from each router's running configuration are pushed
+        """
+        return self.run(pushes, partial(configure_all, diff=diff))
+
+
+def configure_all(router, configs, diff=False):
+    if diff:
+        router.diff_size = 0
+        sizes = list()
+        for lines in configs:
+            if not router.configure_router(lines, diff=True):
+                return False
+            sizes.append(router.diff_size)
+        router.diff_size = sum(sizes)
+        return True
+    return all(router.configure_router(lines) for lines in configs)
+
+
+def format_results(results):
+    """
+    Returns the results as a text table, one router per line
+    """
+    lines = ['{:<16} {:<8} {:>8} {:>9} {:>8} {:>8} {:>8}  {}'.format('router', 'status', 'attempts', 'seconds', 'ready',
+                                                                     'license', 'changed', 'error')]
+    for r in results:
+        error = r.error or ''
+        if r.failed_lines:
+            error = '{} rejected lines, first {!r}: {}'.format(len(r.failed_lines), r.failed_lines[0].line,
+                                                               r.failed_lines[0].error)
+        changed = '-' if r.diff_size is None else r.diff_size
+        ready = '-' if r.ready_seconds is None else '{:.1f}'.format(r.ready_seconds)
+        license_seconds = '-' if r.license_seconds is None else '{:.1f}'.format(r.license_seconds)
+        lines.append('{:<16} {:<8} {:>8} {:>9.1f} {:>8} {:>8} {:>8}  {}'.format(r.host, r.status, r.attempts, r.seconds,
+                                                                                ready, license_seconds, changed, error))
+    ok = len([r for r in results if r.ok])
+    lines.append('{} of {} routers ok'.format(ok, len(results)))
+    return '\n'.join(lines)
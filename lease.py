@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import json
+import logging
+import math
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from azure.core.exceptions import HttpResponseError, ResourceExistsError
+    from azure.storage.blob import BlobLeaseClient, BlobServiceClient
+except ImportError:
+    BlobServiceClient = None
+
+MEMBERS = 'members/'
+SHARDS = 'shards/'
+
+
+class FileLeaseBackend:
+    """
+    Leases kept as small JSON files in a directory shared by the replicas, for tests and single host setups
+    Every read-modify-write holds an exclusive flock on the directory's lock file
+    """
+    def __init__(self, path):
+        if fcntl is None:
+            raise ImportError('the file lease backend needs fcntl')
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock_path = os.path.join(path, '.lock')
+
+    def file(self, name):
+        return os.path.join(self.path, name.replace('/', '__') + '.lease')
+
+    def locked(self, fn, *args):
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return fn(*args)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read(self, name):
+        try:
+            with open(self.file(name)) as f:
+                lease = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if lease.get('expires', 0) < time.time():
+            return None
+        return lease
+
+    def _acquire(self, name, holder, duration):
+        lease = self.read(name)
+        if lease is not None and lease.get('holder') != holder:
+            return False
+        temp = self.file(name) + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'holder': holder, 'expires': time.time() + duration}, f)
+        os.replace(temp, self.file(name))
+        return True
+
+    def _release(self, name, holder):
+        lease = self.read(name)
+        if lease is not None and lease.get('holder') == holder:
+            os.remove(self.file(name))
+
+    def _leases(self, prefix):
+        held = dict()
+        start = prefix.replace('/', '__')
+        for f in os.listdir(self.path):
+            if f.startswith(start) and f.endswith('.lease'):
+                name = f[:-len('.lease')].replace('__', '/')
+                lease = self.read(name)
+                if lease is not None:
+                    held[name] = lease.get('holder')
+        return held
+
+    def acquire(self, name, holder, duration):
+        """
+        Takes or renews a lease, returns False when another holder has it
+        """
+        return self.locked(self._acquire, name, holder, duration)
+
+    def release(self, name, holder):
+        self.locked(self._release, name, holder)
+
+    def leases(self, prefix=''):
+        """
+        Returns a dictionary of lease name -> holder for the unexpired leases starting with prefix
+        """
+        return self.locked(self._leases, prefix)
+
+
+class BlobLeaseBackend:
+    """
+    Leases on empty blobs in an Azure Storage container, for replicas on different hosts
+    Requires the optional azure-storage-blob package. Blob leases last 15 to 60 seconds, the holder name is kept
+    in the blob metadata and the lease id is derived from it so a replica can renew its own leases after a restart
+    """
+    def __init__(self, connection_string, container='tvpc-poller-leases'):
+        if BlobServiceClient is None:
+            raise ImportError('azure-storage-blob is not installed')
+        self.container = BlobServiceClient.from_connection_string(connection_string).get_container_client(container)
+        try:
+            self.container.create_container()
+        except ResourceExistsError:
+            pass
+
+    @staticmethod
+    def lease_id(holder):
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, holder))
+
+    def acquire(self, name, holder, duration):
+        blob = self.container.get_blob_client(name)
+        try:
+            blob.upload_blob(b'', overwrite=False)
+        except ResourceExistsError:
+            pass
+        lease = BlobLeaseClient(blob, lease_id=self.lease_id(holder))
+        try:
+            try:
+                lease.renew()
+            except HttpResponseError:
+                lease.acquire(lease_duration=int(min(60, max(15, duration))))
+            blob.set_blob_metadata({'holder': holder}, lease=lease)
+            return True
+        except HttpResponseError:
+            return False
+
+    def release(self, name, holder):
+        try:
+            BlobLeaseClient(self.container.get_blob_client(name), lease_id=self.lease_id(holder)).release()
+        except HttpResponseError:
+            pass
+
+    def leases(self, prefix=''):
+        held = dict()
+        for b in self.container.list_blobs(name_starts_with=prefix, include=['metadata']):
+            if b.lease.state == 'leased':
+                held[b.name] = (b.metadata or {}).get('holder')
+        return held
+
+
+def shard_of(partition_key, shards):
+    """
+    Returns the shard of a (cluster, location) key, stable across processes and hosts
+    """
+    if not partition_key or shards <= 1:
+        return 0
+    return zlib.crc32('{}|{}'.format(*partition_key).encode('utf-8')) % shards
+
+
+class LeaseKeeper:
+    """
+    Renews leases from a background thread every renew_interval seconds
+    A lease is trusted until duration minus renew_interval after the renewal started, so a replica stops writing
+    before another one can take over. wait() returns early when ownership changes, for a fast takeover
+    replica is the stable name of the replica that survives restarts, it defaults to the holder name
+    """
+    def __init__(self, backend, holder, duration=15, renew_interval=None, replica=None):
+        self.backend = backend
+        self.holder = holder
+        self.replica = replica or holder
+        self.duration = duration
+        self.renew_interval = renew_interval or duration / 3.0
+        self.valid_until = 0.0
+        self.generation = 0
+        self.changed = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def step(self):
+        raise NotImplementedError
+
+    def run(self):
+        logger = logging.getLogger(__name__)
+        while not self.stopped.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.warning("Unable to renew leases of {}".format(self.holder))
+                logger.error("{}".format(e))
+            self.stopped.wait(self.renew_interval)
+
+    def start(self):
+        self.step()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self.release()
+
+    def release(self):
+        pass
+
+    def renewed(self, started):
+        self.valid_until = started + self.duration - self.renew_interval
+
+    def bump(self):
+        self.generation += 1
+        self.changed.set()
+
+    def wait(self, timeout):
+        """
+        Sleeps up to timeout seconds, returns True when ownership changed in the meantime
+        """
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+
+class LeaderElector(LeaseKeeper):
+    """
+    Active/standby replicas: the replica holding the leader lease reconciles, the others wait to take over
+    elector = LeaderElector(FileLeaseBackend('./leases'), 'replica-1').start()
+    if elector.is_active(): ...
+    """
+    def __init__(self, backend, holder, duration=15, renew_interval=None, name='leader', replica=None):
+        LeaseKeeper.__init__(self, backend, holder, duration, renew_interval, replica)
+        self.name = name
+        self.leader = False
+
+    def step(self):
+        logger = logging.getLogger(__name__)
+        started = time.monotonic()
+        try:
+            leader = self.backend.acquire(self.name, self.holder, self.duration)
+        except Exception as e:
+            logger.warning("Unable to renew lease {} for {}".format(self.name, self.holder))
+            logger.error("{}".format(e))
+            leader = False
+        if leader:
+            self.renewed(started)
+        if leader != self.leader:
+            self.leader = leader
+            logger.info("{} is {}".format(self.holder, 'now the leader' if leader else 'standing by'))
+            self.bump()
+
+    def is_active(self):
+        return self.leader and time.monotonic() < self.valid_until
+
+    def owns(self, partition_key):
+        return self.is_active()
+
+    def release(self):
+        if self.leader:
+            self.backend.release(self.name, self.holder)
+            self.leader = False
+
+
+class ShardLeases(LeaseKeeper):
+    """
+    Replicas split the (cluster, location) keys between them, each shard is a lease
+    Every replica holds a membership lease. With n live members each one takes up to ceil(shards / n) shards,
+    so shards move to new replicas and back from failed ones within one lease duration. Shards are preferred by
+    rendezvous hashing, which keeps the assignment stable as replicas come and go
+    leases = ShardLeases(FileLeaseBackend('./leases'), 'replica-1', shards=8).start()
+    if leases.owns((cluster, location)): ...
+    """
+    def __init__(self, backend, holder, shards, duration=15, renew_interval=None, replica=None):
+        LeaseKeeper.__init__(self, backend, holder, duration, renew_interval, replica)
+        self.shards = shards
+        self.owned = frozenset()
+
+    def preference(self):
+        return sorted(range(self.shards),
+                      key=lambda s: zlib.crc32('{}|{}'.format(self.holder, s).encode('utf-8')), reverse=True)
+
+    def step(self):
+        logger = logging.getLogger(__name__)
+        started = time.monotonic()
+        if not self.backend.acquire(MEMBERS + self.holder, self.holder, self.duration):
+            return
+        members = max(1, len(self.backend.leases(MEMBERS)))
+        fair = int(math.ceil(self.shards / float(members)))
+        held = self.backend.leases(SHARDS)
+        preference = self.preference()
+        owned = set(s for s in self.owned if self.backend.acquire(SHARDS + str(s), self.holder, self.duration))
+        # hand back the least preferred shards above the fair share
+        for s in reversed(preference):
+            if len(owned) <= fair:
+                break
+            if s in owned:
+                self.backend.release(SHARDS + str(s), self.holder)
+                owned.discard(s)
+        for s in preference:
+            if len(owned) >= fair:
+                break
+            if s not in owned and held.get(SHARDS + str(s)) in (None, self.holder):
+                if self.backend.acquire(SHARDS + str(s), self.holder, self.duration):
+                    owned.add(s)
+        self.renewed(started)
+        if owned != self.owned:
+            logger.info("{} owns shards {} of {} with {} replicas".format(self.holder, sorted(owned), self.shards,
+                                                                          members))
+            self.owned = frozenset(owned)
+            self.bump()
+
+    def is_active(self):
+        return bool(self.owned) and time.monotonic() < self.valid_until
+
+    def owns(self, partition_key):
+        return self.is_active() and shard_of(partition_key, self.shards) in self.owned
+
+    def release(self):
+        for s in self.owned:
+            self.backend.release(SHARDS + str(s), self.holder)
+        self.backend.release(MEMBERS + self.holder, self.holder)
+        self.owned = frozenset()
+
+
+def replica_path(path, replica):
+    """
+    Returns path with the replica's name before the extension, 'snapshot.db' -> 'snapshot.host1.db'
+    """
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, re.sub(r'[^\w.-]', '_', replica), ext)
+
+
+def make_coordinator(settings):
+    """
+    Returns the LeaderElector or ShardLeases selected by the poller_lease_* settings, None for a single poller
+    """
+    if not settings.poller_lease_backend:
+        return None
+    if settings.poller_lease_backend == 'blob':
+        backend = BlobLeaseBackend(settings.poller_lease_connection_string, settings.poller_lease_container)
+    else:
+        backend = FileLeaseBackend(settings.poller_lease_path)
+    # the replica name stays the same across restarts, so a restarted replica warm starts from its snapshot
+    # without a replica id the process id keeps the leases of two pollers on one host apart
+    replica = settings.poller_replica_id or socket.gethostname()
+    holder = settings.poller_replica_id or '{}-{}'.format(replica, os.getpid())
+    if settings.poller_lease_shards:
+        return ShardLeases(backend, holder, settings.poller_lease_shards, settings.poller_lease_duration,
+                           replica=replica)
+    return LeaderElector(backend, holder, settings.poller_lease_duration, replica=replica)
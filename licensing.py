@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import heapq
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# the router command whose output parse_license_status reads, show license summary works as well
+STATUS_COMMAND = 'show license status'
+SECTION = re.compile(r'^(\S[^:]*):\s*$')
+FIELD = re.compile(r'^\s+([^:]+):\s*(.*?)\s*$')
+
+
+class LicenseStatus:
+    """
+    The smart licensing state of a router parsed from show license status or show license summary
+    registration and authorization are the Status values of their sections, e.g. 'REGISTERED' and 'AUTHORIZED'
+    status = parse_license_status(output)
+    status.registered, status.authorized, status.pending, status.failed, status.reason
+    """
+    def __init__(self, enabled=False, registration=None, authorization=None, last_attempt=None, reason=None):
+        self.enabled = enabled
+        self.registration = registration
+        self.authorization = authorization
+        self.last_attempt = last_attempt
+        self.reason = reason
+
+    @property
+    def registered(self):
+        return self.enabled and (self.registration or '').startswith('REGISTERED')
+
+    @property
+    def authorized(self):
+        return self.enabled and (self.authorization or '').startswith('AUTHORIZED')
+
+    @property
+    def pending(self):
+        return not self.registered and 'REGISTERING' in (self.registration or '')
+
+    @property
+    def failed(self):
+        # a registration sent again still shows the FAILED last attempt until it finishes
+        if self.registered or self.pending:
+            return False
+        return 'FAIL' in (self.registration or '') or (self.last_attempt or '').startswith('FAILED')
+
+    @property
+    def state(self):
+        if not self.enabled:
+            return 'disabled'
+        for state in ('failed', 'authorized', 'registered', 'pending'):
+            if getattr(self, state):
+                return state
+        return 'unregistered'
+
+
+def parse_license_status(output):
+    """
+    Returns the LicenseStatus of show license status or show license summary output
+    """
+    status = LicenseStatus()
+    section = None
+    for line in output.splitlines():
+        line = line.rstrip()
+        if line.strip().startswith('Smart Licensing is'):
+            status.enabled = line.strip().upper().endswith('ENABLED')
+            continue
+        m = SECTION.match(line)
+        if m:
+            section = m.group(1).strip().lower()
+            continue
+        m = FIELD.match(line)
+        if not m:
+            continue
+        key, value = m.group(1).strip().lower(), m.group(2)
+        if key == 'status' and section == 'registration':
+            status.registration = value.upper()
+        elif key == 'status' and section == 'license authorization':
+            status.authorization = value.upper()
+        elif key == 'last registration attempt':
+            status.last_attempt = value.upper()
+        elif key == 'failure reason' and not status.reason:
+            status.reason = value
+    if status.failed and not status.reason:
+        status.reason = status.registration or status.last_attempt
+    return status
+
+
+class Registration:
+    """
+    Registers one router's smart license step by step, configure -> register -> wait -> enable -> done or failed
+    router needs configure_router(lines), run_command(command) and license_status(). States without lines or commands
+    are skipped, Registration(router) only waits for a registration in progress and fails at once otherwise.
+    While waiting the status is polled every poll_initial seconds, growing by poll_factor up to poll_max while nothing
+    changes and starting again at poll_initial when the registration is in progress. A failed registration is sent
+    again up to retries times. step() runs one state and returns the seconds until the next step is due, None when
+    done, so many registrations can share a few threads, see run_registrations
+    registration = Registration(router, configure_lines, ['license smart register idtoken ...'], enable_lines)
+    registration.run()
+    registration.state, registration.status.reason, registration.latency
+    """
+    def __init__(self, router, configure_lines=None, register_commands=None, enable_lines=None, timeout=300,
+                 poll_initial=2.0, poll_max=30.0, poll_factor=1.5, retries=1):
+        self.router = router
+        self.host = router.public_ip
+        self.configure_lines = configure_lines
+        self.register_commands = register_commands
+        self.enable_lines = enable_lines
+        self.timeout = timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.retries = retries
+        self.state = 'configure'
+        self.status = None
+        self.error = None
+        self.attempts = 0
+        self.polls = 0
+        self.interval = poll_initial
+        self.started = None
+        self.registering_since = None
+        # seconds from the register command to the router reporting REGISTERED, and for the whole registration
+        self.latency = None
+        self.seconds = None
+
+    @classmethod
+    def from_settings(cls, router, settings, configure_lines=None, register_commands=None, enable_lines=None):
+        return cls(router, configure_lines, register_commands, enable_lines, timeout=settings.license_timeout,
+                   poll_initial=settings.license_poll_initial, poll_max=settings.license_poll_max,
+                   retries=settings.license_retries)
+
+    @property
+    def done(self):
+        return self.state in ('done', 'failed')
+
+    @property
+    def ok(self):
+        return self.state == 'done'
+
+    def finish(self, state, error=None):
+        logger = logging.getLogger(__name__)
+        self.state = state
+        self.error = error
+        self.seconds = time.monotonic() - self.started
+        if error:
+            logger.warning("Unable to register smart license of router {}".format(self.host))
+            logger.error("{}".format(error))
+        else:
+            logger.info("Router {} smart licensing registered in {:.1f}s".format(self.host, self.seconds))
+
+    def step(self):
+        """
+        Runs the current state once, returns the seconds to wait before the next step or None when done
+        """
+        if self.started is None:
+            self.started = time.monotonic()
+        try:
+            return getattr(self, 'step_' + self.state)()
+        except Exception as e:
+            self.finish('failed', str(e))
+            return None
+
+    def step_configure(self):
+        if self.configure_lines and not self.router.configure_router(self.configure_lines):
+            self.finish('failed', 'smart licensing configuration rejected')
+            return None
+        self.state = 'register'
+        return 0
+
+    def step_register(self):
+        self.attempts += 1
+        for command in self.register_commands or ():
+            self.router.run_command(command)
+        self.registering_since = time.monotonic()
+        self.interval = self.poll_initial
+        self.state = 'wait'
+        return self.interval if self.register_commands else 0
+
+    def step_wait(self):
+        logger = logging.getLogger(__name__)
+        previous = self.status
+        self.status = self.router.license_status()
+        self.polls += 1
+        now = time.monotonic()
+        if self.status.registered:
+            self.latency = now - self.registering_since
+            self.state = 'enable'
+            return 0
+        if not self.register_commands and not self.status.pending:
+            # nothing was sent to register it, only a registration in progress is worth waiting for
+            self.finish('failed', self.status.reason or 'smart licensing {}'.format(self.status.state))
+            return None
+        if self.status.failed:
+            if self.attempts <= self.retries:
+                logger.warning("Router {} registration failed, {}, registering again".format(self.host,
+                                                                                          self.status.reason))
+                self.state = 'register'
+                return self.interval
+            self.finish('failed', self.status.reason or 'registration failed')
+            return None
+        if now - self.registering_since >= self.timeout:
+            self.finish('failed', 'not registered within {}s, {}'.format(self.timeout, self.status.state))
+            return None
+        if self.status.pending and (previous is None or not previous.pending):
+            self.interval = self.poll_initial
+        else:
+            self.interval = min(self.poll_max, self.interval * self.poll_factor)
+        return min(self.interval, max(0.0, self.registering_since + self.timeout - now))
+
+    def step_enable(self):
+        if self.enable_lines and not self.router.configure_router(self.enable_lines):
+            self.finish('failed', 'license boot level configuration rejected')
+            return None
+        self.finish('done')
+        return None
+
+    def run(self):
+        """
+        Steps until done, returns True when the router is registered
+        """
+        while True:
+            delay = self.step()
+            if delay is None:
+                return self.ok
+            time.sleep(delay)
+
+
+def run_registrations(registrations, max_workers=32):
+    """
+    Steps many registrations at once, at most max_workers steps run at the same time and waiting takes no thread
+    Returns the registrations in order
+    """
+    due = [(0.0, index) for index in range(len(registrations))]
+    running = dict()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while due or running:
+            now = time.monotonic()
+            while due and due[0][0] <= now:
+                _, index = heapq.heappop(due)
+                running[executor.submit(registrations[index].step)] = index
+            timeout = max(0.0, due[0][0] - now) if due else None
+            if not running:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                delay = future.result()
+                if delay is not None:
+                    heapq.heappush(due, (time.monotonic() + delay, index))
+    return registrations
+
+
+def register_all(routers, max_workers=32):
+    """
+    Registers the smart licenses of many routers at once, returns a Registration per router in order
+    The outcome is also kept in router.registration, routers whose license settings fail are left out
+    """
+    registrations = list()
+    for router in routers:
+        router.registration = router.license_registration()
+        if router.registration:
+            registrations.append(router.registration)
+    return run_registrations(registrations, max_workers)
+
+
+def format_registrations(registrations):
+    """
+    Returns the registrations as a text table, one router per line with its registration latency
+    """
+    lines = ['{:<16} {:<8} {:>8} {:>8} {:>6} {:<13}  {}'.format('router', 'state', 'latency', 'seconds', 'polls',
+                                                                'license', 'error')]
+    for r in registrations:
+        latency = '-' if r.latency is None else '{:.1f}'.format(r.latency)
+        seconds = '-' if r.seconds is None else '{:.1f}'.format(r.seconds)
+        lines.append('{:<16} {:<8} {:>8} {:>8} {:>6} {:<13}  {}'.format(r.host, r.state, latency, seconds, r.polls,
+                                                                        r.status.state if r.status else '-',
+                                                                        r.error or ''))
+    ok = len([r for r in registrations if r.ok])
+    lines.append('{} of {} routers registered'.format(ok, len(registrations)))
+    return '\n'.join(lines)
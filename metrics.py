@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from a fast ARM read up to a slow peering build
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# the phase of the apply stage each planned operation is counted in
+OPERATION_PHASES = {'create_peering': 'create', 'delete_peering': 'delete', 'add_udr': 'route', 'remove_udr': 'route',
+                    'verify_udr': 'route'}
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, escape(v)) for k, v in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A named family of samples, one per combination of label values
+    """
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.samples = dict()
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labels)
+
+    def header(self):
+        return ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} {}'.format(self.name, self.kind)]
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for values, value in sorted(self.samples.items()):
+                lines.append('{}{} {}'.format(self.name, format_labels(self.labels, values), format_value(value)))
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return [{'labels': dict(zip(self.labels, values)), 'value': value}
+                    for values, value in sorted(self.samples.items())]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.samples[key] = value
+
+
+class Histogram(Metric):
+    """
+    Cumulative buckets, sum and count per label combination like a Prometheus histogram
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][n] += 1
+                    break
+            sample['sum'] += value
+            sample['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for values, sample in sorted(self.samples.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, sample['buckets']):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        self.name, format_labels(self.labels, values, [('le', format_value(bound))]), cumulative))
+                labels = format_labels(self.labels, values)
+                lines.append('{}_sum{} {}'.format(self.name, labels, format_value(sample['sum'])))
+                lines.append('{}_count{} {}'.format(self.name, labels, sample['count']))
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return [{'labels': dict(zip(self.labels, values)), 'count': sample['count'],
+                     'sum': round(sample['sum'], 6)}
+                    for values, sample in sorted(self.samples.items())]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = list()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format
+        """
+        lines = list()
+        for m in self.metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return dict((m.name, m.snapshot()) for m in self.metrics)
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """
+    Serves a registry on /metrics from a background thread, on the loopback interface unless host is given
+    server = MetricsServer(registry, port=9110).start()
+    """
+    def __init__(self, registry, port=9110, host='127.0.0.1'):
+        self.registry = registry
+        self.server = MetricsHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    def handler_class(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                data = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PollerMetrics:
+    """
+    The poller's metrics
+    Phase timings of every cycle (list, plan, apply, and create, delete and route within apply), per operation
+    timings (create_peering, delete_peering, add_udr, remove_udr, verify_udr), ARM calls by operation with latency,
+    throttle and error counters, drift counts, cached get results and the size of the tagged topology and of the
+    pending work
+    metrics = PollerMetrics()
+    factory = AzureClientFactory(throttle_settings=settings, request_observer=metrics.observe_request)
+    """
+    def __init__(self, registry=None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.cycles = r.counter('azure_poller_cycles_total', 'Poller cycles by result', ('result',))
+        self.phase_seconds = r.histogram('azure_poller_phase_seconds', 'Time spent in each phase of a cycle',
+                                         ('phase',))
+        self.last_cycle_seconds = r.gauge('azure_poller_last_cycle_seconds', 'Duration of the last cycle')
+        self.operation_seconds = r.histogram('azure_poller_operation_seconds',
+                                             'Time to apply one planned operation', ('operation',))
+        self.operations = r.counter('azure_poller_operations_total', 'Planned operations applied by result',
+                                    ('operation', 'result'))
+        self.jobs_failed = r.gauge('azure_poller_failed_jobs', 'Participant jobs that failed in the last cycle')
+        self.arm_requests = r.counter('azure_arm_requests_total', 'ARM calls by operation and status',
+                                      ('kind', 'operation', 'status'))
+        self.arm_seconds = r.histogram('azure_arm_request_seconds', 'ARM call latency by operation',
+                                       ('operation',))
+        self.arm_throttled = r.counter('azure_arm_throttled_total', 'ARM calls answered with 429', ('kind',))
+        self.arm_errors = r.counter('azure_arm_errors_total', 'ARM calls failed with an error other than 429',
+                                    ('operation',))
+        self.inventory = r.gauge('azure_poller_vnets', 'VNETs seen in the last cycle', ('type',))
+        self.pending = r.gauge('azure_poller_pending', 'Work planned in the last cycle', ('operation',))
+        self.drift = r.gauge('azure_poller_drift', 'Drift found in the last cycle', ('type',))
+        self.arm_cache = r.counter('azure_arm_cache_total', 'ARM get calls answered by the cache (hit, coalesced) '
+                                   'or by Azure (miss)', ('operation', 'result'))
+        self.applied = dict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a phase of the cycle. The apply phase also records the create, delete and route phases, the time its
+        operations of each kind took summed over the participants applied in parallel
+        """
+        if name != 'apply':
+            with self.phase_seconds.time(phase=name):
+                yield
+            return
+        with self.lock:
+            self.applied = dict()
+        try:
+            with self.phase_seconds.time(phase=name):
+                yield
+        finally:
+            with self.lock:
+                applied, self.applied = self.applied, dict()
+            for phase, seconds in sorted(applied.items()):
+                self.phase_seconds.observe(seconds, phase=phase)
+
+    @contextmanager
+    def operation(self, name):
+        start = time.monotonic()
+        result = 'error'
+        try:
+            yield
+            result = 'ok'
+        finally:
+            seconds = time.monotonic() - start
+            self.operation_seconds.observe(seconds, operation=name)
+            self.operations.inc(operation=name, result=result)
+            phase = OPERATION_PHASES.get(name, name)
+            with self.lock:
+                self.applied[phase] = self.applied.get(phase, 0.0) + seconds
+
+    def observe_request(self, kind, operation, seconds, status):
+        """
+        Request observer for throttle.RequestScheduler, called once per attempt
+        status is 'ok' or the HTTP status of the error, 'error' when there was none
+        """
+        self.arm_requests.inc(kind=kind, operation=operation, status=status)
+        self.arm_seconds.observe(seconds, operation=operation)
+        if status == 429:
+            self.arm_throttled.inc(kind=kind)
+        elif status != 'ok':
+            self.arm_errors.inc(operation=operation)
+
+    def observe_cache(self, operation, result):
+        """
+        Observer for cache.ResponseCache
+        """
+        self.arm_cache.inc(operation=operation, result=result)
+
+    def observe_plan(self, reconcile_plan):
+        for name, count in reconcile_plan.inventory.items():
+            self.inventory.set(count, type=name)
+        self.pending.set(len(reconcile_plan.peerings_to_create), operation='create_peering')
+        self.pending.set(len(reconcile_plan.peerings_to_delete), operation='delete_peering')
+        self.pending.set(len(reconcile_plan.udrs_to_add), operation='add_udr')
+        self.pending.set(len(reconcile_plan.udrs_to_remove), operation='remove_udr')
+        self.pending.set(len(reconcile_plan.udrs_to_verify), operation='verify_udr')
+        self.pending.set(len(reconcile_plan.deferred), operation='deferred')
+        for name, count in reconcile_plan.drift.items():
+            self.drift.set(count, type=name)
+
+    def observe_routes(self, routes):
+        self.drift.set(routes.stats['repaired'], type='stale_route')
+
+    def end_cycle(self, seconds, ok=True, failed_jobs=0):
+        self.cycles.inc(result='ok' if ok else 'error')
+        self.last_cycle_seconds.set(round(seconds, 6))
+        self.jobs_failed.set(failed_jobs)
+
+    def dump(self, path, **fields):
+        """
+        Appends the current value of every metric as one JSON line, with fields such as the cycle number
+        """
+        record = dict(fields)
+        record['time'] = time.time()
+        record['metrics'] = self.registry.snapshot()
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
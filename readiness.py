@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import logging
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# a router is probed with a TCP connect first, then for the SSH banner, then with a login running show version
+STAGES = ('tcp', 'banner', 'login')
+
+
+class Backoff:
+    """
+    Exponential delays with jitter, each delay is between half and all of initial * factor ** n capped at maximum
+    backoff = Backoff(initial=1.0, maximum=15.0)
+    time.sleep(backoff.next())
+    """
+    def __init__(self, initial=1.0, maximum=15.0, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.n = 0
+
+    def next(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.n)
+        self.n += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.n = 0
+
+
+def tcp_open(host, port=22, timeout=3.0):
+    """
+    Returns True when host accepts a TCP connection on port
+    """
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except (socket.error, socket.timeout):
+        return False
+
+
+def read_banner(host, port=22, timeout=3.0):
+    """
+    Returns the SSH identification line host sends on port, None when there is no SSH server answering yet
+    """
+    try:
+        s = socket.create_connection((host, port), timeout=timeout)
+    except (socket.error, socket.timeout):
+        return None
+    try:
+        s.settimeout(timeout)
+        buff = b''
+        while b'\n' not in buff and len(buff) < 1024:
+            data = s.recv(256)
+            if not data:
+                break
+            buff += data
+    except (socket.error, socket.timeout):
+        return None
+    finally:
+        s.close()
+    for line in buff.decode('utf-8', 'replace').splitlines():
+        if line.startswith('SSH-'):
+            return line.strip()
+    return None
+
+
+class Readiness:
+    """
+    The outcome of waiting for one router, seconds is the time to ready or until it was given up
+    stage is the last stage passed, stage_seconds the time each stage was passed at and attempts the tries per stage
+    """
+    def __init__(self, host):
+        self.host = host
+        self.ready = False
+        self.stage = None
+        self.seconds = 0.0
+        self.stage_seconds = dict()
+        self.attempts = dict((stage, 0) for stage in STAGES)
+        self.banner = None
+        self.error = None
+
+
+class ReadinessProbe:
+    """
+    Waits for a booting router in stages, a TCP connect on port, then the SSH banner, then login(), which logs in and
+    runs show version. Each stage is retried with exponential backoff and jitter until it passes, the backoff starts
+    again at the next stage. The router is given up deadline seconds after wait() started
+    probe = ReadinessProbe('20.1.1.1', login, deadline=450)
+    result = probe.wait()
+    results = wait_ready([probe1, probe2])
+    """
+    def __init__(self, host, login, port=22, deadline=450, connect_timeout=3.0, initial_delay=1.0, max_delay=15.0):
+        self.host = host
+        self.login = login
+        self.port = port
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_settings(cls, host, login, settings, deadline=None):
+        return cls(host, login, deadline=deadline or settings.readiness_deadline,
+                   connect_timeout=settings.readiness_connect_timeout, initial_delay=settings.readiness_initial_delay,
+                   max_delay=settings.readiness_max_delay)
+
+    def check(self, stage, result, timeout):
+        if stage == 'tcp':
+            return tcp_open(self.host, self.port, timeout)
+        if stage == 'banner':
+            result.banner = read_banner(self.host, self.port, timeout)
+            return result.banner is not None
+        return self.login()
+
+    def wait(self):
+        """
+        Returns a Readiness, ready when login() passed before the deadline
+        """
+        logger = logging.getLogger(__name__)
+        result = Readiness(self.host)
+        backoff = Backoff(self.initial_delay, self.max_delay)
+        start = time.monotonic()
+        end = start + self.deadline
+        stage = 0
+        while True:
+            name = STAGES[stage]
+            result.attempts[name] += 1
+            timeout = max(0.1, min(self.connect_timeout, end - time.monotonic()))
+            try:
+                passed = self.check(name, result, timeout)
+            except Exception as e:
+                result.error = str(e)
+                passed = False
+            now = time.monotonic()
+            if passed:
+                result.stage = name
+                result.stage_seconds[name] = now - start
+                logger.info("Router {} passed {} after {:.1f}s".format(self.host, name, now - start))
+                stage += 1
+                if stage == len(STAGES):
+                    result.ready = True
+                    result.error = None
+                    break
+                backoff.reset()
+                continue
+            delay = backoff.next()
+            if now + delay >= end:
+                break
+            time.sleep(delay)
+        result.seconds = time.monotonic() - start
+        if not result.ready:
+            result.error = result.error or 'no {} within {}s'.format(STAGES[stage], self.deadline)
+            logger.warning("Router {} not ready, {}".format(self.host, result.error))
+        return result
+
+
+def wait_ready(probes, max_workers=64):
+    """
+    Waits for many routers at once, returns a Readiness per probe in order
+    """
+    if not probes:
+        return list()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(probes))) as executor:
+        return list(executor.map(lambda probe: probe.wait(), probes))
+
+
+def format_readiness(results):
+    """
+    Returns the results as a text table, one router per line with the time each stage was passed at
+    """
+    lines = ['{:<16} {:<6} {:>8} {:>8} {:>8} {:>8}  {}'.format('router', 'ready', 'tcp', 'banner', 'login',
+                                                              'attempts', 'error')]
+    for r in results:
+        times = ['{:.1f}'.format(r.stage_seconds[s]) if s in r.stage_seconds else '-' for s in STAGES]
+        lines.append('{:<16} {:<6} {:>8} {:>8} {:>8} {:>8}  {}'.format(r.host, 'yes' if r.ready else 'no', times[0],
+                                                                      times[1], times[2], sum(r.attempts.values()),
+                                                                      r.error or ''))
+    ready = len([r for r in results if r.ready])
+    lines.append('{} of {} routers ready'.format(ready, len(results)))
+    return '\n'.join(lines)
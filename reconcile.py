@@ -0,0 +1,585 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from udr import RouteManager
+
+
+# a peering whose remote side was deleted, it has to be deleted and created again
+DISCONNECTED = 'Disconnected'
+
+
+def parse_vnet_id(resource_id):
+    """
+    Returns (resource_group_name, vnet_name) from a VNET resource id
+    /subscriptions/<sub>/resourceGroups/<rg>/providers/Microsoft.Network/virtualNetworks/<vnet>
+    """
+    temp = resource_id.split('/')
+    return temp[4], temp[8]
+
+
+def parse_subscription_id(resource_id):
+    """
+    Returns the subscription id from a resource id
+    """
+    return resource_id.split('/')[2]
+
+
+def classify_vnets(vnets, program_key):
+    """
+    Splits VNETs into SILB VNETs and participating VNETs
+    VNETs without the tvpc_program_key tag are dropped
+    """
+    tvpc_silb_vnets = list()
+    tvpc_participants = list()
+    for i in vnets:
+        try:
+            if i.tags.get(program_key, False) and (i.tags.get('tvpc_silb_vnet') == 'True'):
+                tvpc_silb_vnets.append(i)
+            elif i.tags.get(program_key, False):
+                tvpc_participants.append(i)
+        except:
+            continue
+    return tvpc_silb_vnets, tvpc_participants
+
+
+def index_silb_vnets(tvpc_silb_vnets, program_key):
+    """
+    Returns a dictionary of SILB VNETs keyed by (cluster tag, location)
+    Only one SILB VNET may serve a cluster in a location, duplicates are logged and ignored
+    """
+    logger = logging.getLogger(__name__)
+    silb_index = dict()
+    for s in tvpc_silb_vnets:
+        key = (s.tags.get(program_key), s.location)
+        if key in silb_index:
+            logger.warning("Ignoring SILB VNET {}, {} already serves cluster {} in {}".format(
+                s.id, silb_index[key].id, key[0], key[1]))
+            continue
+        silb_index[key] = s
+    return silb_index
+
+
+def index_peerings(vnet):
+    """
+    Returns a dictionary of a VNET's peerings keyed by remote VNET id
+    """
+    peering_index = dict()
+    for x in vnet.virtual_network_peerings or []:
+        peering_index[x.remote_virtual_network.id] = x
+    return peering_index
+
+
+def compute_peering_changes(tvpc_silb_vnets, tvpc_participants, program_key, scope=None):
+    """
+    Input:
+    tvpc_silb_vnets = SILB VNETs
+    tvpc_participants = participating VNETs
+    scope = optional set of VNET ids being reconciled, SILB peerings to remote VNETs outside it are left alone
+
+    Output:
+    to_create = list of (participant, silb) tuples needing a peering and default route
+    silb_stale = list of (silb, peering) tuples whose remote VNET is no longer a tagged participant
+    orphaned = list of (participant, peering) tuples for participants without a SILB in their cluster and region
+    drifted = list of (participant, silb, silb_side, participant_side) tuples whose peering is half built or
+              Disconnected, a side is None when it is missing
+    healthy = list of (participant, silb) tuples peered on both sides
+
+    SILBs are indexed by (cluster tag, location) and peerings by remote VNET id, so the work done is linear in
+    the number of VNETs plus the number of peerings
+    """
+    silb_index = index_silb_vnets(tvpc_silb_vnets, program_key)
+    peering_indexes = dict()
+    partnered_ids = dict()
+    for key, s in silb_index.items():
+        peering_indexes[key] = index_peerings(s)
+        partnered_ids[key] = set()
+
+    to_create = list()
+    orphaned = list()
+    drifted = list()
+    healthy = list()
+    for i in tvpc_participants:
+        key = (i.tags.get(program_key), i.location)
+        s = silb_index.get(key)
+        if s is None:
+            for x in i.virtual_network_peerings or []:
+                orphaned.append((i, x))
+            continue
+        partnered_ids[key].add(i.id)
+        silb_side = peering_indexes[key].get(i.id)
+        participant_side = index_peerings(i).get(s.id)
+        if silb_side is None and participant_side is None:
+            to_create.append((i, s))
+        elif silb_side is None or participant_side is None or DISCONNECTED in (silb_side.peering_state,
+                                                                               participant_side.peering_state):
+            drifted.append((i, s, silb_side, participant_side))
+        else:
+            healthy.append((i, s))
+
+    silb_stale = list()
+    for key, s in silb_index.items():
+        peering_index = peering_indexes[key]
+        remote_ids = peering_index.keys() - partnered_ids[key]
+        if scope is not None:
+            remote_ids &= scope
+        for remote_id in remote_ids:
+            silb_stale.append((s, peering_index[remote_id]))
+    return to_create, silb_stale, orphaned, drifted, healthy
+
+
+def delta_scope(tvpc_silb_vnets, tvpc_participants, changed_ids, dirty_keys, program_key):
+    """
+    Returns the set of VNET ids a delta cycle has to reconcile
+    changed_ids and dirty_keys come from TopologySnapshot.changes
+    Under a dirty (cluster, location) key every participant and every SILB peering is in scope
+    """
+    scope = set(changed_ids)
+    for s in tvpc_silb_vnets:
+        if (s.tags.get(program_key), s.location) in dirty_keys:
+            scope.update(index_peerings(s).keys())
+    for i in tvpc_participants:
+        if (i.tags.get(program_key), i.location) in dirty_keys:
+            scope.add(i.id)
+    return scope
+
+
+class PeeringOp:
+    """
+    One side of a VNET peering, created or deleted on vnet_name in resource_group_name of subscription_id
+    key is the participant VNET id, operations sharing a key are applied in order
+    recreate deletes the existing (Disconnected) peering before creating it
+    """
+    def __init__(self, key, subscription_id, resource_group_name, vnet_name, peering_name, remote_id=None,
+                 allow_forwarded_traffic=False, recreate=False):
+        self.key = key
+        self.recreate = recreate
+        self.subscription_id = subscription_id
+        self.resource_group_name = resource_group_name
+        self.vnet_name = vnet_name
+        self.peering_name = peering_name
+        self.remote_id = remote_id
+        self.allow_forwarded_traffic = allow_forwarded_traffic
+
+    @property
+    def ident(self):
+        return self.subscription_id, self.resource_group_name, self.vnet_name, self.peering_name
+
+    def body(self):
+        return {'allow_virtual_network_access': True,
+                'allow_forwarded_traffic': self.allow_forwarded_traffic,
+                'allow_gateway_transit': False,
+                'use_remote_gateways': False,
+                'remote_virtual_network': {'id': self.remote_id}}
+
+
+class RouteOp:
+    """
+    A UDR added to or removed from route_table_name in resource_group_name of subscription_id
+    """
+    def __init__(self, key, subscription_id, resource_group_name, route_table_name, route_name,
+                 next_hop_ip_address=None, address_prefix='0.0.0.0/0'):
+        self.key = key
+        self.subscription_id = subscription_id
+        self.resource_group_name = resource_group_name
+        self.route_table_name = route_table_name
+        self.route_name = route_name
+        self.next_hop_ip_address = next_hop_ip_address
+        self.address_prefix = address_prefix
+
+    @property
+    def ident(self):
+        return self.subscription_id, self.resource_group_name, self.route_table_name, self.route_name
+
+    def body(self):
+        return {'address_prefix': self.address_prefix, 'next_hop_type': 'VirtualAppliance',
+                'next_hop_ip_address': self.next_hop_ip_address}
+
+
+class ReconcilePlan:
+    """
+    The full change set of one reconcile cycle
+    Operations are deduplicated by the resource they touch. A UDR that is both removed and added
+    (a participant moving to another SILB) is only added
+    inventory counts the tagged VNETs the plan was computed from, drift counts the participants whose peering
+    was found Disconnected or half built. UDRs to verify are the default routes of healthy participants,
+    they are only written when the route table shows a different next hop
+    owners maps every key to the (cluster, location) it belongs to, see only()
+    """
+    def __init__(self):
+        self._peerings_to_create = dict()
+        self._peerings_to_delete = dict()
+        self._udrs_to_add = dict()
+        self._udrs_to_remove = dict()
+        self._udrs_to_verify = dict()
+        self.deferred = list()
+        self.inventory = dict()
+        self.drift = {'disconnected': 0, 'half_built': 0}
+        self.owners = dict()
+
+    @property
+    def peerings_to_create(self):
+        return list(self._peerings_to_create.values())
+
+    @property
+    def peerings_to_delete(self):
+        return [op for ident, op in self._peerings_to_delete.items() if ident not in self._peerings_to_create]
+
+    @property
+    def udrs_to_add(self):
+        return list(self._udrs_to_add.values())
+
+    @property
+    def udrs_to_remove(self):
+        return [op for ident, op in self._udrs_to_remove.items() if ident not in self._udrs_to_add]
+
+    @property
+    def udrs_to_verify(self):
+        return [op for ident, op in self._udrs_to_verify.items()
+                if ident not in self._udrs_to_add and ident not in self._udrs_to_remove]
+
+    def create_peering(self, op):
+        self._peerings_to_create[op.ident] = op
+
+    def delete_peering(self, op):
+        self._peerings_to_delete.setdefault(op.ident, op)
+
+    def add_udr(self, op):
+        self._udrs_to_add[op.ident] = op
+
+    def remove_udr(self, op):
+        self._udrs_to_remove.setdefault(op.ident, op)
+
+    def verify_udr(self, op):
+        self._udrs_to_verify.setdefault(op.ident, op)
+
+    def only(self, keep):
+        """
+        Returns a plan holding the operations of the keys whose (cluster, location) passes keep,
+        e.g. lease.ShardLeases.owns
+        """
+        subset = ReconcilePlan()
+        for name in ('_peerings_to_create', '_peerings_to_delete', '_udrs_to_add', '_udrs_to_remove',
+                     '_udrs_to_verify'):
+            setattr(subset, name, dict((ident, op) for ident, op in getattr(self, name).items()
+                                       if keep(self.owners.get(op.key))))
+        subset.deferred = [(i, reason) for i, reason in self.deferred if keep(self.owners.get(i))]
+        subset.inventory = dict(self.inventory)
+        subset.drift = dict(self.drift)
+        subset.owners = self.owners
+        return subset
+
+    def __len__(self):
+        return (len(self.peerings_to_create) + len(self.peerings_to_delete) + len(self.udrs_to_add) +
+                len(self.udrs_to_remove))
+
+    def summary(self):
+        return ("{} peerings to create, {} peerings to delete, {} UDRs to add, {} UDRs to remove, {} UDRs to verify, "
+                "{} deferred, drift {} disconnected {} half built").format(
+            len(self.peerings_to_create), len(self.peerings_to_delete), len(self.udrs_to_add),
+            len(self.udrs_to_remove), len(self.udrs_to_verify), len(self.deferred), self.drift['disconnected'],
+            self.drift['half_built'])
+
+    def describe(self):
+        """
+        Returns the plan as printable lines
+        """
+        lines = list()
+        for op in self.peerings_to_create:
+            lines.append("{} peering {} on {}/{} to {}".format('recreate' if op.recreate else 'create',
+                                                             op.peering_name, op.resource_group_name, op.vnet_name,
+                                                             op.remote_id))
+        for op in self.peerings_to_delete:
+            lines.append("delete peering {} on {}/{}".format(op.peering_name, op.resource_group_name,
+                                                           op.vnet_name))
+        for op in self.udrs_to_add:
+            lines.append("add route {} {} via {} to {}/{}".format(op.route_name, op.address_prefix,
+                                                                 op.next_hop_ip_address, op.resource_group_name,
+                                                                 op.route_table_name))
+        for op in self.udrs_to_remove:
+            lines.append("remove route {} from {}/{}".format(op.route_name, op.resource_group_name,
+                                                            op.route_table_name))
+        for op in self.udrs_to_verify:
+            lines.append("verify route {} via {} in {}/{}".format(op.route_name, op.next_hop_ip_address,
+                                                                op.resource_group_name, op.route_table_name))
+        for vnet_id, reason in self.deferred:
+            lines.append("defer {}: {}".format(vnet_id, reason))
+        return lines
+
+    def by_key(self):
+        """
+        Groups the operations by participant VNET id in the order they have to be applied:
+        UDRs removed before their peerings are deleted, peerings created before their UDRs are added
+        Returns an ordered dictionary of
+        key -> (udrs_to_remove, peerings_to_delete, peerings_to_create, udrs_to_add, udrs_to_verify)
+        """
+        groups = OrderedDict()
+        for n, ops in enumerate((self.udrs_to_remove, self.peerings_to_delete, self.peerings_to_create,
+                                 self.udrs_to_add, self.udrs_to_verify)):
+            for op in ops:
+                groups.setdefault(op.key, ([], [], [], [], []))[n].append(op)
+        return groups
+
+
+def plan(vnets, settings, snapshot=None, delta=False, changed_ids=None, retagged_keys=None):
+    """
+    Computes the ReconcilePlan for a list of VNETs without calling Azure
+    get all VNETS with the tvpc_program_key
+    put all SILB VNET objects in tvpc_silb_vnets
+    put all participating VNETs in tvpc_participants
+
+    In delta mode only VNETs that are new, deleted or whose etag or tvpc tags changed since the snapshot are
+    reconciled. A new or changed SILB VNET puts its whole cluster and region in scope.
+    A restarted poller picks up the snapshot from disk instead of reconciling everything
+
+    changed_ids reconciles only those VNETs without consulting the snapshot, a changed SILB VNET puts its cluster
+    and region in scope. Used for event driven reconciles of single VNETs. Routes are verified for the changed
+    VNETs and the participants under retagged_keys, the (cluster, location) keys of SILB VNETs whose tags changed
+    """
+    logger = logging.getLogger(__name__)
+    program_key = settings.tvpc_program_key
+    route_table = settings.private_route_table_name
+    route_name = settings.default_route_name
+    tvpc_silb_vnets, tvpc_participants = classify_vnets(vnets, program_key)
+    inventory = {'silb': len(tvpc_silb_vnets), 'participant': len(tvpc_participants),
+                 'tagged': len(tvpc_silb_vnets) + len(tvpc_participants)}
+
+    scope = None
+    verify_ids = None
+    if changed_ids is not None:
+        dirty_keys = set((s.tags.get(program_key), s.location) for s in tvpc_silb_vnets if s.id in changed_ids)
+        scope = delta_scope(tvpc_silb_vnets, tvpc_participants, changed_ids, dirty_keys, program_key)
+        tvpc_participants = [i for i in tvpc_participants if i.id in scope]
+        inventory['in_scope'] = len(scope)
+        verify_ids = set(changed_ids)
+        verify_ids.update(i.id for i in tvpc_participants
+                          if (i.tags.get(program_key), i.location) in (retagged_keys or ()))
+    elif delta and snapshot and not snapshot.is_empty():
+        changed_ids, dirty_keys, retagged_keys = snapshot.changes(vnets)
+        scope = delta_scope(tvpc_silb_vnets, tvpc_participants, changed_ids, dirty_keys, program_key)
+        tvpc_participants = [i for i in tvpc_participants if i.id in scope]
+        inventory['in_scope'] = len(scope)
+        # a SILB gaining peerings does not move next hops, only changed participants and retagged SILBs do
+        verify_ids = set(changed_ids)
+        verify_ids.update(i.id for i in tvpc_participants if (i.tags.get(program_key), i.location) in retagged_keys)
+        logger.info("Delta cycle, {} changed VNETs, {} VNETs in scope".format(len(changed_ids), len(scope)))
+
+    to_create, silb_stale, orphaned, drifted, healthy = compute_peering_changes(tvpc_silb_vnets, tvpc_participants,
+                                                                                program_key, scope)
+    reconcile_plan = ReconcilePlan()
+    reconcile_plan.inventory = inventory
+    for i in tvpc_participants:
+        reconcile_plan.owners[i.id] = (i.tags.get(program_key), i.location)
+    """
+    Peer the participant with the SILB of its cluster and region and point its default route at the SILB
+    use the same peering name for both sides to simplify peering termination
+    A SILB without its private address tag is still being built, its participants wait for the tag
+    """
+    for i, s in to_create:
+        next_hop = (s.tags or {}).get('tvpc_silb_private_address')
+        if not next_hop:
+            reconcile_plan.deferred.append((i.id, "SILB {} has no tvpc_silb_private_address tag".format(s.id)))
+            continue
+        s_sub, (s_rg, s_name) = parse_subscription_id(s.id), parse_vnet_id(s.id)
+        i_sub, (i_rg, i_name) = parse_subscription_id(i.id), parse_vnet_id(i.id)
+        name = s_name + 'to' + i_name
+        reconcile_plan.create_peering(PeeringOp(i.id, s_sub, s_rg, s_name, name, i.id,
+                                                allow_forwarded_traffic=False))
+        reconcile_plan.create_peering(PeeringOp(i.id, i_sub, i_rg, i_name, name, s.id,
+                                                allow_forwarded_traffic=True))
+        reconcile_plan.add_udr(RouteOp(i.id, i_sub, i_rg, route_table, route_name, next_hop))
+
+    """
+    Repair drift: a missing side of a half built peering is created, a Disconnected side is deleted and created again
+    The repaired side keeps the name of the other side, the default route is set again once both sides are up
+    """
+    for i, s, silb_side, participant_side in drifted:
+        next_hop = (s.tags or {}).get('tvpc_silb_private_address')
+        if not next_hop:
+            reconcile_plan.deferred.append((i.id, "SILB {} has no tvpc_silb_private_address tag".format(s.id)))
+            continue
+        if silb_side is None or participant_side is None:
+            reconcile_plan.drift['half_built'] += 1
+        else:
+            reconcile_plan.drift['disconnected'] += 1
+        s_sub, (s_rg, s_name) = parse_subscription_id(s.id), parse_vnet_id(s.id)
+        i_sub, (i_rg, i_name) = parse_subscription_id(i.id), parse_vnet_id(i.id)
+        name = (silb_side or participant_side).name
+        if silb_side is None or silb_side.peering_state == DISCONNECTED:
+            reconcile_plan.create_peering(PeeringOp(i.id, s_sub, s_rg, s_name, silb_side.name if silb_side else name,
+                                                    i.id, allow_forwarded_traffic=False,
+                                                    recreate=silb_side is not None))
+        if participant_side is None or participant_side.peering_state == DISCONNECTED:
+            reconcile_plan.create_peering(PeeringOp(i.id, i_sub, i_rg, i_name,
+                                                    participant_side.name if participant_side else name, s.id,
+                                                    allow_forwarded_traffic=True,
+                                                    recreate=participant_side is not None))
+        reconcile_plan.add_udr(RouteOp(i.id, i_sub, i_rg, route_table, route_name, next_hop))
+
+    """
+    Healthy peerings still need their default route pointing at the current tvpc_silb_private_address
+    Full cycles verify every participant, delta cycles the changed ones and those of retagged SILBs
+    """
+    if getattr(settings, 'poller_verify_routes', False):
+        for i, s in healthy:
+            next_hop = (s.tags or {}).get('tvpc_silb_private_address')
+            if next_hop and (verify_ids is None or i.id in verify_ids):
+                i_sub, (i_rg, i_name) = parse_subscription_id(i.id), parse_vnet_id(i.id)
+                reconcile_plan.verify_udr(RouteOp(i.id, i_sub, i_rg, route_table, route_name, next_hop))
+
+    """
+    Any VNET peerings left on the tvpc_silb_vnets do not have properly tagged participating VNETs
+    Remove routes to SILB from remote VNET
+    Remove peering from SILB VNET and remote VNET
+    """
+    for s, x in silb_stale:
+        s_sub, (s_rg, s_name) = parse_subscription_id(s.id), parse_vnet_id(s.id)
+        remote_id = x.remote_virtual_network.id
+        reconcile_plan.owners.setdefault(remote_id, (s.tags.get(program_key), s.location))
+        remote_sub, (remote_rg, remote_name) = parse_subscription_id(remote_id), parse_vnet_id(remote_id)
+        reconcile_plan.remove_udr(RouteOp(remote_id, remote_sub, remote_rg, route_table, route_name))
+        reconcile_plan.delete_peering(PeeringOp(remote_id, s_sub, s_rg, s_name, x.name))
+        reconcile_plan.delete_peering(PeeringOp(remote_id, remote_sub, remote_rg, remote_name, x.name))
+
+    """
+    If there are participant VNETs with tags but no SILB VPC, go through and remove peering connections and routes.
+    For instance, if removed SILB VNET
+    """
+    for i, x in orphaned:
+        i_sub, (i_rg, i_name) = parse_subscription_id(i.id), parse_vnet_id(i.id)
+        remote_id = x.remote_virtual_network.id
+        remote_sub, (remote_rg, remote_name) = parse_subscription_id(remote_id), parse_vnet_id(remote_id)
+        reconcile_plan.remove_udr(RouteOp(i.id, i_sub, i_rg, route_table, route_name))
+        reconcile_plan.delete_peering(PeeringOp(i.id, i_sub, i_rg, i_name, x.name))
+        reconcile_plan.delete_peering(PeeringOp(i.id, remote_sub, remote_rg, remote_name, x.name))
+
+    return reconcile_plan
+
+
+def wait(poller):
+    # a peering being deleted cannot be created again until the delete has finished
+    if hasattr(poller, 'wait'):
+        poller.wait()
+
+
+def timed(metrics, operation):
+    return metrics.operation(operation) if metrics else nullcontext()
+
+
+class PeeringLocks:
+    """
+    One lock per VNET serializing its peering writes
+    ARM answers a write to a VNET that is still being changed with 409 AnotherOperationInProgress. A SILB VNET takes
+    the peering writes of every participant of its cluster and region, so participants running in parallel would
+    collide on it. Writes are waited for with the lock held, writes to different VNETs still run in parallel
+    locks = PeeringLocks()
+    with locks.vnet_lock(op):
+    """
+    def __init__(self):
+        self.locks = dict()
+        self.lock = threading.Lock()
+
+    def vnet_lock(self, op):
+        vnet = (op.subscription_id, op.resource_group_name.lower(), op.vnet_name.lower())
+        with self.lock:
+            return self.locks.setdefault(vnet, threading.Lock())
+
+
+def peering_lock(locks, op):
+    return locks.vnet_lock(op) if locks else nullcontext()
+
+
+def apply_ops(factory, routes, udrs_to_remove, peerings_to_delete, peerings_to_create, udrs_to_add,
+              udrs_to_verify=(), metrics=None, locks=None):
+    """
+    Applies one participant's operations in order, the first failure stops the rest
+    Each operation uses the network client of its own subscription, so peerings across subscriptions work.
+    UDRs are single route upserts and deletes through a udr.RouteManager, routes already in place are skipped
+    metrics is an optional metrics.PollerMetrics timing every operation. locks is the PeeringLocks shared by the
+    participants applied in parallel, each peering write holds the lock of its VNET until it has finished
+    """
+    for op in udrs_to_remove:
+        with timed(metrics, 'remove_udr'):
+            routes.remove(op)
+    for op in peerings_to_delete:
+        with timed(metrics, 'delete_peering'), peering_lock(locks, op):
+            wait(factory.network(op.subscription_id).virtual_network_peerings.delete(
+                op.resource_group_name, op.vnet_name, op.peering_name))
+    for op in peerings_to_create:
+        with peering_lock(locks, op):
+            if op.recreate:
+                with timed(metrics, 'delete_peering'):
+                    wait(factory.network(op.subscription_id).virtual_network_peerings.delete(
+                        op.resource_group_name, op.vnet_name, op.peering_name))
+            with timed(metrics, 'create_peering'):
+                wait(factory.network(op.subscription_id).virtual_network_peerings.create_or_update(
+                    op.resource_group_name, op.vnet_name, op.peering_name, op.body()))
+    for op in udrs_to_add:
+        with timed(metrics, 'add_udr'):
+            routes.upsert(op)
+    for op in udrs_to_verify:
+        with timed(metrics, 'verify_udr'):
+            routes.repair(op)
+
+
+def describe_ops(key, udrs_to_remove, peerings_to_delete, peerings_to_create, udrs_to_add, udrs_to_verify=()):
+    # a drifted peering has one side created or a side recreated, a new peering both sides created
+    if any(op.recreate for op in peerings_to_create) or len(peerings_to_create) == 1:
+        return "Repair peering {} of {}".format(', '.join(sorted(set(op.peering_name for op in peerings_to_create))),
+                                                key)
+    created = sorted(set(op.remote_id for op in peerings_to_create if op.remote_id != key))
+    if created:
+        return "Build peering between {} and {}".format(key, ', '.join(created))
+    if peerings_to_delete:
+        return "Remove peering {} of {}".format(', '.join(sorted(set(op.peering_name for op in peerings_to_delete))),
+                                                key)
+    if udrs_to_add or udrs_to_remove:
+        return "Update routes of {}".format(key)
+    return "Verify routes of {}".format(key)
+
+
+def plan_jobs(reconcile_plan, factory, routes=None, metrics=None, locks=None):
+    """
+    Yields (key, description, fn, args) with one job per participant VNET
+    factory gives the network client of a subscription with factory.network(subscription_id),
+    see clients.AzureClientFactory. routes is the udr.RouteManager of the cycle and locks its PeeringLocks,
+    new ones are made when not given
+    """
+    routes = routes or RouteManager(factory)
+    locks = locks or PeeringLocks()
+    for key, ops in reconcile_plan.by_key().items():
+        yield key, describe_ops(key, *ops), apply_ops, (factory, routes) + ops + (metrics, locks)
+
+
+def apply(reconcile_plan, factory, executor, routes=None, metrics=None, locks=None):
+    """
+    Applies a ReconcilePlan with an executor.OrderedExecutor and returns the list of JobResult
+    Participants are applied in parallel, each participant's operations in order and the peering writes to one VNET
+    one at a time
+    """
+    for key, description, fn, args in plan_jobs(reconcile_plan, factory, routes, metrics, locks):
+        executor.submit(key, description, fn, *args)
+    return executor.run()
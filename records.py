@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import sys
+
+# Tags that decide peering and routing, kept on VNET records next to the program key
+TVPC_TAGS = ('tvpc_silb_vnet', 'tvpc_silb_private_address')
+
+
+class RemoteRef:
+    __slots__ = ('id',)
+
+    def __init__(self, resource_id):
+        self.id = resource_id
+
+
+class PeeringRecord:
+    """
+    The parts of a VirtualNetworkPeering reconciliation reads, shaped like the SDK model
+    """
+    __slots__ = ('name', 'peering_state', 'remote_virtual_network')
+
+    def __init__(self, name, remote_id, peering_state=None):
+        self.name = name
+        self.peering_state = peering_state
+        self.remote_virtual_network = RemoteRef(remote_id)
+
+
+class VnetRecord:
+    """
+    Compact stand-in for a VirtualNetwork SDK model: id, name, resource group, location, the tvpc tags and peerings
+    Attribute names follow the SDK so reconcile.plan and the topology snapshot take either
+    """
+    __slots__ = ('id', 'name', 'resource_group_name', 'location', 'tags', 'etag', 'virtual_network_peerings')
+
+    def __init__(self, resource_id, name, location, tags, etag=None, peerings=()):
+        self.id = resource_id
+        self.name = name
+        self.resource_group_name = resource_id.split('/')[4]
+        self.location = location
+        self.tags = tags
+        self.etag = etag
+        self.virtual_network_peerings = tuple(peerings)
+
+    def __repr__(self):
+        return 'VnetRecord({})'.format(self.id)
+
+
+def intern(value):
+    # SILB ids, locations and cluster names repeat across thousands of records
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def relevant_tags(tags, program_key):
+    tags = tags or {}
+    return dict((k, intern(tags[k])) for k in (program_key,) + TVPC_TAGS if k in tags)
+
+
+def project_vnet(vnet, program_key):
+    """
+    Returns the VnetRecord of an SDK VirtualNetwork, None when it does not carry the program key tag
+    """
+    if not (vnet.tags or {}).get(program_key):
+        return None
+    peerings = [PeeringRecord(x.name, intern(x.remote_virtual_network.id), intern(x.peering_state))
+                for x in vnet.virtual_network_peerings or []]
+    return VnetRecord(vnet.id, vnet.name, intern(vnet.location), relevant_tags(vnet.tags, program_key),
+                      getattr(vnet, 'etag', None), peerings)
+
+
+def project_vnets(vnets, program_key):
+    """
+    Consumes VNETs one at a time, e.g. from an SDK pager, and yields the records of the tagged ones
+    Only one page of SDK models is alive at a time
+    """
+    for v in vnets:
+        record = project_vnet(v, program_key)
+        if record is not None:
+            yield record
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import os
+import threading
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from config import Settings
+
+# template names are looked up from the working directory first, then from this directory
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TemplateRenderer:
+    """
+    Renders router configuration templates from one shared jinja2 Environment
+    A template is read and compiled once and kept in the Environment's LRU cache of cache_size templates,
+    it is compiled again only when its file changes. With bytecode_cache_dir the compiled code is also kept on disk
+    for the next process
+    renderer = TemplateRenderer()
+    lines = renderer.render('templates/baseline.j2', {'hostname': 'csr1'})
+    configs = renderer.render_many('templates/baseline.j2', [{'hostname': 'csr1'}, {'hostname': 'csr2'}])
+    """
+    def __init__(self, search_path=None, cache_size=64, bytecode_cache_dir=None):
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            if not os.path.isdir(bytecode_cache_dir):
+                os.makedirs(bytecode_cache_dir)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        self.environment = Environment(loader=FileSystemLoader(search_path or ['.', HERE]), cache_size=cache_size,
+                                       auto_reload=True, bytecode_cache=bytecode_cache)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(cache_size=settings.template_cache_size, bytecode_cache_dir=settings.template_bytecode_cache)
+
+    def template(self, template_name):
+        """
+        Returns the compiled template, 'templates/baseline.j2' or a path below the search path
+        """
+        return self.environment.get_template(template_name.replace(os.sep, '/'))
+
+    def render(self, template_name, variables):
+        """
+        Renders the whole template in one pass, returns the configuration lines
+        """
+        return self.template(template_name).render(variables).split('\n')
+
+    def render_many(self, template_name, variables_list):
+        """
+        Renders one configuration per variables dictionary from the same compiled template
+        """
+        template = self.template(template_name)
+        return [template.render(variables).split('\n') for variables in variables_list]
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def shared_renderer():
+    """
+    Returns the renderer shared by the Routers of this process, built from Settings on first use
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = TemplateRenderer.from_settings(Settings())
+        return _renderer
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import requests
+from cli_engine import LineResult
+from config_diff import config_lines
+
+# transactional CLI configuration RPC of IOS-XE 16.x, all lines are applied or none
+CLI_TRANS = 'Cisco-IOS-XE-cli-rpc:config-ios-cli-trans'
+SAVE_CONFIG = 'cisco-ia:save-config'
+VERSION = 'Cisco-IOS-XE-native:native/version'
+MEDIA_TYPE = 'application/yang-data+json'
+
+
+class RestconfError(Exception):
+    def __init__(self, status_code, message=''):
+        Exception.__init__(self, 'RESTCONF {}: {}'.format(status_code, message))
+        self.status_code = status_code
+        self.message = message
+
+
+def error_message(response):
+    """
+    Returns the error-message of a RESTCONF error reply, the body when it is not one
+    """
+    try:
+        errors = response.json()['errors']['error']
+        return '; '.join(e.get('error-message', '') for e in errors)
+    except (ValueError, KeyError, TypeError):
+        return response.text
+
+
+class RestconfTransport:
+    """
+    Pushes rendered IOS configuration to an IOS-XE router as one transaction over RESTCONF
+    The router needs restconf, ip http secure-server and ip http authentication local, see Router.enable_restconf.
+    The HTTPS connection is kept alive between calls
+    transport = RestconfTransport('10.0.0.1', 'admin', 'secret')
+    results = transport.configure(lines)
+    transport.save()
+    """
+    def __init__(self, host, username, password, port=443, scheme='https', verify=False, timeout=120):
+        self.base_url = '{}://{}:{}/restconf'.format(scheme, host, port)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        self.session.verify = verify
+        self.session.headers.update({'Content-Type': MEDIA_TYPE, 'Accept': MEDIA_TYPE})
+
+    def request(self, method, path, body=None):
+        response = self.session.request(method, '{}/{}'.format(self.base_url, path), json=body, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise RestconfError(response.status_code, error_message(response))
+        if response.status_code == 204 or not response.content:
+            return dict()
+        return response.json()
+
+    def rpc(self, name, body=None):
+        return self.request('POST', 'operations/{}'.format(name), body)
+
+    def configure(self, lines):
+        """
+        Applies the configuration lines in one transaction, returns a cli_engine.LineResult per line
+        A rejected transaction changes nothing, the lines named in the router's error get its message
+        """
+        lines = config_lines(lines)
+        if not lines:
+            return list()
+        try:
+            self.rpc(CLI_TRANS, {'{}:input'.format(CLI_TRANS.split(':')[0]): {'clis': '\n'.join(lines)}})
+        except RestconfError as e:
+            if e.status_code >= 500 or e.status_code in (401, 403):
+                raise
+            named = [line for line in lines if line.strip() in e.message]
+            return [LineResult(line, error=e.message if line in named or not named else 'Rolled back')
+                    for line in lines]
+        return [LineResult(line) for line in lines]
+
+    def save(self):
+        self.rpc(SAVE_CONFIG)
+
+    def show_version(self):
+        return self.request('GET', 'data/{}'.format(VERSION)).get('Cisco-IOS-XE-native:version')
+
+    def close(self):
+        self.session.close()
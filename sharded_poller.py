@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import argparse
+import json
+import logging
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+from clients import AzureClientFactory
+from config import Settings
+from discovery import make_discovery
+from executor import OrderedExecutor
+from reconcile import PeeringLocks, apply_ops, describe_ops, parse_subscription_id, plan
+from snapshot import TopologySnapshot
+from udr import RouteManager
+
+# the client factory of the shard a worker process is pinned to, kept across cycles
+_factories = dict()
+
+
+class Shard:
+    """
+    A subscription, optionally limited to a group of regions
+    The shard owns the participant VNETs it contains and applies every operation keyed on them,
+    including the SILB side of peerings with SILB VNETs in other subscriptions
+    """
+    def __init__(self, subscription_id, regions=None):
+        self.subscription_id = subscription_id
+        self.regions = frozenset(regions) if regions else None
+
+    @property
+    def name(self):
+        if self.regions is None:
+            return self.subscription_id
+        return '{}/{}'.format(self.subscription_id, ','.join(sorted(self.regions)))
+
+    def owns(self, subscription_id, location):
+        return subscription_id == self.subscription_id and (self.regions is None or location in self.regions)
+
+
+def make_shards(subscriptions, region_shards=None):
+    shards = list()
+    for subscription_id in subscriptions:
+        if region_shards:
+            for regions in region_shards:
+                shards.append(Shard(subscription_id, regions))
+        else:
+            shards.append(Shard(subscription_id))
+    return shards
+
+
+def shard_of(shards, key, ops, locations):
+    """
+    Returns the shard owning a participant VNET id, falling back on the subscription of any of its operations
+    when the VNET itself is gone or outside the managed subscriptions
+    """
+    subscription_id = parse_subscription_id(key)
+    location = locations.get(key)
+    for shard in shards:
+        if shard.owns(subscription_id, location):
+            return shard
+    subscriptions = [subscription_id] + [op.subscription_id for group in ops for op in group]
+    for subscription_id in subscriptions:
+        for shard in shards:
+            if shard.subscription_id == subscription_id:
+                return shard
+    return None
+
+
+def throttle_share(settings, share):
+    """
+    Returns settings whose ARM request budget is 1/share of the subscription's, for shards sharing a subscription
+    """
+    shared = Settings()
+    for name in ('arm_read_rate', 'arm_read_burst', 'arm_write_rate', 'arm_write_burst'):
+        setattr(shared, name, getattr(settings, name) / float(share))
+    return shared
+
+
+def worker_factory(shard_name, subscription_id, share, factory_class=AzureClientFactory):
+    if shard_name not in _factories:
+        _factories[shard_name] = factory_class(subscription_id=subscription_id,
+                                               throttle_settings=throttle_share(Settings(), share))
+    return _factories[shard_name]
+
+
+def discover_subscription(shard_name, subscription_id, regions, share, factory_class=AzureClientFactory):
+    """
+    Runs in the worker process of a shard of the subscription, returns (subscription_id, vnets or None, error)
+    """
+    settings = Settings()
+    try:
+        vnets = make_discovery(settings, worker_factory(shard_name, subscription_id, share, factory_class)).vnets()
+        if regions:
+            vnets = [v for v in vnets if v.location in regions]
+        return subscription_id, vnets, None
+    except Exception as e:
+        return subscription_id, None, '{}'.format(e)
+
+
+def apply_shard(shard_name, subscription_id, groups, share, max_workers, factory_class=AzureClientFactory):
+    """
+    Runs in the worker process of the shard, applies its (key, ops) groups and returns its report
+    """
+    start = time.monotonic()
+    factory = worker_factory(shard_name, subscription_id, share, factory_class)
+    routes = RouteManager(factory)
+    locks = PeeringLocks()
+    executor = OrderedExecutor(max_workers)
+    for key, ops in groups:
+        executor.submit(key, describe_ops(key, *ops), apply_ops, factory, routes, *ops, locks=locks)
+    results = executor.run()
+    scheduler = factory.scheduler()
+    return {'shard': shard_name,
+            'jobs': len(results),
+            'failed': [r.key for r in results if not r.ok],
+            'errors': ['{}: {}'.format(r.key, r.error) for r in results if not r.ok],
+            'route_stats': dict(routes.stats),
+            'arm_stats': dict(scheduler.stats) if scheduler else {},
+            'seconds': round(time.monotonic() - start, 3)}
+
+
+class ShardedReconciler:
+    """
+    Reconciles many subscriptions with one worker process per shard
+    Discovery runs per subscription in the worker of its first shard, the plan is computed once over every VNET so
+    peerings between a SILB VNET and a participant in another subscription are planned like any other, then each
+    shard applies the operations of the participants it owns with its own clients and throttle budget.
+    Every shard is pinned to its worker process, so its budget is never split across processes or shared with
+    another shard. factory_class builds the clients of a shard, clients.AzureClientFactory by default
+    """
+    def __init__(self, settings, subscriptions, region_shards=None, snapshot=None, dry_run=False,
+                 factory_class=AzureClientFactory):
+        self.settings = settings
+        self.subscriptions = list(subscriptions)
+        self.region_shards = region_shards or []
+        self.shards = make_shards(self.subscriptions, self.region_shards)
+        self.regions = frozenset(r for group in self.region_shards for r in group) or None
+        # shards of one subscription split its ARM budget
+        self.share = max(1, len(self.region_shards))
+        self.snapshot = snapshot
+        self.dry_run = dry_run
+        self.factory_class = factory_class
+        self.pools = OrderedDict((shard, Pool(processes=1)) for shard in self.shards)
+        self.cycle = 0
+
+    def first_shard(self, subscription_id):
+        return next(shard for shard in self.shards if shard.subscription_id == subscription_id)
+
+    def discover(self):
+        vnets = list()
+        failed = dict()
+        pending = list()
+        for subscription_id in self.subscriptions:
+            shard = self.first_shard(subscription_id)
+            pending.append(self.pools[shard].apply_async(discover_subscription, (
+                shard.name, subscription_id, self.regions, self.share, self.factory_class)))
+        for subscription_id, result, error in [p.get() for p in pending]:
+            if result is None:
+                failed[subscription_id] = error
+            else:
+                vnets.extend(result)
+        return vnets, failed
+
+    def partition(self, reconcile_plan, locations, failed_subscriptions):
+        """
+        Returns an ordered dictionary of shard -> list of (key, ops)
+        Participants touching a subscription that could not be listed are skipped, their state is unknown
+        """
+        logger = logging.getLogger(__name__)
+        groups = OrderedDict((shard, list()) for shard in self.shards)
+        skipped = 0
+        for key, ops in reconcile_plan.by_key().items():
+            touched = set([parse_subscription_id(key)] + [op.subscription_id for group in ops for op in group])
+            if touched & failed_subscriptions:
+                skipped += 1
+                continue
+            shard = shard_of(self.shards, key, ops, locations)
+            if shard is None:
+                skipped += 1
+                continue
+            groups[shard].append((key, ops))
+        if skipped:
+            logger.warning("Skipped {} participants in or peered with unlisted subscriptions".format(skipped))
+        return groups
+
+    def reconcile(self):
+        """
+        Runs one cycle and returns the combined cycle report
+        """
+        logger = logging.getLogger(__name__)
+        start = time.monotonic()
+        self.cycle += 1
+        vnets, failed = self.discover()
+        for subscription_id, error in failed.items():
+            logger.warning("Unable to list VNETs of subscription {}".format(subscription_id))
+            logger.error("{}".format(error))
+        discovered = time.monotonic()
+
+        # with a subscription missing the snapshot would see its VNETs as deleted, fall back on a full plan
+        delta = bool(self.cycle % self.settings.poller_full_reconcile_cycles) and not failed
+        reconcile_plan = plan(vnets, self.settings, self.snapshot, delta)
+        locations = dict((v.id, v.location) for v in vnets)
+        groups = self.partition(reconcile_plan, locations, set(failed))
+        planned = time.monotonic()
+
+        report = {'cycle': self.cycle,
+                  'vnets': len(vnets),
+                  'unlisted_subscriptions': sorted(failed),
+                  'plan': reconcile_plan.summary(),
+                  'drift': dict(reconcile_plan.drift),
+                  'shards': list(),
+                  'failed': 0}
+        if self.dry_run:
+            for line in reconcile_plan.describe():
+                print(line)
+        else:
+            pending = [self.pools[shard].apply_async(apply_shard, (shard.name, shard.subscription_id, shard_groups,
+                                                                   self.share, self.settings.poller_max_workers,
+                                                                   self.factory_class))
+                       for shard, shard_groups in groups.items()]
+            report['shards'] = [p.get() for p in pending]
+            failed_ids = set(key for r in report['shards'] for key in r['failed'])
+            report['failed'] = len(failed_ids)
+            if self.snapshot and not failed:
+                self.snapshot.update(vnets, failed_ids)
+        report['seconds'] = {'discover': round(discovered - start, 3),
+                             'plan': round(planned - discovered, 3),
+                             'apply': round(time.monotonic() - planned, 3)}
+        return report
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+        for pool in self.pools.values():
+            pool.join()
+
+
+def log_report(report):
+    logger = logging.getLogger(__name__)
+    logger.info("Cycle {} over {} VNETs, {}".format(report['cycle'], report['vnets'], report['plan']))
+    for r in report['shards']:
+        logger.info("Shard {}: {} jobs, {} failed in {}s".format(r['shard'], r['jobs'], len(r['failed']),
+                                                                 r['seconds']))
+    logger.info("Cycle {} discover {discover}s, plan {plan}s, apply {apply}s, {} failed".format(
+        report['cycle'], report['failed'], **report['seconds']))
+
+
+if __name__ == '__main__':
+    """
+    export AZURE_SUBSCRIPTION_IDS='sub1,sub2,sub3'
+    python sharded_poller.py --report azure_sharded_poller_report.jsonl
+    """
+    parser = argparse.ArgumentParser(description='Multi-subscription sharded peering and UDR poller')
+    parser.add_argument('--subscriptions', nargs='+', default=None, help='defaults to AZURE_SUBSCRIPTION_IDS')
+    parser.add_argument('--dry-run', action='store_true', help='print the plan of every cycle without applying it')
+    parser.add_argument('--once', action='store_true', help='run a single cycle and exit')
+    parser.add_argument('--report', default=None, help='append every cycle report to this JSON lines file')
+    parser.add_argument('--snapshot', default='azure_sharded_poller_snapshot.db', help='delta mode snapshot file')
+    args = parser.parse_args()
+
+    # logging info
+    FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(handlers=[
+        logging.FileHandler("{0}/{1}.log".format('./', 'azure_sharded_poller')),
+        logging.StreamHandler()], format=FORMAT, level=logging.INFO)
+
+    settings = Settings()
+    snapshot = None
+    if settings.poller_delta_mode:
+        snapshot = TopologySnapshot(args.snapshot, settings.tvpc_program_key)
+    reconciler = ShardedReconciler(settings, args.subscriptions or settings.poller_subscriptions,
+                                   settings.poller_region_shards, snapshot, args.dry_run)
+    try:
+        while True:
+            started = time.monotonic()
+            cycle_report = reconciler.reconcile()
+            log_report(cycle_report)
+            if args.report:
+                with open(args.report, 'a') as f:
+                    f.write(json.dumps(cycle_report) + '\n')
+            if args.once:
+                break
+            time.sleep(max(0.0, settings.poller_interval - (time.monotonic() - started)))
+    finally:
+        reconciler.close()
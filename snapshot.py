@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import json
+import logging
+import sqlite3
+from records import TVPC_TAGS
+
+
+class TopologySnapshot:
+    """
+    Last seen etag, tvpc tags and peering set per VNET, persisted in SQLite
+    snapshot = TopologySnapshot('azure_poller_snapshot.db', settings.tvpc_program_key)
+    changed_ids, dirty_keys, retagged_keys = snapshot.changes(vnets)
+    ... reconcile ...
+    snapshot.update(vnets, failed_ids)
+    """
+    def __init__(self, path, program_key):
+        self.path = path
+        self.program_key = program_key
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS vnets ('
+                          'id TEXT PRIMARY KEY, '
+                          'etag TEXT, '
+                          'cluster TEXT, '
+                          'location TEXT, '
+                          'tags TEXT, '
+                          'peerings TEXT, '
+                          'failed INTEGER NOT NULL DEFAULT 0)')
+        columns = [r[1] for r in self.conn.execute('PRAGMA table_info(vnets)')]
+        if 'failed' not in columns:
+            self.conn.execute('ALTER TABLE vnets ADD COLUMN failed INTEGER NOT NULL DEFAULT 0')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def tvpc_tags(self, vnet):
+        # a change to any of these tags makes a VNET dirty even if the etag is unchanged
+        tags = vnet.tags or {}
+        return {k: tags[k] for k in (self.program_key,) + TVPC_TAGS if k in tags}
+
+    def row(self, vnet):
+        tags = self.tvpc_tags(vnet)
+        # peering states are part of the row, a peering turning Disconnected makes the VNET dirty
+        peerings = sorted([x.remote_virtual_network.id, x.peering_state] for x in vnet.virtual_network_peerings or [])
+        return (vnet.id, vnet.etag, tags.get(self.program_key), vnet.location,
+                json.dumps(tags, sort_keys=True), json.dumps(peerings))
+
+    def load(self):
+        rows = dict()
+        for r in self.conn.execute('SELECT id, etag, cluster, location, tags, peerings, failed FROM vnets'):
+            rows[r[0]] = r
+        return rows
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM vnets LIMIT 1').fetchone() is None
+
+    def changes(self, vnets):
+        """
+        Compares the listed VNETs with the snapshot
+
+        Output:
+        changed_ids = set of VNET ids that are new, deleted, failed last cycle or whose etag, tvpc tags or peerings
+        changed
+        dirty_keys = set of (cluster, location) keys whose SILB VNET is new, deleted or changed.
+        Every participant under a dirty key has to be reconciled, not only the changed ones
+        retagged_keys = the dirty keys whose SILB VNET is new, deleted or had its tvpc tags changed,
+        the default routes of their participants may point at an old next hop
+        """
+        rows = self.load()
+        changed_ids = set()
+        dirty_keys = set()
+        retagged_keys = set()
+        for v in vnets:
+            new = self.row(v)
+            old = rows.pop(v.id, None)
+            if old is not None and not old[6] and old[1] == new[1] and old[4] == new[4] and old[5] == new[5]:
+                continue
+            changed_ids.add(v.id)
+            for r in (old, new):
+                if r is not None and r[2] and json.loads(r[4]).get('tvpc_silb_vnet') == 'True':
+                    dirty_keys.add((r[2], r[3]))
+                    if old is None or old[4] != new[4]:
+                        retagged_keys.add((r[2], r[3]))
+        # anything left in the snapshot was deleted from Azure
+        for old in rows.values():
+            changed_ids.add(old[0])
+            if old[2] and json.loads(old[4]).get('tvpc_silb_vnet') == 'True':
+                dirty_keys.add((old[2], old[3]))
+                retagged_keys.add((old[2], old[3]))
+        return changed_ids, dirty_keys, retagged_keys
+
+    def update(self, vnets, failed_ids=None):
+        """
+        Replaces the snapshot with the listed VNETs
+        VNETs in failed_ids are stored as failed so the next cycle sees them as changed, Resource Graph rows have
+        no etag to clear.
+        Deleted VNETs in failed_ids keep their old row so they are seen as deleted again
+        """
+        logger = logging.getLogger(__name__)
+        failed_ids = failed_ids or set()
+        rows = list()
+        seen = set()
+        for v in vnets:
+            rows.append(self.row(v) + (1 if v.id in failed_ids else 0,))
+            seen.add(v.id)
+        keep = [i for i in failed_ids if i not in seen]
+        try:
+            with self.conn:
+                self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS keep (id TEXT PRIMARY KEY)')
+                self.conn.execute('DELETE FROM keep')
+                self.conn.executemany('INSERT OR IGNORE INTO keep (id) VALUES (?)', [(i,) for i in keep])
+                self.conn.execute('DELETE FROM vnets WHERE id NOT IN (SELECT id FROM keep)')
+                self.conn.executemany('INSERT OR REPLACE INTO vnets (id, etag, cluster, location, tags, peerings, '
+                                      'failed) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.warning("Unable to update topology snapshot {}".format(self.path))
+            logger.error("{}".format(e))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute('DELETE FROM vnets')
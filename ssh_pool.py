@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import paramiko
+from config import Settings
+
+# errors meaning the session is gone rather than the command failed
+CONNECTION_ERRORS = (socket.error, EOFError, paramiko.SSHException)
+
+
+class Session:
+    """
+    An authenticated SSH connection to a router and its interactive shell, sitting at the exec prompt
+    """
+    def __init__(self, key, client, channel, timeout=120):
+        self.key = key
+        self.client = client
+        self.channel = channel
+        # reads on the channel give up after timeout seconds
+        self.timeout = timeout
+        channel.settimeout(timeout)
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+        # set by SSHSessionPool.abort, the call using the session is not retried
+        self.aborted = False
+
+    def alive(self):
+        transport = self.client.get_transport()
+        return (transport is not None and transport.is_active() and not self.channel.closed and
+                not self.channel.eof_received)
+
+    def read_prompt(self, timeout=None):
+        """
+        Reads until the exec prompt, raises socket.timeout when it does not show up within timeout seconds
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        buff = bytearray()
+        try:
+            while not buff.rstrip().endswith(b'#'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout('No prompt from {} within {}s'.format(self.key[0], timeout))
+                self.channel.settimeout(remaining)
+                data = self.channel.recv(9999)
+                if not data:
+                    raise EOFError('Session to {} closed'.format(self.key[0]))
+                buff += data
+        finally:
+            self.channel.settimeout(self.timeout)
+        return buff.decode('utf-8', 'replace')
+
+    def probe(self, timeout=5.0):
+        """
+        Sends an empty line and waits for the prompt, True when the router answered
+        """
+        try:
+            self.channel.send('\n')
+            self.read_prompt(timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.channel.close()
+        finally:
+            self.client.close()
+
+
+class SSHSessionPool:
+    """
+    Keeps authenticated interactive SSH sessions to routers open across Router calls
+    Sessions are keyed by (router IP, username). Transports send keepalives every keepalive seconds, sessions idle
+    for longer than that are probed with an empty line before reuse, and sessions idle for max_idle seconds are
+    closed. At most max_size sessions are open, the least recently used idle one makes room for a new router.
+    A dead session is replaced by a new one, see run(). abort() closes a router's sessions, also those in use
+    pool = SSHSessionPool()
+    with pool.session(ip, username, password) as s:
+        s.channel.send('show version\n')
+    """
+    def __init__(self, max_size=32, max_idle=300, keepalive=30, connect_timeout=15.0, command_timeout=120):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.command_timeout = command_timeout
+        self.idle = dict()
+        # sessions lent out by acquire() until they are released or discarded
+        self.busy = dict()
+        self.open = 0
+        self.condition = threading.Condition()
+        self.stats = {'connects': 0, 'reuses': 0, 'reconnects': 0, 'expired': 0, 'evicted': 0, 'aborted': 0}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(max_size=settings.ssh_pool_max_size, max_idle=settings.ssh_pool_max_idle,
+                   keepalive=settings.ssh_keepalive, command_timeout=settings.ssh_command_timeout)
+
+    def connect(self, key, password, timeout=None):
+        """
+        Opens a new session: TCP, key exchange, login, shell, first prompt and terminal length 0
+        """
+        host, username = key
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(host, username=username, password=password, timeout=timeout or self.connect_timeout,
+                           banner_timeout=timeout or self.connect_timeout, look_for_keys=False, allow_agent=False)
+            if self.keepalive:
+                client.get_transport().set_keepalive(self.keepalive)
+            session = Session(key, client, client.invoke_shell(), self.command_timeout)
+            session.read_prompt()
+            session.channel.send('terminal length 0\n')
+            session.read_prompt()
+        except Exception:
+            client.close()
+            raise
+        self.count('connects')
+        return session
+
+    def _lend(self, session):
+        with self.condition:
+            self.busy.setdefault(session.key, set()).add(session)
+        return session
+
+    def _returned(self, session):
+        """
+        Takes a session off the lent sessions, call with the condition held
+        """
+        sessions = self.busy.get(session.key)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self.busy[session.key]
+
+    def count(self, name):
+        with self.condition:
+            self.stats[name] += 1
+
+    def _close(self, sessions):
+        for s in sessions:
+            try:
+                s.close()
+            except Exception:
+                pass
+
+    def _expire(self, now):
+        """
+        Takes idle sessions past max_idle out of the pool, call with the condition held
+        """
+        expired = list()
+        for key in list(self.idle):
+            sessions = self.idle[key]
+            while sessions and now - sessions[0].last_used >= self.max_idle:
+                expired.append(sessions.pop(0))
+            if not sessions:
+                del self.idle[key]
+        self.open -= len(expired)
+        self.stats['expired'] += len(expired)
+        return expired
+
+    def _evict(self):
+        """
+        Takes the least recently used idle session out of the pool, call with the condition held
+        """
+        sessions = [s for key in self.idle for s in self.idle[key]]
+        if not sessions:
+            return None
+        victim = min(sessions, key=lambda s: s.last_used)
+        self.idle[victim.key].remove(victim)
+        if not self.idle[victim.key]:
+            del self.idle[victim.key]
+        self.open -= 1
+        self.stats['evicted'] += 1
+        return victim
+
+    def acquire(self, host, username, password, timeout=None):
+        """
+        Returns a healthy session to host, reusing an idle one when possible
+        Blocks while max_size sessions are in use
+        """
+        key = (host, username)
+        while True:
+            stale = list()
+            with self.condition:
+                stale.extend(self._expire(time.monotonic()))
+                session = None
+                sessions = self.idle.get(key)
+                if sessions:
+                    # the most recently used session is the most likely to be alive
+                    session = sessions.pop()
+                    if not sessions:
+                        del self.idle[key]
+                else:
+                    while self.open >= self.max_size:
+                        victim = self._evict()
+                        if victim is not None:
+                            stale.append(victim)
+                            continue
+                        if not self.condition.wait(timeout or self.command_timeout):
+                            self._close(stale)
+                            raise socket.timeout('No free SSH session for {} in the pool'.format(host))
+                    self.open += 1
+            self._close(stale)
+            if session is None:
+                try:
+                    session = self.connect(key, password, timeout)
+                except Exception:
+                    self.discard(None)
+                    raise
+                return self._lend(session)
+            if session.alive() and (time.monotonic() - session.last_used < self.keepalive or session.probe()):
+                self.count('reuses')
+                return self._lend(session)
+            self.count('reconnects')
+            self.discard(session)
+
+    def release(self, session):
+        """
+        Puts a session back in the pool, it has to be back at the exec prompt
+        """
+        session.last_used = time.monotonic()
+        session.uses += 1
+        with self.condition:
+            self._returned(session)
+            self.idle.setdefault(session.key, list()).append(session)
+            self.condition.notify()
+
+    def discard(self, session):
+        """
+        Closes a session that is broken or in an unknown state and frees its place in the pool
+        """
+        if session is not None:
+            self._close([session])
+        with self.condition:
+            if session is not None:
+                self._returned(session)
+            self.open -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def session(self, host, username, password, timeout=None):
+        """
+        Lends a session for the duration of the with block, a session whose block raised is closed
+        """
+        session = self.acquire(host, username, password, timeout)
+        try:
+            yield session
+        except BaseException:
+            self.discard(session)
+            raise
+        self.release(session)
+
+    def run(self, host, username, password, fn, timeout=None):
+        """
+        Returns fn(session), retried once on a new session when a reused one turns out to be dead
+        Router calls go through here, see csr1000v.Router.ssh_run
+        """
+        logger = logging.getLogger(__name__)
+        session = self.acquire(host, username, password, timeout)
+        reused = session.uses > 0
+        try:
+            result = fn(session)
+        except CONNECTION_ERRORS as e:
+            # a command timing out on a live session is the command's failure, running it again would not help
+            lost = not isinstance(e, socket.timeout) or not session.alive()
+            self.discard(session)
+            if not reused or not lost or session.aborted:
+                raise
+            logger.warning("SSH session to {} was lost, reconnecting".format(host))
+            logger.error("{}".format(e))
+        except BaseException:
+            self.discard(session)
+            raise
+        else:
+            self.release(session)
+            return result
+        self.count('reconnects')
+        with self.session(host, username, password, timeout) as session:
+            return fn(session)
+
+    def close(self, host=None):
+        """
+        Closes the idle sessions, of one router when host is given
+        """
+        with self.condition:
+            closing = list()
+            for key in list(self.idle):
+                if host is None or key[0] == host:
+                    closing.extend(self.idle.pop(key))
+            self.open -= len(closing)
+            self.condition.notify_all()
+        self._close(closing)
+
+    def abort(self, host):
+        """
+        Closes every session to a router, also those in use. A call waiting on one of them fails instead of
+        holding it until ssh_command_timeout, and is not retried on a new session
+        Used when fleet.Fleet stops waiting for a router's job
+        """
+        with self.condition:
+            aborted = [s for key in self.busy if key[0] == host for s in self.busy[key]]
+            for s in aborted:
+                s.aborted = True
+            self.stats['aborted'] += len(aborted)
+        self._close(aborted)
+        self.close(host)
+        return len(aborted)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """
+    Returns the pool shared by the Routers of this process, built from Settings on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SSHSessionPool.from_settings(Settings())
+        return _pool
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import threading
+import unittest
+from benchmarks.topology import generate_topology
+from cache import ResponseCache
+from fake_network import FakeNetworkFactory, FakeNetworkManagementClient
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.vnets = generate_topology(20)
+        self.client = FakeNetworkManagementClient(self.vnets)
+        self.cache = ResponseCache()
+        self.network = FakeNetworkFactory(self.client, cache=self.cache).network()
+        self.silb = self.vnets[0]
+        self.rg = self.silb.id.split('/')[4]
+
+    def get(self):
+        return self.network.virtual_networks.get(self.rg, self.silb.name)
+
+    def test_gets_are_cached(self):
+        self.assertEqual(self.get().id, self.silb.id)
+        self.get()
+        self.assertEqual(self.client.calls['virtual_networks.get'], 1)
+        self.assertEqual((self.cache.stats['hits'], self.cache.stats['misses']), (1, 1))
+
+    def test_callers_get_copies(self):
+        first = self.get()
+        first.tags['changed'] = 'True'
+        first.virtual_network_peerings.clear()
+        second = self.get()
+        self.assertNotIn('changed', second.tags)
+        self.assertEqual(len(second.virtual_network_peerings), len(self.silb.virtual_network_peerings))
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_child_writes_invalidate_the_parent(self):
+        before = len(self.get().virtual_network_peerings)
+        self.network.virtual_network_peerings.create_or_update(
+            self.rg, self.silb.name, 'new', {'remote_virtual_network': {'id': self.vnets[1].id}})
+        self.assertEqual(len(self.get().virtual_network_peerings), before + 1)
+        self.assertEqual(self.client.calls['virtual_networks.get'], 2)
+
+    def test_writes_elsewhere_keep_the_entry(self):
+        self.get()
+        other = self.vnets[1]
+        self.network.virtual_network_peerings.create_or_update(
+            other.id.split('/')[4], other.name, 'new', {'remote_virtual_network': {'id': self.silb.id}})
+        self.get()
+        self.assertEqual(self.client.calls['virtual_networks.get'], 1)
+
+    def test_newer_etags_drop_entries(self):
+        cache = ResponseCache(ttl=300)
+        network = FakeNetworkFactory(self.client, cache=cache).network()
+        network.virtual_networks.get(self.rg, self.silb.name)
+        stored = self.client.vnets[self.silb.id]
+        cache.new_cycle([stored])
+        network.virtual_networks.get(self.rg, self.silb.name)
+        self.assertEqual(self.client.calls['virtual_networks.get'], 1)
+        self.client.touch(stored)
+        cache.new_cycle([stored])
+        self.assertEqual(network.virtual_networks.get(self.rg, self.silb.name).etag, stored.etag)
+        self.assertEqual(self.client.calls['virtual_networks.get'], 2)
+
+    def test_new_cycle_without_ttl_clears(self):
+        self.get()
+        self.cache.new_cycle()
+        self.get()
+        self.assertEqual(self.client.calls['virtual_networks.get'], 2)
+
+    def test_invalidate_id(self):
+        self.get()
+        self.cache.invalidate_id(self.silb.id.upper())
+        self.get()
+        self.assertEqual(self.client.calls['virtual_networks.get'], 2)
+
+    def test_concurrent_gets_are_coalesced(self):
+        self.client.latency = 0.2
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(self.get())) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(self.client.calls['virtual_networks.get'], 1)
+        self.assertEqual(self.cache.stats['coalesced'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import socket
+import unittest
+from cli_engine import CLIEngine, CLITimeout
+from fake_router import FakeRouter, FakeShell
+
+
+class CLIEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.router = FakeRouter()
+        self.shell = FakeShell(self.router)
+        # the login banner and first prompt
+        self.shell.recv(9999)
+        self.engine = CLIEngine(self.shell, command_timeout=1.0, chunk_size=3)
+
+    def test_configure_applies_lines(self):
+        lines = ['hostname edge', 'interface GigabitEthernet2', ' ip address 10.0.0.4 255.255.255.0', '!',
+                 ' no shutdown', 'ip route 0.0.0.0 0.0.0.0 10.0.0.1']
+        results = self.engine.configure(lines)
+        self.assertEqual([r.line for r in results], [line for line in lines if line != '!'])
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(self.router.running, [line for line in lines if line != '!'])
+        self.assertEqual(self.router.hostname, 'edge')
+        self.assertFalse(self.engine.in_config_mode())
+        self.assertEqual(self.engine.last_prompt, b'edge#')
+
+    def test_rejected_lines_carry_the_error(self):
+        results = self.engine.configure(['hostname edge', 'bogus command', 'ip domain name example.com'])
+        self.assertEqual([r.ok for r in results], [True, False, True])
+        self.assertTrue(results[1].error.startswith('% Invalid input'))
+        self.assertEqual(self.router.running, ['hostname edge', 'ip domain name example.com'])
+
+    def test_stop_on_error_stops_after_the_chunk(self):
+        lines = ['bogus one', 'hostname a', 'hostname b', 'hostname c', 'hostname d']
+        results = self.engine.configure(lines, stop_on_error=True)
+        # configure terminal and the first two lines share the first chunk
+        self.assertEqual([r.line for r in results], lines[:2])
+        self.assertNotIn('hostname c', self.router.running)
+        self.assertFalse(self.engine.in_config_mode())
+
+    def test_run_splits_output_by_prompt(self):
+        self.engine.configure(['hostname edge'])
+        result = self.engine.run('show running-config')
+        self.assertTrue(result.ok)
+        self.assertNotIn('show running-config', result.output)
+        self.assertNotIn('edge#', result.output)
+        self.assertIn('hostname edge', result.output.splitlines())
+        self.assertIn('16.10', self.engine.run('show version').output)
+
+    def test_wr_mem_saves(self):
+        self.engine.configure(['hostname edge'])
+        self.engine.run('wr mem')
+        self.assertEqual(self.router.saved, ['hostname edge'])
+
+    def test_unanswered_line_times_out(self):
+        self.engine.run('show version')
+        # the router stops answering
+        self.shell.sendall = lambda data: len(data)
+        with self.assertRaises(CLITimeout) as raised:
+            self.engine.run('show version')
+        self.assertIsInstance(raised.exception, socket.timeout)
+
+    def test_closed_session(self):
+        self.shell.close()
+        with self.assertRaises(EOFError):
+            self.engine.run('show version')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+from config_diff import config_lines, delta, parse
+
+RUNNING = """Building configuration...
+
+Current configuration : 1234 bytes
+!
+! Last configuration change at 10:00:00 UTC Mon Jan 1 2019
+!
+version 16.10
+hostname edge
+!
+interface GigabitEthernet1
+ ip address dhcp
+ negotiation auto
+!
+interface GigabitEthernet2
+ ip address 10.0.0.4 255.255.255.0
+ shutdown
+!
+router bgp 65001
+ neighbor 10.1.0.4 remote-as 65002
+ address-family ipv4
+  network 10.0.0.0 mask 255.255.0.0
+ exit-address-family
+!
+end
+""".splitlines()
+
+
+class DeltaTest(unittest.TestCase):
+    def test_running_config_noise_is_skipped(self):
+        root = parse(RUNNING)
+        self.assertEqual(list(root.children), ['hostname edge', 'interface GigabitEthernet1',
+                                               'interface GigabitEthernet2', 'router bgp 65001'])
+        self.assertEqual(list(root.lines())[-2:], ['  network 10.0.0.0 mask 255.255.0.0', ' exit-address-family'])
+
+    def test_configured_lines_are_not_sent(self):
+        wanted = ['hostname edge', '!', 'interface GigabitEthernet2', ' ip address 10.0.0.4 255.255.255.0']
+        self.assertEqual(delta(RUNNING, wanted), [])
+
+    def test_missing_lines_come_with_their_parents(self):
+        wanted = ['interface GigabitEthernet1', ' ip address dhcp', ' description outside',
+                  'router bgp 65001', ' address-family ipv4', '  network 10.2.0.0 mask 255.255.0.0']
+        self.assertEqual(delta(RUNNING, wanted), ['interface GigabitEthernet1', ' description outside',
+                                                  'router bgp 65001', ' address-family ipv4',
+                                                  '  network 10.2.0.0 mask 255.255.0.0'])
+
+    def test_new_blocks_are_sent_whole(self):
+        wanted = ['interface Tunnel1', ' ip unnumbered GigabitEthernet1', ' tunnel mode ipsec ipv4']
+        self.assertEqual(delta(RUNNING, wanted), wanted)
+
+    def test_no_lines(self):
+        wanted = ['interface GigabitEthernet2', ' no shutdown', 'interface GigabitEthernet1', ' no shutdown']
+        # GigabitEthernet1 is not shut down, so its no shutdown is already in place
+        self.assertEqual(delta(RUNNING, wanted), ['interface GigabitEthernet2', ' no shutdown'])
+
+    def test_running_lines_not_in_the_template_are_left_alone(self):
+        self.assertEqual(delta(RUNNING, ['hostname edge']), [])
+
+    def test_config_lines(self):
+        self.assertEqual(config_lines(['hostname edge  ', '', ' !', '!', ' ip address dhcp']),
+                         ['hostname edge', ' ip address dhcp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+from benchmarks.topology import PROGRAM_KEY, generate_topology
+from config import Settings
+from discovery import FakeDiscovery, FallbackDiscovery, ListAllDiscovery, make_discovery, vnet_from_row
+from fake_network import FakeNetworkFactory, FakeNetworkManagementClient
+
+
+class DiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.vnets = generate_topology(250)
+        self.client = FakeNetworkManagementClient(self.vnets, page_size=100)
+        self.factory = FakeNetworkFactory(self.client)
+
+    def test_list_all_keeps_tagged_vnets_only(self):
+        records = ListAllDiscovery(self.factory, PROGRAM_KEY).vnets()
+        tagged = [v.id for v in self.vnets if PROGRAM_KEY in v.tags]
+        self.assertEqual([r.id for r in records], tagged)
+        self.assertEqual(self.client.calls['virtual_networks.list_all'], 3)
+        silb = records[0]
+        self.assertEqual(silb.tags['tvpc_silb_vnet'], 'True')
+        self.assertEqual(len(silb.virtual_network_peerings), len(self.vnets[0].virtual_network_peerings))
+
+    def test_fallback_on_failure(self):
+        primary = FakeDiscovery(self.vnets[:3], available=False)
+        fallback = FakeDiscovery(self.vnets[3:5])
+        discovery = FallbackDiscovery(primary, fallback)
+        self.assertEqual(discovery.vnets(), self.vnets[3:5])
+        self.assertEqual((primary.calls, fallback.calls), (1, 1))
+        primary.available = True
+        self.assertEqual(discovery.vnets(), self.vnets[:3])
+        self.assertEqual(fallback.calls, 1)
+
+    def test_resource_graph_falls_back_on_list_all(self):
+        class ResourceGraphSettings(Settings):
+            poller_discovery = 'resource_graph'
+        discovery = make_discovery(ResourceGraphSettings, self.factory)
+        self.assertEqual([r.id for r in discovery.vnets()],
+                         [r.id for r in ListAllDiscovery(self.factory, PROGRAM_KEY).vnets()])
+
+
+    def test_resource_graph_rows(self):
+        silb = self.vnets[0]
+        row = {'id': silb.id, 'name': silb.name, 'location': silb.location,
+               'tags': dict(silb.tags, owner='someone'),
+               'peerings': [{'name': x.name, 'properties': {'remoteVirtualNetwork': {'id': x.remote_virtual_network.id},
+                                                            'peeringState': x.peering_state}}
+                            for x in silb.virtual_network_peerings]}
+        record = vnet_from_row(row, PROGRAM_KEY)
+        listed = ListAllDiscovery(self.factory, PROGRAM_KEY).vnets()[0]
+        self.assertEqual((record.id, record.name, record.location, record.tags, record.etag),
+                         (listed.id, listed.name, listed.location, listed.tags, None))
+        self.assertEqual([(x.name, x.remote_virtual_network.id, x.peering_state)
+                          for x in record.virtual_network_peerings],
+                         [(x.name, x.remote_virtual_network.id, x.peering_state)
+                          for x in listed.virtual_network_peerings])
+        self.assertNotIn('owner', record.tags)
+
+
+if __name__ == '__main__':
+    unittest.main()
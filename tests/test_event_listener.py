@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import json
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from benchmarks.bench_poller_cycle import build_network
+from cache import ResponseCache
+from config import Settings
+from discovery import ListAllDiscovery
+from event_listener import EventListener, EventQueue, EventReconciler, post_events, vnet_id_from_resource
+from fake_network import FakeNetworkFactory
+
+
+class EventQueueTest(unittest.TestCase):
+    def test_bursts_are_taken_together(self):
+        queue = EventQueue(debounce=0.05)
+        queue.add(['a'], received=10.0)
+        queue.add(['b', 'a'], received=5.0)
+        self.assertEqual(queue.take(1.0), {'a': 5.0, 'b': 5.0})
+        start = time.monotonic()
+        self.assertEqual(queue.take(0.05), {})
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_steady_events_do_not_starve_take(self):
+        queue = EventQueue(debounce=0.1, max_wait=0.3)
+        stop = threading.Event()
+
+        def stream():
+            n = 0
+            while not stop.is_set():
+                queue.add(['vnet{}'.format(n)])
+                n += 1
+                time.sleep(0.01)
+        thread = threading.Thread(target=stream)
+        thread.start()
+        try:
+            time.sleep(0.02)
+            start = time.monotonic()
+            batch = queue.take(5.0)
+            waited = time.monotonic() - start
+            self.assertTrue(batch)
+            self.assertLess(waited, 1.0)
+            # the timeout bounds a batch as well, the full scan fallback is not held up
+            queue.max_wait = 60.0
+            start = time.monotonic()
+            self.assertTrue(queue.take(0.3))
+            self.assertLess(time.monotonic() - start, 1.0)
+        finally:
+            stop.set()
+            thread.join()
+
+
+class EventListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = EventQueue(debounce=0.0)
+        self.listener = EventListener(self.queue, port=0, host='127.0.0.1', token='secret').start()
+
+    def tearDown(self):
+        self.listener.stop()
+
+    def post(self, events, code='secret'):
+        request = urllib.request.Request('{}?code={}'.format(self.listener.url, code), json.dumps(events).encode(),
+                                         {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def test_validation_handshake(self):
+        event = {'eventType': 'Microsoft.EventGrid.SubscriptionValidationEvent', 'data': {'validationCode': 'xyz'}}
+        self.assertEqual(self.post([event]), {'validationResponse': 'xyz'})
+
+    def test_events_queue_their_vnet(self):
+        vnet = '/subscriptions/s/resourceGroups/rg/providers/Microsoft.Network/virtualNetworks/v'
+        self.assertEqual(vnet_id_from_resource(vnet + '/virtualNetworkPeerings/p'), vnet)
+        self.assertIsNone(vnet_id_from_resource('/subscriptions/s/resourceGroups/rg'))
+        self.assertEqual(post_events(self.listener.url + '?code=secret', [vnet + '/subnets/a']), {'accepted': 1})
+        self.assertEqual(list(self.queue.take(1.0)), [vnet])
+
+    def test_wrong_code_is_rejected(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.post([], code='wrong')
+        self.assertEqual(raised.exception.code, 401)
+
+
+class EventReconcilerTest(unittest.TestCase):
+    def setUp(self):
+        self.client = build_network(500, Settings)
+        self.factory = FakeNetworkFactory(self.client, cache=ResponseCache())
+        self.reconciler = EventReconciler(self.factory, Settings, ListAllDiscovery(self.factory,
+                                                                                   Settings.tvpc_program_key))
+        # the first scan peers the generated topology, the second one starts from the converged network
+        self.assertEqual(self.reconciler.full_scan(), set())
+        self.assertEqual(self.reconciler.full_scan(), set())
+        self.silb = next(v for v in self.client.vnets.values() if v.tags.get('tvpc_silb_vnet') == 'True')
+        self.participant = next(v for v in self.client.vnets.values()
+                                if v.tags.get(Settings.tvpc_program_key) == self.silb.tags[Settings.tvpc_program_key]
+                                and v.location == self.silb.location and v.remotes.get(self.silb.id))
+
+    def route_reads(self, vnet_id):
+        before = self.client.calls['routes.list']
+        results = self.reconciler.reconcile_events({vnet_id: time.time()})
+        self.assertTrue(all(r.ok for r in results), [r.error for r in results if not r.ok])
+        return self.client.calls['routes.list'] - before
+
+    def test_participant_event_verifies_its_route(self):
+        self.assertEqual(self.route_reads(self.participant.id), 1)
+
+    def test_silb_peering_writes_do_not_verify_every_route(self):
+        # our own write to the SILB side of a peering changes its etag, not its tags
+        self.client.touch(self.silb)
+        self.assertEqual(self.route_reads(self.silb.id), 0)
+
+    def test_retagged_silb_moves_the_next_hops(self):
+        self.silb.tags['tvpc_silb_private_address'] = '10.0.0.5'
+        self.client.touch(self.silb)
+        self.assertGreater(self.route_reads(self.silb.id), 1)
+        table = self.client.table(self.participant.resource_group_name, Settings.private_route_table_name)
+        self.assertEqual(table[Settings.default_route_name].next_hop_ip_address, '10.0.0.5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import threading
+import time
+import unittest
+from benchmarks.topology import generate_topology
+from config import Settings
+from executor import OrderedExecutor
+from fake_network import FakeNetworkError, FakeNetworkFactory, FakeNetworkManagementClient
+from reconcile import apply, apply_ops, plan
+from throttle import RequestScheduler
+from udr import RouteManager
+
+
+class OrderedExecutorTest(unittest.TestCase):
+    def test_jobs_of_a_key_run_in_order(self):
+        done = list()
+
+        def job(key, n):
+            time.sleep(0.01 * (3 - n))
+            done.append((key, n))
+        executor = OrderedExecutor(max_workers=4)
+        for key in ('a', 'b'):
+            for n in range(3):
+                executor.submit(key, 'Job {} {}'.format(key, n), job, key, n)
+        self.assertEqual(len(executor), 6)
+        results = executor.run()
+        self.assertEqual([(r.key, r.ok) for r in results], [('a', True)] * 3 + [('b', True)] * 3)
+        self.assertEqual([n for key, n in done if key == 'a'], [0, 1, 2])
+        self.assertEqual([n for key, n in done if key == 'b'], [0, 1, 2])
+        self.assertEqual(len(executor), 0)
+
+    def test_keys_run_in_parallel(self):
+        barrier = threading.Barrier(4, timeout=5)
+        executor = OrderedExecutor(max_workers=4)
+        for key in range(4):
+            executor.submit(key, 'Wait for the others', barrier.wait)
+        self.assertTrue(all(r.ok for r in executor.run()))
+
+    def test_failures_are_recorded(self):
+        def fail():
+            raise ValueError('boom')
+        executor = OrderedExecutor(max_workers=2)
+        executor.submit('a', 'Fail', fail)
+        executor.submit('a', 'Run after the failure', lambda: None)
+        executor.submit('b', 'Run beside it', lambda: None)
+        results = executor.run()
+        self.assertEqual([r.ok for r in results], [False, True, True])
+        self.assertEqual(str(results[0].error), 'boom')
+        self.assertEqual(executor.run(), [])
+
+
+class ConcurrentPeeringTest(unittest.TestCase):
+    def setUp(self):
+        # every participant is new and peers with the one SILB
+        vnets = generate_topology(24, clusters=('dev',), locations=('eastus',), peered_fraction=0.0,
+                                  untagged_fraction=0.0)
+        self.client = FakeNetworkManagementClient(vnets, latency=0.005)
+        for v in vnets[1:]:
+            self.client.add_route_table(v.id.split('/')[4], Settings.private_route_table_name)
+        self.factory = FakeNetworkFactory(self.client)
+        self.plan = plan(vnets, Settings)
+
+    def test_silb_peering_writes_do_not_collide(self):
+        results = apply(self.plan, self.factory, OrderedExecutor(8))
+        self.assertEqual(len(results), 24)
+        self.assertTrue(all(r.ok for r in results), [r.error for r in results if not r.ok])
+        self.assertEqual(self.client.conflicts, 0)
+        self.assertEqual(len(plan(list(self.client.virtual_networks.list_all()), Settings)), 0)
+
+    def test_unserialized_writes_collide(self):
+        routes = RouteManager(self.factory)
+        executor = OrderedExecutor(8)
+        for key, ops in self.plan.by_key().items():
+            executor.submit(key, 'Apply', apply_ops, self.factory, routes, *ops)
+        results = executor.run()
+        self.assertGreater(self.client.conflicts, 0)
+        self.assertIn(409, [r.error.status_code for r in results if not r.ok])
+
+
+class ConflictRetryTest(unittest.TestCase):
+    def test_operation_in_progress_is_retried(self):
+        attempts = list()
+
+        def write():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise FakeNetworkError(409, 'AnotherOperationInProgress: busy')
+            return 'ok'
+        scheduler = RequestScheduler(base_delay=0.001)
+        self.assertEqual(scheduler.write(write), 'ok')
+        self.assertEqual(scheduler.stats['retries'], 2)
+
+    def test_other_conflicts_are_not_retried(self):
+        def write():
+            raise FakeNetworkError(409, 'InUseSubnetCannotBeDeleted')
+        scheduler = RequestScheduler(base_delay=0.001)
+        with self.assertRaises(FakeNetworkError):
+            scheduler.write(write)
+        self.assertEqual(scheduler.stats['retries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import time
+import unittest
+from csr1000v import Router
+from fake_router import FakeRouter, FakeShell, FakeSSHClient
+from fleet import Fleet, format_results
+from ssh_pool import Session, SSHSessionPool
+
+
+class FakeSessionPool(SSHSessionPool):
+    """
+    Pool whose sessions are FakeShells of FakeRouters, host -> (FakeRouter, rtt)
+    """
+    def __init__(self, routers, **kwargs):
+        SSHSessionPool.__init__(self, **kwargs)
+        self.routers = routers
+
+    def connect(self, key, password, timeout=None):
+        router, rtt = self.routers[key[0]]
+        shell = FakeShell(router, rtt)
+        session = Session(key, FakeSSHClient(shell), shell, self.command_timeout)
+        session.read_prompt()
+        self.count('connects')
+        return session
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        # the last router answers every line a minute late
+        self.devices = dict(('10.0.0.{}'.format(n), (FakeRouter(), 60.0 if n == 3 else 0.0)) for n in range(1, 4))
+        self.pool = FakeSessionPool(self.devices)
+        self.routers = [Router(host, 'admin', 'admin', 'eastus', pool=self.pool) for host in sorted(self.devices)]
+
+    def test_results_are_in_job_order(self):
+        results = Fleet(max_workers=2, retries=0).configure([(r, [['hostname edge']]) for r in self.routers[:2]])
+        self.assertEqual([(r.host, r.status) for r in results], [('10.0.0.1', 'ok'), ('10.0.0.2', 'ok')])
+        self.assertEqual(self.devices['10.0.0.1'][0].saved, ['hostname edge'])
+        self.assertIn('2 of 2 routers ok', format_results(results))
+
+    def test_failed_jobs_are_retried(self):
+        calls = list()
+
+        def flaky(router, payload):
+            calls.append(router.public_ip)
+            if len(calls) == 1:
+                raise RuntimeError('connection reset')
+            return True
+        results = Fleet(retries=1, retry_delay=0.0).run([(self.routers[0], None)], flaky)
+        self.assertEqual((results[0].status, results[0].attempts), ('ok', 2))
+
+    def test_timed_out_routers_give_their_sessions_back(self):
+        start = time.monotonic()
+        results = Fleet(timeout=0.2, retries=0).configure([(r, [['hostname edge']]) for r in self.routers])
+        self.assertLess(time.monotonic() - start, 5.0)
+        self.assertEqual([r.status for r in results], ['ok', 'ok', 'timeout'])
+        # the timed out job fails on its closed session instead of holding it for ssh_command_timeout
+        deadline = time.monotonic() + 5.0
+        while self.pool.busy and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.pool.busy, {})
+        self.assertEqual(self.pool.stats['aborted'], 1)
+        self.assertEqual(self.pool.stats['connects'], 3)
+        self.assertEqual(self.pool.open, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from config import Settings
+from lease import FileLeaseBackend, LeaderElector, ShardLeases, make_coordinator, replica_path, shard_of
+
+
+class LeaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.backend = FileLeaseBackend(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class FileLeaseBackendTest(LeaseTestCase):
+    def test_one_holder_at_a_time(self):
+        self.assertTrue(self.backend.acquire('leader', 'a', 15))
+        self.assertFalse(self.backend.acquire('leader', 'b', 15))
+        self.assertTrue(self.backend.acquire('leader', 'a', 15))
+        self.backend.release('leader', 'b')
+        self.assertEqual(self.backend.leases(), {'leader': 'a'})
+        self.backend.release('leader', 'a')
+        self.assertTrue(self.backend.acquire('leader', 'b', 15))
+
+    def test_expired_leases_are_taken_over(self):
+        self.assertTrue(self.backend.acquire('shards/1', 'a', 0.05))
+        time.sleep(0.1)
+        self.assertEqual(self.backend.leases('shards/'), {})
+        self.assertTrue(self.backend.acquire('shards/1', 'b', 15))
+
+
+class LeaderElectorTest(LeaseTestCase):
+    def test_standby_takes_over_from_a_stopped_leader(self):
+        first = LeaderElector(self.backend, 'a')
+        second = LeaderElector(self.backend, 'b')
+        first.step()
+        second.step()
+        self.assertTrue(first.is_active())
+        self.assertFalse(second.is_active())
+        first.release()
+        second.step()
+        self.assertTrue(second.is_active())
+        self.assertTrue(second.wait(0))
+
+
+class ShardLeasesTest(LeaseTestCase):
+    def test_replicas_split_the_shards(self):
+        replicas = [ShardLeases(self.backend, name, shards=8) for name in ('a', 'b')]
+        replicas[0].step()
+        self.assertEqual(len(replicas[0].owned), 8)
+        for _ in range(2):
+            for r in replicas:
+                r.step()
+        self.assertEqual([len(r.owned) for r in replicas], [4, 4])
+        self.assertEqual(replicas[0].owned | replicas[1].owned, frozenset(range(8)))
+        key = ('dev', 'eastus')
+        self.assertEqual([r.owns(key) for r in replicas].count(True), 1)
+        self.assertIn(shard_of(key, 8), [r for r in replicas if r.owns(key)][0].owned)
+        # shards of a failed replica move back after its leases expire, of a stopped one right away
+        replicas[1].release()
+        replicas[0].step()
+        self.assertEqual(len(replicas[0].owned), 8)
+
+
+class CoordinatorTest(LeaseTestCase):
+    def settings(self, **values):
+        attributes = dict(poller_lease_backend='file', poller_lease_path=self.path)
+        attributes.update(values)
+        return type('LeaseSettings', (Settings,), attributes)
+
+    def test_snapshot_name_survives_restarts(self):
+        coordinator = make_coordinator(self.settings(poller_replica_id=None))
+        self.assertEqual(coordinator.replica, socket.gethostname())
+        self.assertEqual(coordinator.holder, '{}-{}'.format(socket.gethostname(), os.getpid()))
+        self.assertEqual(replica_path('/var/tvpc/snapshot.db', 'host:1'), '/var/tvpc/snapshot.host_1.db')
+
+    def test_replica_id(self):
+        coordinator = make_coordinator(self.settings(poller_replica_id='replica-1', poller_lease_shards=4))
+        self.assertIsInstance(coordinator, ShardLeases)
+        self.assertEqual((coordinator.replica, coordinator.holder), ('replica-1', 'replica-1'))
+        self.assertIsNone(make_coordinator(self.settings(poller_lease_backend=None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+from licensing import Registration, format_registrations, parse_license_status, run_registrations
+
+HEADER = """Smart Licensing is ENABLED
+
+Utility:
+  Status: DISABLED
+
+Data Privacy:
+  Sending Hostname: yes
+"""
+
+REGISTERED = HEADER + """
+Registration:
+  Status: REGISTERED
+  Smart Account: Example
+  Initial Registration: SUCCEEDED on Jan 01 10:00:00 2019 UTC
+
+License Authorization:
+  Status: AUTHORIZED on Jan 01 10:00:05 2019 UTC
+"""
+
+REGISTERING = HEADER + """
+Registration:
+  Status: REGISTERING - REGISTRATION IN PROGRESS
+  Export-Controlled Functionality: NOT ALLOWED
+
+License Authorization:
+  Status: EVAL MODE
+"""
+
+FAILED = HEADER + """
+Registration:
+  Status: UNREGISTERED - REGISTRATION FAILED
+  Export-Controlled Functionality: NOT ALLOWED
+  Last Registration Attempt: FAILED on Jan 01 10:00:00 2019 UTC
+    Failure reason: Fail to send out Call Home HTTP message.
+
+License Authorization:
+  Status: EVAL MODE
+"""
+
+# sent again after a failure, the last attempt still reads FAILED while the new one is in progress
+RETRYING = HEADER + """
+Registration:
+  Status: REGISTERING - REGISTRATION IN PROGRESS
+  Last Registration Attempt: FAILED on Jan 01 10:00:00 2019 UTC
+    Failure reason: Fail to send out Call Home HTTP message.
+
+License Authorization:
+  Status: EVAL MODE
+"""
+
+UNREGISTERED = HEADER + """
+Registration:
+  Status: UNREGISTERED
+
+License Authorization:
+  Status: EVAL MODE
+"""
+
+DISABLED = """Smart Licensing is DISABLED
+"""
+
+
+class StubRouter:
+    """
+    Answers license_status with the given show license status outputs in turn, the last one repeats
+    """
+    def __init__(self, outputs, public_ip='10.0.0.1', accept=True):
+        self.public_ip = public_ip
+        self.outputs = list(outputs)
+        self.accept = accept
+        self.configured = list()
+        self.commands = list()
+
+    def configure_router(self, lines):
+        self.configured.append(list(lines))
+        return self.accept
+
+    def run_command(self, command):
+        self.commands.append(command)
+        return ''
+
+    def license_status(self):
+        output = self.outputs.pop(0) if len(self.outputs) > 1 else self.outputs[0]
+        return parse_license_status(output)
+
+
+def registration(router, **kwargs):
+    kwargs.setdefault('poll_initial', 0.001)
+    kwargs.setdefault('poll_max', 0.01)
+    kwargs.setdefault('timeout', 5)
+    return Registration(router, **kwargs)
+
+
+class ParseLicenseStatusTest(unittest.TestCase):
+    def test_registered(self):
+        status = parse_license_status(REGISTERED)
+        self.assertTrue(status.enabled)
+        self.assertEqual(status.registration, 'REGISTERED')
+        self.assertTrue(status.registered and status.authorized)
+        self.assertFalse(status.pending or status.failed)
+        self.assertEqual(status.state, 'authorized')
+
+    def test_registering(self):
+        status = parse_license_status(REGISTERING)
+        self.assertTrue(status.pending)
+        self.assertFalse(status.registered or status.failed)
+        self.assertEqual(status.state, 'pending')
+
+    def test_failed(self):
+        status = parse_license_status(FAILED)
+        self.assertTrue(status.failed)
+        self.assertFalse(status.pending)
+        self.assertEqual(status.reason, 'Fail to send out Call Home HTTP message.')
+        self.assertEqual(status.state, 'failed')
+
+    def test_stale_failed_attempt_while_registering_is_pending(self):
+        status = parse_license_status(RETRYING)
+        self.assertTrue(status.pending)
+        self.assertFalse(status.failed)
+        self.assertEqual(status.state, 'pending')
+
+    def test_unregistered(self):
+        status = parse_license_status(UNREGISTERED)
+        self.assertFalse(status.registered or status.pending or status.failed)
+        self.assertEqual(status.state, 'unregistered')
+
+    def test_disabled(self):
+        status = parse_license_status(DISABLED)
+        self.assertFalse(status.enabled)
+        self.assertEqual(status.state, 'disabled')
+        self.assertFalse(parse_license_status('').enabled)
+
+
+class RegistrationTest(unittest.TestCase):
+    def test_registers(self):
+        router = StubRouter([UNREGISTERED, REGISTERING, REGISTERED])
+        r = registration(router, configure_lines=['call-home'], register_commands=['license smart register x'],
+                         enable_lines=['license boot level ax'])
+        self.assertTrue(r.run())
+        self.assertEqual(router.configured, [['call-home'], ['license boot level ax']])
+        self.assertEqual(router.commands, ['license smart register x'])
+        self.assertEqual((r.state, r.attempts, r.polls), ('done', 1, 3))
+        self.assertIsNotNone(r.latency)
+
+    def test_failed_registration_is_sent_again(self):
+        router = StubRouter([FAILED, RETRYING, RETRYING, REGISTERED])
+        r = registration(router, register_commands=['license smart register x'], retries=1)
+        self.assertTrue(r.run())
+        self.assertEqual(r.attempts, 2)
+        self.assertEqual(len(router.commands), 2)
+
+    def test_retries_run_out(self):
+        router = StubRouter([FAILED])
+        r = registration(router, register_commands=['license smart register x'], retries=1)
+        self.assertFalse(r.run())
+        self.assertEqual(r.attempts, 2)
+        self.assertEqual(r.error, 'Fail to send out Call Home HTTP message.')
+
+    def test_rejected_configuration(self):
+        router = StubRouter([REGISTERED], accept=False)
+        r = registration(router, configure_lines=['call-home'], register_commands=['license smart register x'])
+        self.assertFalse(r.run())
+        self.assertEqual(router.commands, [])
+
+    def test_waits_for_a_registration_in_progress(self):
+        r = registration(StubRouter([REGISTERING, REGISTERING, REGISTERED]))
+        self.assertTrue(r.run())
+        self.assertEqual(r.polls, 3)
+
+    def test_nothing_registering_fails_at_once(self):
+        r = registration(StubRouter([UNREGISTERED]), timeout=60)
+        self.assertFalse(r.run())
+        self.assertEqual((r.polls, r.error), (1, 'smart licensing unregistered'))
+
+    def test_timeout(self):
+        r = registration(StubRouter([REGISTERING]), register_commands=['license smart register x'], timeout=0.05)
+        self.assertFalse(r.run())
+        self.assertTrue(r.error.startswith('not registered within'))
+
+    def test_errors_fail_the_registration(self):
+        router = StubRouter([REGISTERED])
+        router.license_status = lambda: 1 / 0
+        r = registration(router)
+        self.assertFalse(r.run())
+        self.assertEqual(r.state, 'failed')
+
+
+class RunRegistrationsTest(unittest.TestCase):
+    def test_many_routers(self):
+        registrations = [registration(StubRouter([REGISTERING, REGISTERED], '10.0.0.{}'.format(n)),
+                                      register_commands=['license smart register x']) for n in range(20)]
+        registrations.append(registration(StubRouter([FAILED], '10.0.1.1'), register_commands=['x'], retries=0))
+        self.assertIs(run_registrations(registrations, max_workers=4), registrations)
+        self.assertEqual([r.ok for r in registrations], [True] * 20 + [False])
+        table = format_registrations(registrations)
+        self.assertTrue(table.endswith('20 of 21 routers registered'))
+        self.assertIn('10.0.1.1', table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+import urllib.request
+from metrics import MetricsServer, PollerMetrics, Registry
+
+
+class RegistryTest(unittest.TestCase):
+    def test_exposition_format(self):
+        registry = Registry()
+        calls = registry.counter('calls_total', 'Calls', ('operation',))
+        latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        calls.inc(operation='get')
+        calls.inc(2, operation='say "hi"')
+        latency.observe(0.5)
+        lines = registry.render().splitlines()
+        self.assertIn('calls_total{operation="get"} 1', lines)
+        self.assertIn('calls_total{operation="say \\"hi\\""} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn('latency_seconds_count 1', lines)
+
+
+class PollerMetricsTest(unittest.TestCase):
+    def test_apply_is_split_into_operation_phases(self):
+        metrics = PollerMetrics()
+        with metrics.phase('apply'):
+            for name in ('create_peering', 'create_peering', 'delete_peering', 'add_udr'):
+                with metrics.operation(name):
+                    pass
+            with self.assertRaises(ValueError):
+                with metrics.operation('remove_udr'):
+                    raise ValueError('failed')
+        phases = dict((s['labels']['phase'], s['count']) for s in metrics.phase_seconds.snapshot())
+        self.assertEqual(phases, {'apply': 1, 'create': 1, 'delete': 1, 'route': 1})
+        operations = dict((s['labels']['operation'], s['count']) for s in metrics.operation_seconds.snapshot())
+        self.assertEqual(operations['create_peering'], 2)
+        results = dict(((s['labels']['operation'], s['labels']['result']), s['value'])
+                       for s in metrics.operations.snapshot())
+        self.assertEqual(results[('remove_udr', 'error')], 1)
+        # the next apply starts from nothing
+        with metrics.phase('apply'):
+            pass
+        phases = dict((s['labels']['phase'], s['count']) for s in metrics.phase_seconds.snapshot())
+        self.assertEqual(phases, {'apply': 2, 'create': 1, 'delete': 1, 'route': 1})
+
+    def test_request_observer(self):
+        metrics = PollerMetrics()
+        for status in ('ok', 429, 500):
+            metrics.observe_request('write', 'routes.create_or_update', 0.1, status)
+        self.assertEqual(metrics.arm_throttled.snapshot(), [{'labels': {'kind': 'write'}, 'value': 1}])
+        self.assertEqual(metrics.arm_errors.snapshot()[0]['value'], 1)
+
+
+class MetricsServerTest(unittest.TestCase):
+    def test_serves_metrics_on_loopback(self):
+        metrics = PollerMetrics()
+        metrics.end_cycle(1.5)
+        server = MetricsServer(metrics.registry, port=0).start()
+        try:
+            host, port = server.server.server_address[:2]
+            self.assertEqual(host, '127.0.0.1')
+            body = urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(port), timeout=5).read()
+            self.assertIn(b'azure_poller_last_cycle_seconds 1.5', body)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import socket
+import threading
+import unittest
+from readiness import Backoff, ReadinessProbe, format_readiness, read_banner, tcp_open, wait_ready
+
+
+class BannerServer:
+    """
+    Accepts connections on a local port and sends them banner, nothing when banner is None
+    """
+    def __init__(self, banner=b'SSH-2.0-Cisco-1.25\r\n'):
+        self.banner = banner
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        self.connections = list()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn = self.sock.accept()[0]
+            except OSError:
+                return
+            self.connections.append(conn)
+            if self.banner:
+                conn.sendall(self.banner)
+
+    def close(self):
+        self.sock.close()
+        for conn in self.connections:
+            conn.close()
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ProbeTest(unittest.TestCase):
+    def test_closed_port(self):
+        port = closed_port()
+        self.assertFalse(tcp_open('127.0.0.1', port, 1.0))
+        self.assertIsNone(read_banner('127.0.0.1', port, 1.0))
+
+    def test_banner(self):
+        server = BannerServer()
+        try:
+            self.assertTrue(tcp_open('127.0.0.1', server.port, 1.0))
+            self.assertEqual(read_banner('127.0.0.1', server.port, 1.0), 'SSH-2.0-Cisco-1.25')
+        finally:
+            server.close()
+
+    def test_listening_without_ssh(self):
+        server = BannerServer(banner=None)
+        try:
+            self.assertTrue(tcp_open('127.0.0.1', server.port, 1.0))
+            self.assertIsNone(read_banner('127.0.0.1', server.port, 0.2))
+        finally:
+            server.close()
+
+    def test_backoff(self):
+        backoff = Backoff(initial=1.0, maximum=4.0)
+        delays = [backoff.next() for n in range(5)]
+        for delay, cap in zip(delays, (1.0, 2.0, 4.0, 4.0, 4.0)):
+            self.assertTrue(cap / 2 <= delay <= cap, delays)
+        backoff.reset()
+        self.assertLessEqual(backoff.next(), 1.0)
+
+
+class ReadinessProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = BannerServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_stages_pass_in_order(self):
+        logins = list()
+
+        def login():
+            logins.append(1)
+            if len(logins) < 2:
+                raise EOFError('login refused')
+            return True
+        probe = ReadinessProbe('127.0.0.1', login, port=self.server.port, deadline=5, initial_delay=0.01)
+        result = probe.wait()
+        self.assertTrue(result.ready, result.error)
+        self.assertEqual(result.stage, 'login')
+        self.assertEqual(result.attempts, {'tcp': 1, 'banner': 1, 'login': 2})
+        self.assertEqual(result.banner, 'SSH-2.0-Cisco-1.25')
+        self.assertLessEqual(result.stage_seconds['tcp'], result.stage_seconds['banner'])
+        self.assertIsNone(result.error)
+
+    def test_routers_are_given_up_at_the_deadline(self):
+        down = ReadinessProbe('127.0.0.1', lambda: True, port=closed_port(), deadline=0.3, initial_delay=0.01,
+                              max_delay=0.05)
+        up = ReadinessProbe('127.0.0.1', lambda: True, port=self.server.port, deadline=5, initial_delay=0.01)
+        results = wait_ready([down, up])
+        self.assertEqual([r.ready for r in results], [False, True])
+        self.assertEqual(results[0].error, 'no tcp within 0.3s')
+        self.assertLess(results[0].seconds, 1.0)
+        self.assertGreater(results[0].attempts['tcp'], 1)
+        self.assertIn('1 of 2 routers ready', format_readiness(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+from benchmarks.topology import PROGRAM_KEY, make_peering, make_vnet
+from config import Settings
+from discovery import FakeDiscovery
+from executor import OrderedExecutor
+from fake_network import FakeNetworkFactory, FakeNetworkManagementClient
+from reconcile import apply, compute_peering_changes, index_silb_vnets, plan
+from udr import RouteManager
+
+
+def peer(silb, vnet, silb_state='Connected', vnet_state='Connected'):
+    name = silb.name + 'to' + vnet.name
+    silb.virtual_network_peerings.append(make_peering(name, vnet.id, silb_state))
+    vnet.virtual_network_peerings.append(make_peering(name, silb.id, vnet_state))
+
+
+def topology():
+    """
+    One SILB and a VNET of every case: new, healthy, Disconnected, half built, untagged and without a SILB
+    """
+    silb = make_vnet('sub', 'rgsilb', 'silb', 'eastus',
+                     {PROGRAM_KEY: 'dev', 'tvpc_silb_vnet': 'True', 'tvpc_silb_private_address': '10.0.0.4'})
+    vnets = dict((name, make_vnet('sub', 'rg' + name, name, 'eastus', {PROGRAM_KEY: 'dev'}))
+                 for name in ('new', 'healthy', 'disconnected', 'halfbuilt'))
+    vnets['untagged'] = make_vnet('sub', 'rguntagged', 'untagged', 'eastus', {})
+    vnets['orphan'] = make_vnet('sub', 'rgorphan', 'orphan', 'westus', {PROGRAM_KEY: 'dev'})
+    peer(silb, vnets['healthy'])
+    peer(silb, vnets['disconnected'], silb_state='Disconnected')
+    peer(silb, vnets['halfbuilt'])
+    vnets['halfbuilt'].virtual_network_peerings = []
+    peer(silb, vnets['untagged'])
+    # peered to the SILB of a region that is gone
+    vnets['former'] = make_vnet('sub', 'rgformer', 'former', 'westus', {})
+    vnets['orphan'].virtual_network_peerings.append(make_peering('gone', vnets['former'].id))
+    vnets['former'].virtual_network_peerings.append(make_peering('gone', vnets['orphan'].id))
+    return silb, vnets
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.silb, self.vnets = topology()
+        self.plan = plan([self.silb] + list(self.vnets.values()), Settings)
+
+    def test_new_participants_are_peered_both_ways(self):
+        created = [(op.vnet_name, op.remote_id) for op in self.plan.peerings_to_create if not op.recreate]
+        self.assertIn(('silb', self.vnets['new'].id), created)
+        self.assertIn(('new', self.silb.id), created)
+        routes = dict((op.key, op.next_hop_ip_address) for op in self.plan.udrs_to_add)
+        self.assertEqual(routes[self.vnets['new'].id], '10.0.0.4')
+
+    def test_untagged_and_orphaned_peerings_are_removed(self):
+        deleted = set((op.vnet_name, op.peering_name) for op in self.plan.peerings_to_delete)
+        self.assertIn(('silb', 'silbtountagged'), deleted)
+        self.assertIn(('untagged', 'silbtountagged'), deleted)
+        self.assertIn(('orphan', 'gone'), deleted)
+        self.assertIn(('former', 'gone'), deleted)
+        removed = set(op.key for op in self.plan.udrs_to_remove)
+        self.assertEqual(removed, {self.vnets['untagged'].id, self.vnets['orphan'].id})
+
+    def test_silb_without_private_address_defers(self):
+        del self.silb.tags['tvpc_silb_private_address']
+        deferred = plan([self.silb] + list(self.vnets.values()), Settings).deferred
+        self.assertIn(self.vnets['new'].id, [vnet_id for vnet_id, reason in deferred])
+
+    def test_operations_are_grouped_in_apply_order(self):
+        udrs_to_remove, peerings_to_delete, peerings_to_create, udrs_to_add, _ = \
+            self.plan.by_key()[self.vnets['new'].id]
+        self.assertEqual((len(udrs_to_remove), len(peerings_to_delete), len(peerings_to_create), len(udrs_to_add)),
+                         (0, 0, 2, 1))
+        udrs_to_remove, peerings_to_delete, peerings_to_create, udrs_to_add, _ = \
+            self.plan.by_key()[self.vnets['untagged'].id]
+        self.assertEqual((len(udrs_to_remove), len(peerings_to_delete), len(peerings_to_create), len(udrs_to_add)),
+                         (1, 2, 0, 0))
+
+    def test_only_keeps_the_owned_keys(self):
+        west = self.plan.only(lambda key: key == ('dev', 'westus'))
+        self.assertEqual(set(west.by_key()), {self.vnets['orphan'].id})
+        east = self.plan.only(lambda key: key == ('dev', 'eastus'))
+        self.assertNotIn(self.vnets['orphan'].id, east.by_key())
+        self.assertIn(self.vnets['new'].id, east.by_key())
+        self.assertEqual(east.summary(), self.plan.only(lambda key: key != ('dev', 'westus')).summary())
+
+    def test_summary_and_describe(self):
+        self.assertTrue(self.plan.summary().startswith('4 peerings to create, 4 peerings to delete, 3 UDRs to add, '
+                                                       '2 UDRs to remove'), self.plan.summary())
+        lines = self.plan.describe()
+        self.assertIn('create peering silbtonew on rgnew/new to {}'.format(self.silb.id), lines)
+        self.assertIn('delete peering gone on rgorphan/orphan', lines)
+        self.assertEqual(len(lines), len(self.plan) + len(self.plan.udrs_to_verify) + len(self.plan.deferred))
+
+
+class ApplyTest(unittest.TestCase):
+    def test_apply_converges(self):
+        silb, vnets = topology()
+        client = FakeNetworkManagementClient([silb] + list(vnets.values()))
+        for name in vnets:
+            client.add_route_table('rg' + name, Settings.private_route_table_name)
+        factory = FakeNetworkFactory(client)
+        discovery = FakeDiscovery(list(client.virtual_networks.list_all()))
+        results = apply(plan(discovery.vnets(), Settings), factory, OrderedExecutor(4), RouteManager(factory))
+        self.assertTrue(all(r.ok for r in results), [r.error for r in results if not r.ok])
+
+        again = plan(list(client.virtual_networks.list_all()), Settings)
+        self.assertEqual(len(again), 0, again.describe())
+        self.assertEqual(again.drift, {'disconnected': 0, 'half_built': 0})
+        route = client.table('rgnew', Settings.private_route_table_name)[Settings.default_route_name]
+        self.assertEqual(route.next_hop_ip_address, '10.0.0.4')
+
+    def test_failed_participants_do_not_stop_the_others(self):
+        silb, vnets = topology()
+        client = FakeNetworkManagementClient([silb] + list(vnets.values()))
+        # only the new participant has a route table
+        client.add_route_table('rgnew', Settings.private_route_table_name)
+        results = apply(plan([silb] + list(vnets.values()), Settings), FakeNetworkFactory(client), OrderedExecutor(4))
+        failed = set(r.key for r in results if not r.ok)
+        self.assertNotIn(vnets['new'].id, failed)
+        self.assertIn(vnets['disconnected'].id, failed)
+
+
+class DriftTest(unittest.TestCase):
+    def setUp(self):
+        self.silb, self.vnets = topology()
+        self.plan = plan([self.silb] + list(self.vnets.values()), Settings)
+
+    def test_drift_is_repaired(self):
+        self.assertEqual(self.plan.drift, {'disconnected': 1, 'half_built': 1})
+        by_key = self.plan.by_key()
+        recreated = by_key[self.vnets['disconnected'].id][2]
+        self.assertEqual([(op.vnet_name, op.recreate) for op in recreated], [('silb', True)])
+        missing = by_key[self.vnets['halfbuilt'].id][2]
+        self.assertEqual([(op.vnet_name, op.peering_name, op.recreate) for op in missing],
+                         [('halfbuilt', 'silbtohalfbuilt', False)])
+
+    def test_healthy_participants_are_only_verified(self):
+        self.assertNotIn(self.vnets['healthy'].id, [op.key for op in self.plan.peerings_to_create])
+        self.assertIn(self.vnets['healthy'].id, [op.key for op in self.plan.udrs_to_verify])
+
+    def test_events_verify_only_changed_routes(self):
+        vnets = [self.silb] + list(self.vnets.values())
+        changed = plan(vnets, Settings, changed_ids={self.vnets['new'].id})
+        self.assertEqual(set(changed.by_key()), {self.vnets['new'].id})
+        # a SILB event puts its participants in scope but only a retagged SILB moves their next hop
+        silb_event = plan(vnets, Settings, changed_ids={self.silb.id})
+        self.assertNotIn(self.vnets['healthy'].id, [op.key for op in silb_event.udrs_to_verify])
+        retagged = plan(vnets, Settings, changed_ids={self.silb.id}, retagged_keys={('dev', 'eastus')})
+        self.assertIn(self.vnets['healthy'].id, [op.key for op in retagged.udrs_to_verify])
+
+    def test_stale_routes_are_rewritten(self):
+        client = FakeNetworkManagementClient([self.silb] + list(self.vnets.values()))
+        client.add_route_table('rghealthy', Settings.private_route_table_name,
+                               [(Settings.default_route_name, '0.0.0.0/0', '10.0.0.9')])
+        routes = RouteManager(FakeNetworkFactory(client))
+        verify = self.plan.by_key()[self.vnets['healthy'].id][4]
+        self.assertEqual(len(verify), 1)
+        self.assertTrue(routes.repair(verify[0]))
+        self.assertFalse(routes.repair(verify[0]))
+        route = client.table('rghealthy', Settings.private_route_table_name)[Settings.default_route_name]
+        self.assertEqual(route.next_hop_ip_address, '10.0.0.4')
+        self.assertEqual(routes.stats['repaired'], 1)
+
+
+class IndexTest(unittest.TestCase):
+    def test_one_silb_per_cluster_and_location(self):
+        first = make_vnet('sub', 'rg', 'first', 'eastus', {PROGRAM_KEY: 'dev', 'tvpc_silb_vnet': 'True'})
+        second = make_vnet('sub', 'rg', 'second', 'eastus', {PROGRAM_KEY: 'dev', 'tvpc_silb_vnet': 'True'})
+        west = make_vnet('sub', 'rg', 'west', 'westus', {PROGRAM_KEY: 'dev', 'tvpc_silb_vnet': 'True'})
+        index = index_silb_vnets([first, second, west], PROGRAM_KEY)
+        self.assertEqual(index, {('dev', 'eastus'): first, ('dev', 'westus'): west})
+
+    def test_stale_silb_peerings_outside_the_scope_are_left_alone(self):
+        silb, vnets = topology()
+        participants = [vnets[name] for name in ('new', 'healthy', 'disconnected', 'halfbuilt')]
+        stale = compute_peering_changes([silb], participants, PROGRAM_KEY)[1]
+        self.assertEqual([x.name for s, x in stale], ['silbtountagged'])
+        self.assertEqual(compute_peering_changes([silb], participants, PROGRAM_KEY, scope=set())[1], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
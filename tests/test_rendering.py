@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from csr1000v import Router, render_configs
+from rendering import TemplateRenderer
+
+
+class TemplateRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.write('hostname {{ hostname }}\n!\ninterface GigabitEthernet1\n ip address {{ ip }} 255.255.255.0')
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def write(self, text, age=0):
+        name = os.path.join(self.path, 'router.j2')
+        with open(name, 'w') as f:
+            f.write(text)
+        # jinja2 reloads a template whose modification time changed
+        mtime = os.path.getmtime(name) + age
+        os.utime(name, (mtime, mtime))
+
+    def test_templates_are_compiled_once(self):
+        renderer = TemplateRenderer(search_path=[self.path])
+        self.assertIs(renderer.template('router.j2'), renderer.template('router.j2'))
+        self.assertEqual(renderer.render('router.j2', {'hostname': 'csr1', 'ip': '10.0.0.4'}),
+                         ['hostname csr1', '!', 'interface GigabitEthernet1', ' ip address 10.0.0.4 255.255.255.0'])
+
+    def test_changed_templates_are_compiled_again(self):
+        renderer = TemplateRenderer(search_path=[self.path])
+        renderer.render('router.j2', {'hostname': 'csr1'})
+        self.write('hostname {{ hostname }}-new', age=10)
+        self.assertEqual(renderer.render('router.j2', {'hostname': 'csr1'}), ['hostname csr1-new'])
+
+    def test_render_many_renders_every_router(self):
+        renderer = TemplateRenderer(search_path=[self.path])
+        variables = [{'hostname': 'csr{}'.format(n), 'ip': '10.0.0.{}'.format(n)} for n in range(3)]
+        self.assertEqual(renderer.render_many('router.j2', variables),
+                         [renderer.render('router.j2', v) for v in variables])
+
+    def test_bytecode_cache_outlives_the_renderer(self):
+        cache_dir = os.path.join(self.path, 'bytecode')
+        TemplateRenderer(search_path=[self.path], bytecode_cache_dir=cache_dir).template('router.j2')
+        self.assertTrue(os.listdir(cache_dir))
+        renderer = TemplateRenderer(search_path=[self.path], bytecode_cache_dir=cache_dir)
+        self.assertEqual(renderer.render('router.j2', {'hostname': 'csr1'})[0], 'hostname csr1')
+
+    def test_router_templates(self):
+        routers = [Router('10.0.0.{}'.format(n), 'admin', 'admin', 'eastus', pool=object()) for n in (1, 2)]
+        variables = [{'hostname': 'csr{}'.format(n)} for n in (1, 2)]
+        configs = render_configs(routers, 'templates/baseline.j2', variables)
+        self.assertIn('hostname csr2', configs[1])
+        self.assertIn(' rd 10.0.0.2:1', configs[1])
+        self.assertEqual(configs[0], routers[0].render_config_from_template('templates/baseline.j2', variables[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
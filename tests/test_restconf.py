@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import unittest
+from fake_router import FakeRouter, RestconfStandin
+from restconf import RestconfError, RestconfTransport
+
+
+class RestconfTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.router = FakeRouter()
+        self.standin = RestconfStandin(self.router).start()
+        self.transport = RestconfTransport('127.0.0.1', 'admin', 'admin', port=self.standin.port, scheme='http',
+                                           timeout=5)
+
+    def tearDown(self):
+        self.transport.close()
+        self.standin.stop()
+
+    def test_configure_is_one_transaction(self):
+        lines = ['hostname edge', '!', 'interface GigabitEthernet2', ' ip address 10.0.0.4 255.255.255.0', '']
+        results = self.transport.configure(lines)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.line for r in results], ['hostname edge', 'interface GigabitEthernet2',
+                                                     ' ip address 10.0.0.4 255.255.255.0'])
+        self.assertEqual(self.router.hostname, 'edge')
+        self.assertEqual(self.standin.stats['transactions'], 1)
+        self.assertEqual(self.transport.configure(['!']), [])
+        self.assertEqual(self.standin.stats['requests'], 1)
+
+    def test_rejected_transaction_changes_nothing(self):
+        results = self.transport.configure(['hostname edge', 'bogus command'])
+        self.assertEqual([r.ok for r in results], [False, False])
+        self.assertEqual(results[0].error, 'Rolled back')
+        self.assertIn('bogus command', results[1].error)
+        self.assertEqual(self.router.running, [])
+
+    def test_save_and_version(self):
+        self.transport.configure(['hostname edge'])
+        self.transport.save()
+        self.assertEqual(self.router.saved, ['hostname edge'])
+        self.assertEqual(self.transport.show_version(), '16.10')
+
+    def test_wrong_credentials_raise(self):
+        transport = RestconfTransport('127.0.0.1', 'admin', 'wrong', port=self.standin.port, scheme='http',
+                                      timeout=5)
+        try:
+            with self.assertRaises(RestconfError) as raised:
+                transport.configure(['hostname edge'])
+            self.assertEqual(raised.exception.status_code, 401)
+        finally:
+            transport.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
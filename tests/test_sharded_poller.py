@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import os
+import unittest
+import sharded_poller
+from benchmarks.topology import generate_topology
+from config import Settings
+from fake_network import FakeNetworkFactory, FakeNetworkManagementClient
+from reconcile import PeeringOp, plan
+from sharded_poller import ShardedReconciler, make_shards, shard_of
+from throttle import RequestScheduler
+
+
+class ShardFactory(FakeNetworkFactory):
+    """
+    Built in a shard's worker process instead of clients.AzureClientFactory, over a fake topology of its own
+    """
+    def __init__(self, subscription_id=None, throttle_settings=None):
+        client = FakeNetworkManagementClient(generate_topology(40, subscription_id=subscription_id))
+        for v in client.vnets.values():
+            client.add_route_table(v.resource_group_name, Settings.private_route_table_name)
+        FakeNetworkFactory.__init__(self, client, subscription_id)
+        self._scheduler = RequestScheduler.from_settings(throttle_settings)
+        self.cached = self._scheduler.wrap(client)
+
+    def scheduler(self, subscription_id=None):
+        return self._scheduler
+
+
+def worker_shards():
+    return sorted(sharded_poller._factories)
+
+
+def worker_write_rate(shard_name):
+    return sharded_poller._factories[shard_name].scheduler().buckets['write'].max_rate
+
+
+class ShardTest(unittest.TestCase):
+    def test_participants_go_to_the_shard_of_their_region(self):
+        shards = make_shards(['sub1', 'sub2'], [['eastus'], ['westus']])
+        self.assertEqual([s.name for s in shards], ['sub1/eastus', 'sub1/westus', 'sub2/eastus', 'sub2/westus'])
+        vnets = generate_topology(20, subscription_id='sub2')
+        locations = dict((v.id, v.location) for v in vnets)
+        for key, ops in plan(vnets, Settings).by_key().items():
+            shard = shard_of(shards, key, ops, locations)
+            self.assertEqual((shard.subscription_id, list(shard.regions)), ('sub2', [locations[key]]))
+        # a participant outside the managed subscriptions goes to a shard of its operations' subscription
+        other = '/subscriptions/other/resourceGroups/rg/providers/Microsoft.Network/virtualNetworks/v'
+        ops = ([], [PeeringOp(other, 'sub1', 'rgsilb', 'silb', 'silbtov')], [], [], [])
+        self.assertEqual(shard_of(shards, other, ops, {}).name, 'sub1/eastus')
+        self.assertIsNone(shard_of(shards, other, ([], [], [], [], []), {}))
+
+
+class ShardedReconcilerTest(unittest.TestCase):
+    def setUp(self):
+        self.reconciler = ShardedReconciler(Settings, ['sub1', 'sub2'], [['eastus'], ['westus']],
+                                            factory_class=ShardFactory)
+
+    def tearDown(self):
+        self.reconciler.close()
+
+    def test_every_shard_has_its_own_worker_and_budget(self):
+        first = self.reconciler.reconcile()
+        second = self.reconciler.reconcile()
+        self.assertEqual((first['failed'], second['failed']), (0, 0))
+        self.assertEqual(first['unlisted_subscriptions'], [])
+        pids = set()
+        for shard, pool in self.reconciler.pools.items():
+            pids.add(pool.apply(os.getpid))
+            self.assertEqual(pool.apply(worker_shards), [shard.name])
+            self.assertEqual(pool.apply(worker_write_rate, (shard.name,)), Settings.arm_write_rate / 2)
+        self.assertEqual(len(pids), 4)
+        # the scheduler of a shard carries over to the next cycle
+        for before, after in zip(first['shards'], second['shards']):
+            self.assertEqual(before['shard'], after['shard'])
+            self.assertGreater(after['arm_stats']['calls'], before['arm_stats']['calls'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from benchmarks.topology import PROGRAM_KEY, make_peering, make_vnet
+from config import Settings
+from discovery import vnet_from_row
+from reconcile import plan
+from snapshot import TopologySnapshot
+
+
+class TopologySnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot = TopologySnapshot(os.path.join(self.directory, 'snapshot.db'), PROGRAM_KEY)
+        self.silb = make_vnet('sub', 'rgsilb', 'silb', 'eastus',
+                              {PROGRAM_KEY: 'dev', 'tvpc_silb_vnet': 'True', 'tvpc_silb_private_address': '10.0.0.4'})
+        self.vnet = make_vnet('sub', 'rgvnet', 'vnet', 'eastus', {PROGRAM_KEY: 'dev'})
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.directory)
+
+    def test_unchanged_vnets_are_not_reported(self):
+        self.snapshot.update([self.silb, self.vnet])
+        self.assertEqual(self.snapshot.changes([self.silb, self.vnet]), (set(), set(), set()))
+
+    def test_new_etag_and_peering_state_changes(self):
+        self.snapshot.update([self.silb, self.vnet])
+        self.vnet.etag = 'W/"1"'
+        self.assertEqual(self.snapshot.changes([self.silb, self.vnet])[0], {self.vnet.id})
+        self.snapshot.update([self.silb, self.vnet])
+        self.vnet.virtual_network_peerings.append(make_peering('p', self.silb.id, 'Disconnected'))
+        self.assertEqual(self.snapshot.changes([self.silb, self.vnet])[0], {self.vnet.id})
+
+    def test_silb_changes_make_their_key_dirty(self):
+        self.snapshot.update([self.silb, self.vnet])
+        self.silb.tags['tvpc_silb_private_address'] = '10.0.0.5'
+        changed_ids, dirty_keys, retagged_keys = self.snapshot.changes([self.silb, self.vnet])
+        self.assertEqual(changed_ids, {self.silb.id})
+        self.assertEqual(dirty_keys, {('dev', 'eastus')})
+        self.assertEqual(retagged_keys, {('dev', 'eastus')})
+
+    def test_deleted_vnets_are_reported(self):
+        self.snapshot.update([self.silb, self.vnet])
+        changed_ids, dirty_keys, _ = self.snapshot.changes([self.vnet])
+        self.assertEqual(changed_ids, {self.silb.id})
+        self.assertEqual(dirty_keys, {('dev', 'eastus')})
+
+    def test_failed_vnets_are_retried(self):
+        self.snapshot.update([self.silb, self.vnet], failed_ids={self.vnet.id})
+        self.assertEqual(self.snapshot.changes([self.silb, self.vnet])[0], {self.vnet.id})
+        self.snapshot.update([self.silb, self.vnet])
+        self.assertEqual(self.snapshot.changes([self.silb, self.vnet])[0], set())
+
+    def test_failed_resource_graph_vnets_are_retried(self):
+        # Resource Graph records have no etag
+        row = {'id': self.vnet.id, 'name': 'vnet', 'location': 'eastus', 'tags': {PROGRAM_KEY: 'dev'}, 'peerings': []}
+        record = vnet_from_row(row, PROGRAM_KEY)
+        self.assertIsNone(record.etag)
+        self.snapshot.update([record], failed_ids={record.id})
+        self.assertEqual(self.snapshot.changes([record])[0], {record.id})
+
+    def test_failed_deleted_vnets_stay_deleted(self):
+        self.snapshot.update([self.silb, self.vnet])
+        self.snapshot.update([self.silb], failed_ids={self.vnet.id})
+        self.assertEqual(self.snapshot.changes([self.silb])[0], {self.vnet.id})
+
+    def test_snapshots_without_failed_column_are_upgraded(self):
+        path = os.path.join(self.directory, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE vnets (id TEXT PRIMARY KEY, etag TEXT, cluster TEXT, location TEXT, tags TEXT, '
+                     'peerings TEXT)')
+        conn.commit()
+        conn.close()
+        snapshot = TopologySnapshot(path, PROGRAM_KEY)
+        snapshot.update([self.vnet], failed_ids={self.vnet.id})
+        self.assertEqual(snapshot.changes([self.vnet])[0], {self.vnet.id})
+        snapshot.close()
+
+
+    def test_delta_plans_cover_the_changed_vnets(self):
+        other = make_vnet('sub', 'rgother', 'other', 'eastus', {PROGRAM_KEY: 'dev'})
+        vnets = [self.silb, self.vnet, other]
+        self.assertEqual(len(plan(vnets, Settings, self.snapshot, delta=True).by_key()), 2)
+        self.snapshot.update(vnets)
+        self.assertEqual(len(plan(vnets, Settings, self.snapshot, delta=True).by_key()), 0)
+        other.etag = 'W/"1"'
+        self.assertEqual(set(plan(vnets, Settings, self.snapshot, delta=True).by_key()), {other.id})
+        # a full plan still sees every participant
+        self.assertEqual(len(plan(vnets, Settings, self.snapshot).by_key()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.topology import generate_topology
+from fake_arm import FakeArm, FakeArmClient, FakeArmError
+from fake_network import FakeNetworkError, FakeNetworkManagementClient
+from throttle import RequestScheduler, TokenBucket, retry_after
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=100.0, capacity=5)
+        start = time.monotonic()
+        waited = sum(bucket.acquire() for n in range(10))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        self.assertGreater(waited, 0.0)
+
+    def test_throttles_halve_the_rate(self):
+        bucket = TokenBucket(rate=64.0, capacity=10)
+        bucket.slow_down()
+        bucket.slow_down()
+        self.assertEqual(bucket.rate, 16.0)
+        for n in range(200):
+            bucket.speed_up()
+        self.assertEqual(bucket.rate, 64.0)
+
+    def test_remaining_headers_cap_the_tokens(self):
+        bucket = TokenBucket(rate=1.0, capacity=100)
+        bucket.limit(3)
+        self.assertLessEqual(bucket.tokens, 3.0)
+        self.assertEqual((retry_after({'Retry-After': '2'}), retry_after({'Retry-After': 'soon'})), (2.0, None))
+
+
+class PagedListTest(unittest.TestCase):
+    def test_failed_pages_are_retried(self):
+        vnets = generate_topology(250)
+        client = FakeNetworkManagementClient(vnets, failure_rate=0.5, fail_operations={'virtual_networks.list_all'},
+                                             page_size=50, seed=1)
+        scheduler = RequestScheduler(base_delay=0.001, max_retries=20)
+        listed = list(scheduler.wrap(client).virtual_networks.list_all())
+        self.assertEqual([v.id for v in listed], [v.id for v in vnets])
+        self.assertGreater(client.failures['virtual_networks.list_all'], 0)
+        self.assertEqual(scheduler.stats['retries'], client.failures['virtual_networks.list_all'])
+
+    def test_pages_take_read_tokens(self):
+        client = FakeNetworkManagementClient(generate_topology(250), page_size=50)
+        scheduler = RequestScheduler()
+        list(scheduler.wrap(client).virtual_networks.list_all())
+        # building the pager, then one call per page
+        self.assertEqual(scheduler.stats['calls'], 1 + client.calls['virtual_networks.list_all'])
+
+    def test_errors_are_not_retried(self):
+        client = FakeNetworkManagementClient(generate_topology(10))
+        scheduler = RequestScheduler(base_delay=0.001)
+        with self.assertRaises(FakeNetworkError):
+            scheduler.wrap(client).virtual_networks.get('rgmissing', 'missing')
+        self.assertEqual((scheduler.stats['retries'], scheduler.stats['errors']), (0, 1))
+
+
+class FakeArmTest(unittest.TestCase):
+    def setUp(self):
+        self.arm = FakeArm(read_limit=20, write_limit=10, window=0.5).start()
+
+    def tearDown(self):
+        self.arm.stop()
+
+    def test_unpaced_writes_are_throttled(self):
+        client = FakeArmClient(self.arm.url)
+        with self.assertRaises(FakeArmError) as raised:
+            for n in range(20):
+                client.create_or_update('/routes/{}'.format(n), {'n': n})
+        self.assertEqual(raised.exception.status_code, 429)
+
+    def test_scheduled_writes_all_succeed(self):
+        scheduler = RequestScheduler(write_rate=20.0, write_burst=10, base_delay=0.05, max_delay=0.5, reserve=0)
+        client = FakeArmClient(self.arm.url, hook=scheduler.response_hook)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda n: scheduler.write(client.create_or_update, '/routes/{}'.format(n),
+                                                                  {'n': n}), range(30)))
+        self.assertEqual(len(results), 30)
+        self.assertEqual(len(self.arm.resources), 30)
+        self.assertEqual(scheduler.stats['errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
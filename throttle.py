@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import random
+import threading
+import time
+
+READ_HEADER = 'x-ms-ratelimit-remaining-subscription-reads'
+WRITE_HEADER = 'x-ms-ratelimit-remaining-subscription-writes'
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# a 409 with one of these codes only means another write to the resource has not finished yet
+RETRY_CONFLICTS = ('AnotherOperationInProgress',)
+# operation names starting with these are writes, everything else is a read
+WRITE_PREFIXES = ('create', 'update', 'delete', 'begin_', 'set', 'start', 'stop', 'restart', 'power_off',
+                  'deallocate', 'generalize', 'reimage', 'redeploy', 'accept', 'purchase')
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, rate tokens per second up to capacity tokens
+    The rate halves on every throttle and creeps back up to max_rate on success
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.max_rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, tokens=1.0):
+        """
+        Blocks until tokens are available and takes them, returns the seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def slow_down(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate / 64.0, self.rate / 2.0)
+            self.tokens = min(self.tokens, 0.0)
+
+    def speed_up(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100.0)
+
+    def limit(self, remaining):
+        """
+        Never hold more tokens than the server says are left
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(remaining))
+
+
+class RequestScheduler:
+    """
+    Paces Azure calls to stay under the ARM per subscription read and write limits
+    Reads and writes draw from separate token buckets. Throttled (429) and transient 5xx responses are retried after
+    Retry-After plus jittered exponential backoff, so are writes answered with 409 AnotherOperationInProgress.
+    A 429 pauses every caller of that kind and halves its bucket rate, successful calls bring the rate back up.
+    x-ms-ratelimit-remaining-subscription-* headers cap the buckets so bursts stop before ARM starts throttling
+    Observers are called after every attempt with (kind, operation, seconds, status), see metrics.PollerMetrics
+    scheduler = RequestScheduler()
+    network_client = scheduler.wrap(factory.network())
+    """
+    # defaults follow the ARM regional token buckets: 250 reads refilled at 25/s, 200 writes refilled at 10/s
+    def __init__(self, read_rate=25.0, read_burst=250, write_rate=10.0, write_burst=200,
+                 max_retries=6, base_delay=1.0, max_delay=60.0, reserve=10):
+        self.buckets = {'read': TokenBucket(read_rate, read_burst), 'write': TokenBucket(write_rate, write_burst)}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reserve = reserve
+        self.blocked_until = {'read': 0.0, 'write': 0.0}
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'errors': 0}
+        self.observers = list()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(read_rate=settings.arm_read_rate, read_burst=settings.arm_read_burst,
+                   write_rate=settings.arm_write_rate, write_burst=settings.arm_write_burst,
+                   max_retries=settings.arm_max_retries)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def pause(self, kind, delay):
+        with self.lock:
+            self.blocked_until[kind] = max(self.blocked_until[kind], time.monotonic() + delay)
+
+    def wait(self, kind):
+        while True:
+            with self.lock:
+                delay = self.blocked_until[kind] - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        self.buckets[kind].acquire()
+
+    def observe(self, headers):
+        """
+        Caps the buckets with the remaining read and write counts ARM reports
+        """
+        if not headers:
+            return
+        for kind, header in (('read', READ_HEADER), ('write', WRITE_HEADER)):
+            remaining = headers.get(header)
+            if remaining is None:
+                continue
+            try:
+                self.buckets[kind].limit(max(0, int(remaining) - self.reserve))
+            except ValueError:
+                continue
+
+    def response_hook(self, response, *args, **kwargs):
+        self.observe(response.headers)
+        return response
+
+    def notify(self, kind, operation, seconds, status):
+        logger = logging.getLogger(__name__)
+        for observer in self.observers:
+            try:
+                observer(kind, operation, seconds, status)
+            except Exception as e:
+                logger.warning("Unable to record {} {}".format(kind, operation))
+                logger.error("{}".format(e))
+
+    def call(self, kind, fn, *args, **kwargs):
+        return self.run(kind, getattr(fn, '__name__', str(fn)), fn, args, kwargs)
+
+    def run(self, kind, operation, fn, args, kwargs):
+        logger = logging.getLogger(__name__)
+        attempt = 0
+        while True:
+            self.wait(kind)
+            self.count('calls')
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+                self.buckets[kind].speed_up()
+                self.notify(kind, operation, time.monotonic() - start, 'ok')
+                return result
+            except Exception as e:
+                status = error_status(e)
+                headers = error_headers(e)
+                self.notify(kind, operation, time.monotonic() - start, status or 'error')
+                self.observe(headers)
+                if not retryable(status, e) or attempt >= self.max_retries:
+                    self.count('errors')
+                    raise
+                # jitter on top of Retry-After keeps the waiting callers from retrying all at once
+                delay = (retry_after(headers) or 0.0) + self.backoff(attempt)
+                if status == 429:
+                    self.count('throttled')
+                    # everyone of this kind backs off and the bucket slows down, not only this caller
+                    self.buckets[kind].slow_down()
+                    self.pause(kind, delay)
+                self.count('retries')
+                logger.warning("ARM {} {} returned {}, retry {} in {:.1f}s".format(
+                    kind, operation, status, attempt + 1, delay))
+                time.sleep(delay)
+                attempt += 1
+
+    def read(self, fn, *args, **kwargs):
+        return self.call('read', fn, *args, **kwargs)
+
+    def write(self, fn, *args, **kwargs):
+        return self.call('write', fn, *args, **kwargs)
+
+    def wrap(self, client):
+        """
+        Returns a proxy of a management client whose operations go through the scheduler
+        The scheduler also registers a response hook on the client to read the rate limit headers
+        """
+        hooks = getattr(getattr(client, 'config', None), 'hooks', None)
+        if isinstance(hooks, list) and self.response_hook not in hooks:
+            hooks.append(self.response_hook)
+        return ScheduledClient(client, self)
+
+
+class ScheduledClient:
+    def __init__(self, client, scheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name in ('config', 'models') or callable(attr):
+            return attr
+        return ScheduledOperations(attr, self._scheduler, name)
+
+
+class ScheduledOperations:
+    def __init__(self, operations, scheduler, name=None):
+        self._operations = operations
+        self._scheduler = scheduler
+        self._name = name
+
+    def __getattr__(self, name):
+        attr = getattr(self._operations, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        kind = 'write' if name.startswith(WRITE_PREFIXES) else 'read'
+        scheduler = self._scheduler
+        operation = '{}.{}'.format(self._name, name) if self._name else name
+
+        def scheduled(*args, **kwargs):
+            result = scheduler.run(kind, operation, attr, args, kwargs)
+            if callable(getattr(result, 'advance_page', None)):
+                schedule_pages(result, scheduler, operation)
+            return result
+        scheduled.__name__ = name
+        return scheduled
+
+
+def schedule_pages(paged, scheduler, operation):
+    """
+    Makes every page fetch of an msrest Paged result go through the scheduler, list calls only build the pager and
+    its pages are requested while it is iterated. A page that fails is requested again, next_link is only moved on
+    once a page arrived
+    """
+    advance_page = paged.advance_page
+
+    def scheduled_advance_page():
+        if paged.next_link is None:
+            raise StopIteration('End of paging')
+        return scheduler.run('read', operation, advance_page, (), {})
+    paged.advance_page = scheduled_advance_page
+    return paged
+
+
+def error_status(e):
+    status = getattr(e, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status
+
+
+def retryable(status, e):
+    if status == 409:
+        return any(code in str(e) for code in RETRY_CONFLICTS)
+    return status in RETRY_STATUS
+
+
+def error_headers(e):
+    return getattr(getattr(e, 'response', None), 'headers', None) or {}
+
+
+def retry_after(headers):
+    value = headers.get('Retry-After') if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
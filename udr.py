@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+
+Copyright (c) 2019 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+__author__ = "Steven Mosher <stmosher@cisco.com>"
+__copyright__ = "Copyright (c) 2019 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+import logging
+import threading
+
+
+class RouteManager:
+    """
+    Adds and removes single UDRs with routes.create_or_update and routes.delete
+    Route tables are read once per cycle into an index of route name -> (address_prefix, next_hop_type,
+    next_hop_ip_address), so a route that is already correct is not written again.
+    Changes to the same route table are serialized, different tables are changed in parallel
+    routes = RouteManager(factory)
+    routes.upsert(op)
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.index = dict()
+        self.locks = dict()
+        self.lock = threading.Lock()
+        self.stats = {'reads': 0, 'writes': 0, 'skipped': 0, 'repaired': 0}
+
+    def table_lock(self, table):
+        with self.lock:
+            return self.locks.setdefault(table, threading.Lock())
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def routes(self, table):
+        """
+        Returns the cached route index of a (subscription_id, resource_group_name, route_table_name) table,
+        reading it from Azure on first use. Call with the table lock held
+        """
+        if table not in self.index:
+            subscription_id, resource_group_name, route_table_name = table
+            self.count('reads')
+            self.index[table] = dict((r.name, (r.address_prefix, r.next_hop_type, r.next_hop_ip_address))
+                                     for r in self.factory.network(subscription_id).routes.list(
+                                         resource_group_name, route_table_name))
+        return self.index[table]
+
+    def upsert(self, op):
+        """
+        Creates or updates the route of a RouteOp, returns False when it was already in place
+        """
+        logger = logging.getLogger(__name__)
+        table = op.ident[:3]
+        with self.table_lock(table):
+            routes = self.routes(table)
+            wanted = (op.address_prefix, 'VirtualAppliance', op.next_hop_ip_address)
+            if routes.get(op.route_name) == wanted:
+                self.count('skipped')
+                return False
+            try:
+                self.count('writes')
+                self.factory.network(op.subscription_id).routes.create_or_update(
+                    op.resource_group_name, op.route_table_name, op.route_name, op.body())
+            except Exception:
+                # the table may have changed under us, read it again next time
+                self.index.pop(table, None)
+                raise
+            routes[op.route_name] = wanted
+            logger.info("Route {} {} via {} set in {}/{}".format(op.route_name, op.address_prefix,
+                                                                 op.next_hop_ip_address, op.resource_group_name,
+                                                                 op.route_table_name))
+            return True
+
+    def repair(self, op):
+        """
+        Verifies the route of a RouteOp against the route table and rewrites it when it is missing or its next hop
+        is stale, returns True when it had drifted
+        """
+        logger = logging.getLogger(__name__)
+        if not self.upsert(op):
+            return False
+        self.count('repaired')
+        logger.warning("Route {} in {}/{} had drifted from {}".format(op.route_name, op.resource_group_name,
+                                                                    op.route_table_name, op.next_hop_ip_address))
+        return True
+
+    def remove(self, op):
+        """
+        Deletes the route of a RouteOp, returns False when the cached index shows it is already gone
+        Tables that have not been read are not read just to check, deleting a missing route is harmless
+        """
+        table = op.ident[:3]
+        with self.table_lock(table):
+            routes = self.index.get(table)
+            if routes is not None and op.route_name not in routes:
+                self.count('skipped')
+                return False
+            try:
+                self.count('writes')
+                self.factory.network(op.subscription_id).routes.delete(
+                    op.resource_group_name, op.route_table_name, op.route_name)
+            except Exception:
+                self.index.pop(table, None)
+                raise
+            if routes is not None:
+                routes.pop(op.route_name, None)
+            return True